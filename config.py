@@ -14,6 +14,32 @@ A4_HEIGHT = 210
 # PDF Orientation
 PDF_ORIENTATION = "landscape"  # Options: "portrait", "landscape"
 
+# Số process vẽ PDF song song - nhiều file hoặc file gộp chia đoạn (0 = theo số CPU, 1 = tuần tự)
+EXPORT_WORKERS = 0
+
+# Ghi PDF trực tiếp theo khuôn trang dựng sẵn (core.template_writer), nhanh hơn
+# vẽ bằng ReportLab canvas nhưng dựa vào cấu trúc bên trong ReportLab: chỉ bật
+# khi pdf_writer_harness.py báo PASS với đúng phiên bản ReportLab đang dùng
+# (False = PDFGenerator)
+DIRECT_PDF_WRITER = False
+
+# Chế độ nhiều file: mọi file dùng chung 1 subset font tiếng Việt cắt + nén sẵn
+# (core.font_registry), nhanh hơn nhưng mỗi file lớn hơn (~27 -> 29 KB) và dựa
+# vào cấu trúc bên trong ReportLab; False = nhúng font như ReportLab bình thường.
+# DIRECT_PDF_WRITER luôn dùng subset chung.
+SHARED_FONT_SUBSET = False
+
+# Chế độ nhiều file: ghi mọi file PDF vào 1 file QuyY_NhieuFile.zip (kèm index.csv)
+# thay vì hàng nghìn file lẻ; nén "stored" (không nén lại) hoặc "deflated"
+MULTIPLE_ZIP = False
+ZIP_COMPRESSION = "stored"
+
+# Chế độ 1 file gộp: tách thành QuyY_TatCa_001.pdf, _002.pdf... mỗi N trang
+# hoặc tối đa M MB (0 = không tách). Chỉ khi tách tập bộ nhớ mới không tăng
+# theo số dòng; không tách thì cả file gộp nằm trong bộ nhớ đến khi lưu.
+MERGED_VOLUME_PAGES = 0
+MERGED_VOLUME_MB = 0
+
 # Tọa độ các trường (x, y theo mm, origin ở góc trên bên trái)
 # Có thể điều chỉnh qua GUI
 FIELD_POSITIONS = {
@@ -22,7 +48,7 @@ FIELD_POSITIONS = {
         "y": 147,  # mm từ trên xuống
         "size": 18,
         "bold": False,
-        "italic": True,
+        "italic": False,
         "align": "L"
     },
     "ho_ten": {
@@ -30,7 +56,7 @@ FIELD_POSITIONS = {
         "y": 147,
         "size": 18,
         "bold": False,
-        "italic": True,
+        "italic": False,
         "align": "L"
     },
     "sinh_nam": {
@@ -38,15 +64,15 @@ FIELD_POSITIONS = {
         "y": 157,
         "size": 12,
         "bold": False,
-        "italic": True,
+        "italic": False,
         "align": "L"
     },
     "dia_chi": {
         "x": 85,
         "y": 165,
         "size": 12,
-        "bold": True,
-        "italic": True,
+        "bold": False,
+        "italic": False,
         "align": "L"
     },
     "ngay_duong": {
@@ -54,7 +80,7 @@ FIELD_POSITIONS = {
         "y": 198,
         "size": 11,
         "bold": False,
-        "italic": True,
+        "italic": False,
         "align": "C"
     },
     "thang_duong": {
@@ -62,7 +88,7 @@ FIELD_POSITIONS = {
         "y": 198,
         "size": 11,
         "bold": False,
-        "italic": True,
+        "italic": False,
         "align": "C"
     },
     "nam_duong": {
@@ -70,7 +96,7 @@ FIELD_POSITIONS = {
         "y": 198,
         "size": 11,
         "bold": False,
-        "italic": True,
+        "italic": False,
         "align": "C"
     },
     "ngay_am": {
@@ -78,7 +104,7 @@ FIELD_POSITIONS = {
         "y": 206,
         "size": 11,
         "bold": False,
-        "italic": True,
+        "italic": False,
         "align": "C"
     },
     "thang_am": {
@@ -86,23 +112,23 @@ FIELD_POSITIONS = {
         "y": 206,
         "size": 11,
         "bold": False,
-        "italic": True,
+        "italic": False,
         "align": "C"
     },
     "nam_am": {
         "x": 155,
         "y": 206,
         "size": 11,
-        "bold": True,
-        "italic": True,
+        "bold": False,
+        "italic": False,
         "align": "C"
     },
     "phat_lich": {
         "x": 155,
         "y": 214,
         "size": 11,
-        "bold": True,
-        "italic": True,
+        "bold": False,
+        "italic": False,
         "align": "C"
     }
 }
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Ảnh phôi (phoimau) làm nền trang PDF cho bản in thử / in trên giấy trắng
+
+Ảnh được giải mã, thu nhỏ theo PROOF_DPI và mã hóa JPEG 1 lần cho mỗi nội
+dung file (SHA-1) trong process. Mỗi tài liệu PDF chỉ nhúng ảnh 1 lần thành
+một image XObject dùng chung, mọi trang tham chiếu cùng object đó: file gộp
+2000 trang vẫn chỉ chứa 1 bản ảnh.
+
+Khác canvas.drawImage: drawImage băm lại toàn bộ dữ liệu RGB của ảnh mỗi lần
+gọi (mỗi trang) và nén lại ảnh cho mỗi tài liệu; ở đây bytes JPEG đã có sẵn,
+mỗi trang chỉ thêm 1 lệnh Do.
+"""
+
+import hashlib
+import io
+import os
+import threading
+
+from reportlab import rl_config
+from reportlab.pdfbase import pdfdoc
+
+# Độ phân giải ảnh nền trong PDF (đủ cho bản in thử, giữ file nhỏ)
+PROOF_DPI = 150
+JPEG_QUALITY = 85
+# Số ảnh nền đã chuẩn bị giữ lại trong process
+CACHE_SIZE = 4
+
+
+class BackgroundImage:
+    """Ảnh nền đã mã hóa JPEG, sẵn sàng nhúng vào tài liệu PDF"""
+
+    __slots__ = ("digest", "name", "width", "height", "color_space", "data")
+
+    def __init__(self, digest, width, height, color_space, data):
+        self.digest = digest
+        # Tên form trong tài liệu (ReportLab dùng để tra XObject đã nhúng)
+        self.name = "QuyYBackground_" + digest[:16]
+        self.width = width
+        self.height = height
+        self.color_space = color_space
+        self.data = data
+
+    def _xobject(self):
+        """Image XObject dùng bytes JPEG có sẵn (DCTDecode, không nén lại)"""
+        img = pdfdoc.PDFImageXObject(self.name)
+        img.width = self.width
+        img.height = self.height
+        img.bitsPerComponent = 8
+        img.colorSpace = self.color_space
+        img.mask = None
+        if rl_config.useA85:
+            img.streamContent = pdfdoc.asciiBase85Encode(self.data)
+            img._filters = ("ASCII85Decode", "DCTDecode")
+        else:
+            img.streamContent = self.data
+            img._filters = ("DCTDecode",)
+        return img
+
+    def draw(self, c, width, height):
+        """Vẽ ảnh phủ (0, 0, width, height); nhúng vào tài liệu ở lần gọi đầu"""
+        doc = c._doc
+        reg_name = doc.getXObjectName(self.name)
+        if reg_name not in doc.idToObject:
+            img = self._xobject()
+            c._setXObjects(img)
+            doc.Reference(img, reg_name)
+            doc.addForm(self.name, img)
+        c.saveState()
+        c.scale(width, height)
+        c._code.append("/%s Do" % reg_name)
+        c.restoreState()
+        c._formsinuse.append(self.name)
+
+
+class BackgroundCache:
+    """Chuẩn hóa ảnh phôi 1 lần cho mỗi nội dung file, dùng chung cả process"""
+
+    _lock = threading.Lock()
+    # (SHA-1 file, kích thước điểm ảnh tối đa) -> BackgroundImage
+    _images = {}
+    # (đường dẫn tuyệt đối, kích thước, mtime_ns) -> SHA-1, tránh băm lại file
+    _digests = {}
+
+    @staticmethod
+    def file_digest(path):
+        """SHA-1 nội dung file ảnh (nhớ theo kích thước + mtime)"""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        key = (path, stat.st_size, stat.st_mtime_ns)
+        digest = BackgroundCache._digests.get(key)
+        if digest is None:
+            h = hashlib.sha1()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    h.update(block)
+            digest = h.hexdigest()
+            BackgroundCache._digests[key] = digest
+        return digest
+
+    @staticmethod
+    def get(path, pagesize, dpi=PROOF_DPI):
+        """
+        Ảnh nền cho khổ trang pagesize (point)
+
+        Returns:
+            BackgroundImage hoặc None nếu không có/không đọc được ảnh
+        """
+        if not path or not os.path.exists(path):
+            print(f"[BackgroundCache] Không tìm thấy ảnh phôi: {path}")
+            return None
+        try:
+            digest = BackgroundCache.file_digest(path)
+            max_size = (round(pagesize[0] / 72 * dpi), round(pagesize[1] / 72 * dpi))
+            key = (digest, max_size)
+            with BackgroundCache._lock:
+                image = BackgroundCache._images.get(key)
+            if image is None:
+                image = BackgroundCache._prepare(path, digest, max_size)
+                with BackgroundCache._lock:
+                    if len(BackgroundCache._images) >= CACHE_SIZE:
+                        BackgroundCache._images.clear()
+                    BackgroundCache._images[key] = image
+            return image
+        except Exception as e:
+            print(f"[BackgroundCache] Lỗi đọc ảnh phôi '{path}': {e}")
+            return None
+
+    @staticmethod
+    def _prepare(path, digest, max_size):
+        """Giải mã, thu nhỏ (nếu lớn hơn max_size) và mã hóa JPEG"""
+        from PIL import Image
+
+        with Image.open(path) as im:
+            fmt = im.format
+            im.load()
+            shrink = im.width > max_size[0] or im.height > max_size[1]
+            if fmt == "JPEG" and not shrink and im.mode in ("RGB", "L"):
+                # JPEG đã vừa khổ: nhúng nguyên bytes, không mã hóa lại
+                with open(path, "rb") as f:
+                    data = f.read()
+                return BackgroundImage(digest, im.width, im.height, BackgroundCache._color_space(im.mode), data)
+
+            if im.mode in ("RGBA", "LA", "P"):
+                # Nền trong suốt -> ghép lên giấy trắng
+                rgba = im.convert("RGBA")
+                im = Image.new("RGB", rgba.size, (255, 255, 255))
+                im.paste(rgba, mask=rgba.split()[3])
+            elif im.mode not in ("RGB", "L"):
+                im = im.convert("RGB")
+            if shrink:
+                im = im.copy()
+                im.thumbnail(max_size, Image.Resampling.LANCZOS)
+
+            buffer = io.BytesIO()
+            im.save(buffer, "JPEG", quality=JPEG_QUALITY, optimize=True)
+            return BackgroundImage(digest, im.width, im.height, BackgroundCache._color_space(im.mode), buffer.getvalue())
+
+    @staticmethod
+    def _color_space(mode):
+        return "DeviceGray" if mode == "L" else "DeviceRGB"
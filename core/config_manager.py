@@ -16,6 +16,9 @@ class ConfigManager:
     """Quản lý cấu hình ứng dụng (Field positions, Custom fields)"""
     
     CONFIG_FILENAME = "config.json"
+    # Phiên bản cờ kiểu chữ (bold/italic). File config cũ không có khóa này:
+    # cờ trong đó chưa từng được áp dụng khi in nên coi như chữ thường
+    STYLE_VERSION = 1
     
     def __init__(self):
         # Defaults
@@ -53,12 +56,29 @@ class ConfigManager:
     
     def _save_default_config(self):
         """Lưu config mặc định"""
-        data = {
+        self._save_file(self.config_path, self._data())
+
+    def _data(self):
+        return {
             "field_positions": self.field_positions,
             "excel_mapping": self.excel_mapping,
-            "custom_fields": self.custom_fields
+            "custom_fields": self.custom_fields,
+            "style_version": self.STYLE_VERSION
         }
-        self._save_file(self.config_path, data)
+
+    def _apply(self, data):
+        """Lấy các phần cấu hình có trong data (file cũ -> bỏ cờ bold/italic)"""
+        if "field_positions" in data:
+            self.field_positions = data["field_positions"]
+        if "excel_mapping" in data:
+            self.excel_mapping = data["excel_mapping"]
+        if "custom_fields" in data:
+            self.custom_fields = data["custom_fields"]
+        if data.get("style_version", 0) < self.STYLE_VERSION:
+            for fields in (self.field_positions, self.custom_fields):
+                for conf in fields.values():
+                    conf["bold"] = False
+                    conf["italic"] = False
 
     def load(self):
         """Load configuration từ file config.json"""
@@ -68,13 +88,7 @@ class ConfigManager:
                     content = f.read().strip()
                     if content:
                         data = json.loads(content)
-                        
-                        if "field_positions" in data:
-                            self.field_positions = data["field_positions"]
-                        if "excel_mapping" in data:
-                            self.excel_mapping = data["excel_mapping"]
-                        if "custom_fields" in data:
-                            self.custom_fields = data["custom_fields"]
+                        self._apply(data)
                             
                 print(f"[ConfigManager] Đã load config từ: {self.config_path}")
         except Exception as e:
@@ -83,12 +97,7 @@ class ConfigManager:
     def save(self):
         """Save configuration to config.json"""
         try:
-            data = {
-                "field_positions": self.field_positions,
-                "excel_mapping": self.excel_mapping,
-                "custom_fields": self.custom_fields
-            }
-            self._save_file(self.config_path, data)
+            self._save_file(self.config_path, self._data())
             self.clear_dirty()  # Xóa dirty flag sau khi lưu thành công
             print(f"[ConfigManager] Đã lưu config: {self.config_path}")
         except Exception as e:
@@ -130,6 +139,8 @@ class ConfigManager:
         if new_name != old_name and new_name in self.custom_fields:
             raise ValueError(f"Field '{new_name}' đã tồn tại!")
 
+        # Giữ kiểu chữ đã chọn ở bảng tọa độ
+        old = self.custom_fields.get(old_name, {})
         if new_name != old_name:
             del self.custom_fields[old_name]
             
@@ -138,8 +149,8 @@ class ConfigManager:
             "x": float(x),
             "y": float(y),
             "size": int(size),
-            "bold": False,
-            "italic": False,
+            "bold": old.get("bold", False),
+            "italic": old.get("italic", False),
             "align": align
         }
         self.mark_dirty()  # Đánh dấu đã thay đổi, không auto-save
@@ -157,12 +168,7 @@ class ConfigManager:
                 data = json.load(f)
             
             # Smart merge
-            if "field_positions" in data:
-                self.field_positions = data["field_positions"]
-            if "custom_fields" in data:
-                self.custom_fields = data["custom_fields"]
-            if "excel_mapping" in data:
-                self.excel_mapping = data["excel_mapping"]
+            self._apply(data)
                 
             self.save()
             return True
@@ -171,9 +177,4 @@ class ConfigManager:
 
     def export_to_file(self, filepath):
         """Export config ra file (cho việc backup/share)"""
-        data = {
-            "field_positions": self.field_positions,
-            "excel_mapping": self.excel_mapping,
-            "custom_fields": self.custom_fields
-        }
-        self._save_file(filepath, data)
+        self._save_file(filepath, self._data())
@@ -1,6 +1,31 @@
 # -*- coding: utf-8 -*-
+import sys
+import numpy as np
 import pandas as pd
+from config import EXCEL_FIELD_MAPPING
+from core.date_parser import DateParser
+from core.excel_handler import SOURCE_FILE_COLUMN, SOURCE_SHEET_COLUMN, SOURCE_ROW_COLUMN
 from core.lunar_converter import LunarConverter
+from core.record_batch import RecordBatch
+
+# Trường in PDF -> khóa kết quả chuyển đổi ngày của LunarConverter
+DATE_FIELDS = {
+    "ngay_duong": "solar_day",
+    "thang_duong": "solar_month",
+    "nam_duong": "solar_year",
+    "ngay_am": "lunar_day",
+    "thang_am": "lunar_month",
+    "nam_am": "lunar_year",
+    "phat_lich": "buddhist_year"
+}
+
+# Khóa excel_mapping -> trường in PDF (các cột văn bản)
+TEXT_FIELDS = {
+    "phap_danh": "phap_danh",
+    "ho_ten": "ho_ten",
+    "nam_sinh": "sinh_nam",
+    "dia_chi": "dia_chi"
+}
 
 class DataProcessor:
     """Xử lý dữ liệu từ Excel Row sang định dạng in PDF"""
@@ -21,7 +46,7 @@ class DataProcessor:
         
         if ngay_quy_y and not pd.isna(ngay_quy_y):
             # LunarConverter is now in core
-            date_info = LunarConverter.convert_date(str(ngay_quy_y))
+            date_info = LunarConverter.convert_date(ngay_quy_y)
         else:
             date_info = {
                 'solar_day': '', 'solar_month': '', 'solar_year': '',
@@ -42,3 +67,102 @@ class DataProcessor:
             "nam_am": str(date_info['lunar_year']) if date_info['lunar_year'] else "",
             "phat_lich": str(date_info['buddhist_year']) if date_info['buddhist_year'] else ""
         }
+
+    @staticmethod
+    def _text_column(series, blank_to_empty=False):
+        """
+        Cột văn bản -> list chuỗi (NaN -> chuỗi rỗng)
+        
+        Ép kiểu str chỉ làm 1 lần cho mỗi giá trị khác nhau (factorize, nhanh
+        với cột category), các dòng trùng giá trị dùng chung một đối tượng chuỗi.
+        """
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        strings = [sys.intern(str(v)) for v in uniques]
+        if blank_to_empty:
+            strings = [v if v.strip() else "" for v in strings]
+        strings.append("")  # mã -1 (NaN) -> chuỗi rỗng
+        return [strings[c] for c in codes.tolist()]
+
+    @staticmethod
+    def _source_of(df, pos):
+        """Chú thích nguồn gốc dòng (file, sheet, dòng Excel) nếu df đọc từ nhiều nguồn"""
+        if SOURCE_FILE_COLUMN not in df.columns:
+            return ""
+        return " ({} [{}], dòng {})".format(
+            df[SOURCE_FILE_COLUMN].iat[pos], df[SOURCE_SHEET_COLUMN].iat[pos], df[SOURCE_ROW_COLUMN].iat[pos]
+        )
+
+    @staticmethod
+    def process_frame(df, excel_mapping=None):
+        """
+        Chuyển đổi cả DataFrame sang các cột dữ liệu in PDF (thay cho iterrows + process_row)
+        
+        Args:
+            df: DataFrame đọc từ Excel
+            excel_mapping: dict trường -> tên cột Excel (ConfigManager.excel_mapping)
+            
+        Returns:
+            RecordBatch: các dòng hợp lệ (dạng cột), kèm errors là list
+            (nhãn dòng, thông báo lỗi) của các dòng bị loại và thống kê
+            date_conversions / conversions_saved
+        """
+        mapping = dict(EXCEL_FIELD_MAPPING)
+        if excel_mapping:
+            mapping.update(excel_mapping)
+        
+        n = len(df)
+        empty = pd.Series([None] * n, index=df.index, dtype=object)
+        
+        def column(key):
+            name = mapping.get(key)
+            return df[name] if name in df.columns else empty
+        
+        columns = {}
+        for key, field in TEXT_FIELDS.items():
+            # Pháp danh chỉ có khoảng trắng coi như rỗng
+            columns[field] = DataProcessor._text_column(column(key), blank_to_empty=(field == "phap_danh"))
+        
+        # Ngày quy y: chuẩn hóa cả cột 1 lần (DateParser), dòng lỗi vào báo cáo,
+        # rồi đổi mỗi ngày khác nhau 1 lần (convert_many) và phát lại theo mã factorize
+        dates, invalid = DateParser.parse_column(column("ngay_quy_y"))
+        invalid_rows = dict(invalid)
+        codes, unique_dates = pd.factorize(dates, use_na_sentinel=True)
+        converted = LunarConverter.convert_many(np.asarray(unique_dates, dtype="datetime64[D]"))
+        unique_info = []
+        for i in range(len(unique_dates)):
+            # Chuỗi ngày tạo 1 lần cho mỗi ngày khác nhau rồi dùng chung
+            unique_info.append({
+                field: sys.intern(str(int(converted[key][i]))) if converted[key][i] else ""
+                for field, key in DATE_FIELDS.items()
+            })
+        
+        index = []
+        errors = []
+        rows = []
+        converted_rows = 0
+        labels = df.index.tolist()
+        for pos, code in enumerate(codes.tolist()):
+            if pos in invalid_rows:
+                message = f"Không đọc được ngày: {invalid_rows[pos]!r}"
+                errors.append((labels[pos], message + DataProcessor._source_of(df, pos)))
+                continue
+            info = unique_info[code] if code >= 0 else None
+            if info is not None:
+                converted_rows += 1
+            index.append(labels[pos])
+            rows.append((pos, info))
+        
+        result_columns = {}
+        for field, values in columns.items():
+            result_columns[field] = [values[pos] for pos, _ in rows]
+        empty_date = dict.fromkeys(DATE_FIELDS, "")
+        for field in DATE_FIELDS:
+            result_columns[field] = [(info or empty_date)[field] for _, info in rows]
+        
+        conversions = len(unique_dates)
+        return RecordBatch.from_dict(
+            result_columns, index,
+            errors=errors,
+            date_conversions=conversions,
+            conversions_saved=converted_rows - conversions
+        )
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+Chuẩn hóa cột ngày quy y (dauthoigian) sang datetime64[D]
+
+Chấp nhận trong cùng một cột:
+    - Timestamp / datetime / date / datetime64
+    - Chuỗi ISO "YYYY-MM-DD" (có thể kèm giờ, dấu phân cách - / .)
+    - Chuỗi kiểu Việt Nam "dd/mm/yyyy" (có thể kèm giờ, dấu phân cách / - .)
+    - Số serial ngày của Excel (ô kiểu số, gốc 30/12/1899) từ năm
+      SERIAL_MIN_DATE trở đi; chuỗi chỉ có chữ số ("2025", "15") và số nhỏ
+      hơn là gõ nhầm, đưa vào báo cáo dòng lỗi
+
+Mỗi giá trị khác nhau chỉ được phân tích 1 lần; các chuỗi được tách bằng
+biểu thức chính quy trên cả danh sách cùng lúc (pandas .str.extract).
+Dòng không đọc được được trả về trong danh sách báo cáo, không ném lỗi.
+"""
+
+import datetime
+import numpy as np
+import pandas as pd
+
+
+ISO_PATTERN = r"^\s*(?P<year>\d{4})[-/.](?P<month>\d{1,2})[-/.](?P<day>\d{1,2})(?:[ T].*)?\s*$"
+VN_PATTERN = r"^\s*(?P<day>\d{1,2})[-/.](?P<month>\d{1,2})[-/.](?P<year>\d{4})(?:\s.*)?\s*$"
+
+
+class DateParser:
+    """Chuẩn hóa giá trị ngày từ Excel"""
+
+    # Gốc số serial ngày của Excel (hệ 1900)
+    EXCEL_EPOCH = np.datetime64("1899-12-30", "D")
+    # Serial lớn nhất Excel hỗ trợ (31/12/9999)
+    EXCEL_MAX_SERIAL = 2958465
+    # Ngày quy y sớm nhất chấp nhận từ số serial (số nhỏ hơn thường là năm/ngày gõ nhầm)
+    SERIAL_MIN_DATE = np.datetime64("1950-01-01", "D")
+
+    @staticmethod
+    def _is_missing(value):
+        """Giá trị coi như không có ngày (NaN, None, chuỗi rỗng, 0)"""
+        if value is None:
+            return True
+        if isinstance(value, str):
+            return value.strip() == ""
+        try:
+            if pd.isna(value):
+                return True
+        except (TypeError, ValueError):
+            return False
+        return isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, bool) and value == 0
+
+    @staticmethod
+    def _from_ymd(year, month, day):
+        """Mảng (năm, tháng, ngày) -> datetime64[D], NaT nếu không hợp lệ"""
+        year = np.asarray(year, dtype=np.int64)
+        month = np.asarray(month, dtype=np.int64)
+        day = np.asarray(day, dtype=np.int64)
+        ok = (month >= 1) & (month <= 12) & (day >= 1)
+        months = ((year - 1970) * 12 + np.where(ok, month - 1, 0)).astype("datetime64[M]")
+        first = months.astype("datetime64[D]")
+        days_in_month = ((months + 1).astype("datetime64[D]") - first).astype(np.int64)
+        ok &= day <= days_in_month
+        return np.where(ok, first + np.where(ok, day - 1, 0), np.datetime64("NaT", "D"))
+
+    @staticmethod
+    def _from_serial(serial):
+        """Mảng số serial Excel -> datetime64[D], NaT nếu ngoài phạm vi (trước SERIAL_MIN_DATE)"""
+        serial = np.asarray(serial, dtype=np.float64)
+        ok = (serial >= 1) & (serial <= DateParser.EXCEL_MAX_SERIAL)
+        days = np.floor(np.where(ok, serial, 0)).astype(np.int64)
+        dates = DateParser.EXCEL_EPOCH + days
+        ok &= dates >= DateParser.SERIAL_MIN_DATE
+        return np.where(ok, dates, np.datetime64("NaT", "D"))
+
+    @staticmethod
+    def _parse_strings(strings):
+        """Mảng chuỗi -> datetime64[D] (tách bằng regex trên cả mảng)"""
+        result = np.full(len(strings), np.datetime64("NaT", "D"))
+        if not len(strings):
+            return result
+        s = pd.Series(strings, dtype=object)
+        pending = np.ones(len(s), dtype=bool)
+
+        for pattern in (ISO_PATTERN, VN_PATTERN):
+            parts = s[pending].str.extract(pattern)
+            matched = parts["year"].notna().to_numpy()
+            if matched.any():
+                rows = np.flatnonzero(pending)[matched]
+                p = parts[matched].astype(np.int64)
+                result[rows] = DateParser._from_ymd(p["year"], p["month"], p["day"])
+                pending[rows] = False
+        return result
+
+    @staticmethod
+    def _parse_unique(values):
+        """Danh sách giá trị khác nhau (không thiếu) -> datetime64[D]"""
+        result = np.full(len(values), np.datetime64("NaT", "D"))
+        string_pos, strings = [], []
+        serial_pos, serials = [], []
+        for i, value in enumerate(values):
+            if isinstance(value, str):
+                string_pos.append(i)
+                strings.append(value)
+            elif isinstance(value, bool):
+                continue
+            elif isinstance(value, datetime.datetime):
+                result[i] = np.datetime64(value.date(), "D")
+            elif isinstance(value, datetime.date):
+                result[i] = np.datetime64(value, "D")
+            elif isinstance(value, np.datetime64):
+                result[i] = value.astype("datetime64[D]")
+            elif isinstance(value, (int, float, np.integer, np.floating)):
+                serial_pos.append(i)
+                serials.append(value)
+        if strings:
+            result[string_pos] = DateParser._parse_strings(strings)
+        if serials:
+            result[serial_pos] = DateParser._from_serial(serials)
+        return result
+
+    @staticmethod
+    def parse_column(values):
+        """
+        Chuẩn hóa cả cột ngày
+
+        Args:
+            values: pandas Series, mảng hoặc list giá trị ngày
+
+        Returns:
+            (dates, invalid): dates là mảng datetime64[D] cùng độ dài (NaT nếu
+            thiếu hoặc lỗi), invalid là list (vị trí, giá trị gốc) các dòng
+            có giá trị nhưng không đọc được
+        """
+        # Cột đã là datetime64 (Series, DatetimeIndex, mảng numpy): không cần phân tích
+        dtype = getattr(values, "dtype", None)
+        if dtype is not None and dtype.kind == "M":
+            return np.asarray(values).astype("datetime64[D]"), []
+
+        series = values if isinstance(values, pd.Series) else pd.Series(list(values), dtype=object)
+        n = len(series)
+        if n == 0:
+            return np.array([], dtype="datetime64[D]"), []
+
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        uniques = list(uniques)
+        missing = np.array([DateParser._is_missing(v) for v in uniques], dtype=bool)
+        present = [v for v, m in zip(uniques, missing) if not m]
+        parsed = np.full(len(uniques), np.datetime64("NaT", "D"))
+        parsed[~missing] = DateParser._parse_unique(present)
+
+        dates = np.full(n, np.datetime64("NaT", "D"))
+        has_code = codes >= 0
+        dates[has_code] = parsed[codes[has_code]]
+
+        bad_unique = np.isnat(parsed) & ~missing
+        invalid = []
+        if bad_unique.any():
+            bad_rows = np.flatnonzero(has_code & bad_unique[np.where(has_code, codes, 0)])
+            invalid = [(int(pos), uniques[codes[pos]]) for pos in bad_rows]
+        return dates, invalid
+
+    @staticmethod
+    def parse_value(value):
+        """
+        Chuẩn hóa một giá trị ngày
+
+        Returns:
+            datetime.date hoặc None nếu không có ngày
+
+        Raises:
+            ValueError: nếu có giá trị nhưng không đọc được
+        """
+        if DateParser._is_missing(value):
+            return None
+        dates, invalid = DateParser.parse_column([value])
+        if invalid:
+            raise ValueError(f"Không đọc được ngày: {value!r}")
+        return dates[0].astype(object)
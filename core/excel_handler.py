@@ -1,24 +1,762 @@
 # -*- coding: utf-8 -*-
+import numpy as np
 import pandas as pd
+import hashlib
+import hmac
+import io
 import os
+import re
+import threading
+import zipfile
+from collections import OrderedDict
+from config import EXCEL_FIELD_MAPPING
+
+# Các trường thường lặp lại nhiều (cả làng quy y cùng ngày) -> lưu dạng category
+CATEGORICAL_FIELDS = ("dia_chi", "nam_sinh", "ngay_quy_y")
+
+# Định dạng dữ liệu đọc được (theo phần mở rộng file)
+EXCEL_EXTENSIONS = (".xlsx", ".xlsm", ".xls")
+CSV_EXTENSIONS = (".csv",)
+PARQUET_EXTENSIONS = (".parquet", ".pq")
+FEATHER_EXTENSIONS = (".feather", ".arrow")
+
+# Cột nguồn gốc thêm vào khi đọc nhiều file/sheet (read_sources)
+SOURCE_FILE_COLUMN = "_source_file"
+SOURCE_SHEET_COLUMN = "_source_sheet"
+SOURCE_ROW_COLUMN = "_source_row"
+
+
+def _read_source_job(job):
+    """Đọc một nguồn (filepath, sheet) - chạy trong process con của read_sources"""
+    filepath, sheet_name = job
+    try:
+        return ExcelHandler.read_source(filepath, sheet_name)
+    except Exception as e:
+        label = os.path.basename(filepath) + (f" [{sheet_name}]" if sheet_name else "")
+        raise Exception(f"{label}: {e}")
 
 class ExcelHandler:
     """Xử lý đọc file Excel"""
-    
+
+    # Cache file đã đọc: đường dẫn tuyệt đối -> (khóa, DataFrame đã lọc)
+    # Khóa gồm kích thước + mtime của file và excel_mapping, file sửa trên đĩa
+    # sẽ tự đọc lại; invalidate() để ép đọc lại.
+    CACHE_SIZE = 4
+    _cache = OrderedDict()
+    _cache_lock = threading.Lock()
+
+    # File lớn hơn ngưỡng này được xuất theo kiểu streaming (iter_chunks)
+    STREAM_THRESHOLD_BYTES = 20 * 1024 * 1024
+
+    # Bản sao đã phân tích của file Excel (sidecar), đặt tên theo mã băm nội
+    # dung file -> lần đọc sau không phải phân tích lại XML. Giữ tối đa
+    # SIDECAR_LIMIT file, xóa file cũ nhất khi vượt. Mỗi sidecar bắt đầu bằng
+    # HMAC-SHA256 của phần pickle phía sau (khóa SIDECAR_KEYNAME, tạo 1 lần),
+    # sai mã thì không unpickle mà đọc lại Excel.
+    SIDECAR_VERSION = 2
+    SIDECAR_LIMIT = 8
+    SIDECAR_DIRNAME = ".quyy_cache"
+    SIDECAR_KEYNAME = "sidecar.key"
+    _sidecar_key = None
+    # (đường dẫn tuyệt đối, kích thước, mtime_ns) -> SHA-1 nội dung, tránh băm lại file chưa sửa
+    _digests = {}
+
     @staticmethod
-    def read_file(filepath):
+    def read_file(filepath, excel_mapping=None, use_cache=True):
         """
-        Đọc file Excel và trả về DataFrame đã lọc
+        Đọc file dữ liệu (Excel, CSV, Parquet, Feather) và trả về DataFrame đã lọc
+        
+        Lần đọc lại cùng file (chưa bị sửa) lấy DataFrame từ cache, không
+        phân tích lại file .xlsx. DataFrame trả về dùng chung, không sửa trực tiếp.
+        File Excel đọc lần đầu được lưu sidecar (xem read_source).
         Returns: (count, dataframe)
         """
         if not os.path.exists(filepath):
             raise FileNotFoundError(f"File không tồn tại: {filepath}")
-            
+
+        path = os.path.abspath(filepath)
+        key = ExcelHandler._cache_key(path, excel_mapping)
+        if use_cache:
+            with ExcelHandler._cache_lock:
+                entry = ExcelHandler._cache.get(path)
+                if entry is not None and entry[0] == key:
+                    ExcelHandler._cache.move_to_end(path)
+                    return len(entry[1]), entry[1]
+
         try:
-            df = pd.read_excel(filepath)
+            df = ExcelHandler.read_source(filepath)
             # Lọc bỏ dòng header (những dòng mà hovaten bị Nan)
-            if 'hovaten' in df.columns:
-                df = df[df['hovaten'].notna()]
-            return len(df), df
+            name_column = ExcelHandler._name_column(excel_mapping)
+            if name_column in df.columns:
+                df = df[df[name_column].notna()]
+            df = ExcelHandler.to_categorical(df, excel_mapping)
         except Exception as e:
             raise Exception(f"Lỗi đọc file Excel: {str(e)}")
+
+        if use_cache:
+            ExcelHandler._cache_put(path, key, df)
+        return len(df), df
+
+    @staticmethod
+    def _cache_put(path, key, df):
+        """Thêm DataFrame đã lọc vào cache, bỏ file dùng lâu nhất khi vượt CACHE_SIZE"""
+        with ExcelHandler._cache_lock:
+            ExcelHandler._cache[path] = (key, df)
+            ExcelHandler._cache.move_to_end(path)
+            while len(ExcelHandler._cache) > ExcelHandler.CACHE_SIZE:
+                ExcelHandler._cache.popitem(last=False)
+
+    @staticmethod
+    def read_source(filepath, sheet_name=None):
+        """
+        Đọc nguyên file dữ liệu (chưa lọc) theo phần mở rộng
+
+        CSV/Parquet/Feather đọc trực tiếp. Excel: nếu đã có sidecar của đúng
+        nội dung file thì đọc sidecar, nếu không thì đọc Excel rồi ghi sidecar.
+        sheet_name: tên sheet Excel (None = sheet đầu tiên)
+        """
+        ext = os.path.splitext(filepath)[1].lower()
+        if ext in CSV_EXTENSIONS:
+            return pd.read_csv(filepath, encoding="utf-8-sig")
+        if ext in PARQUET_EXTENSIONS or ext in FEATHER_EXTENSIONS:
+            try:
+                if ext in PARQUET_EXTENSIONS:
+                    return pd.read_parquet(filepath)
+                return pd.read_feather(filepath)
+            except ImportError:
+                raise Exception("Cần cài pyarrow để đọc file Parquet/Feather (pip install pyarrow)")
+
+        sidecar = ExcelHandler.sidecar_path(filepath, sheet_name)
+        if os.path.exists(sidecar):
+            try:
+                df = ExcelHandler._load_sidecar(sidecar)
+                os.utime(sidecar)
+                return df
+            except Exception as e:
+                print(f"[ExcelHandler] Sidecar hỏng, đọc lại Excel: {e}")
+                ExcelHandler._remove(sidecar)
+
+        df = pd.read_excel(filepath, sheet_name=0 if sheet_name is None else sheet_name)
+        ExcelHandler._write_sidecar(df, sidecar)
+        return df
+
+    @staticmethod
+    def sidecar_dir():
+        """Thư mục chứa sidecar (cùng thư mục với config.json)"""
+        from core.resource_manager import get_app_dir
+        return os.path.join(get_app_dir(), ExcelHandler.SIDECAR_DIRNAME)
+
+    @staticmethod
+    def sidecar_path(filepath, sheet_name=None):
+        """Đường dẫn sidecar của file/sheet (theo SHA-1 nội dung file)"""
+        name = ExcelHandler._file_digest(filepath)
+        if sheet_name is not None:
+            name += "_" + hashlib.sha1(str(sheet_name).encode("utf-8")).hexdigest()[:12]
+        # Phiên bản pandas đổi thì định dạng pickle có thể đổi theo
+        name += f"_v{ExcelHandler.SIDECAR_VERSION}_pd{pd.__version__}.pkl"
+        return os.path.join(ExcelHandler.sidecar_dir(), name)
+
+    @staticmethod
+    def _file_digest(filepath):
+        """SHA-1 nội dung file, chỉ băm lại khi kích thước hoặc mtime đổi"""
+        path = os.path.abspath(filepath)
+        stat = os.stat(path)
+        key = (path, stat.st_size, stat.st_mtime_ns)
+        with ExcelHandler._cache_lock:
+            digest = ExcelHandler._digests.get(key)
+        if digest is None:
+            h = hashlib.sha1()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    h.update(block)
+            digest = h.hexdigest()
+            with ExcelHandler._cache_lock:
+                if len(ExcelHandler._digests) >= 64:
+                    ExcelHandler._digests.clear()
+                ExcelHandler._digests[key] = digest
+        return digest
+
+    @staticmethod
+    def has_sidecar(filepath, sheet_name=None):
+        """File Excel đã có sidecar (đọc nhanh) hay chưa"""
+        ext = os.path.splitext(filepath)[1].lower()
+        return ext in EXCEL_EXTENSIONS and os.path.exists(ExcelHandler.sidecar_path(filepath, sheet_name))
+
+    @staticmethod
+    def _signing_key():
+        """Khóa HMAC của sidecar (tạo ngẫu nhiên lần đầu, chỉ user hiện tại đọc được)"""
+        if ExcelHandler._sidecar_key is None:
+            folder = ExcelHandler.sidecar_dir()
+            path = os.path.join(folder, ExcelHandler.SIDECAR_KEYNAME)
+            if not os.path.exists(path):
+                os.makedirs(folder, exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                with os.fdopen(fd, "wb") as f:
+                    f.write(os.urandom(32))
+                os.replace(tmp_path, path)
+            with open(path, "rb") as f:
+                key = f.read()
+            if len(key) != 32:
+                raise ValueError(f"khóa sidecar không hợp lệ: {path}")
+            ExcelHandler._sidecar_key = key
+        return ExcelHandler._sidecar_key
+
+    @staticmethod
+    def _load_sidecar(path):
+        """Đọc sidecar, kiểm tra HMAC trước khi unpickle"""
+        with open(path, "rb") as f:
+            data = f.read()
+        mac, payload = data[:32], data[32:]
+        expected = hmac.new(ExcelHandler._signing_key(), payload, hashlib.sha256).digest()
+        if not hmac.compare_digest(mac, expected):
+            raise ValueError("sai mã kiểm tra")
+        return pd.read_pickle(io.BytesIO(payload))
+
+    @staticmethod
+    def _write_sidecar(df, path):
+        """Ghi sidecar (file tạm rồi đổi tên), lỗi ghi không ảnh hưởng việc đọc"""
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            buffer = io.BytesIO()
+            df.to_pickle(buffer)
+            payload = buffer.getvalue()
+            mac = hmac.new(ExcelHandler._signing_key(), payload, hashlib.sha256).digest()
+            # Tên file tạm riêng cho mỗi process (read_sources ghi song song)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(mac)
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"[ExcelHandler] Không ghi được sidecar {path}: {e}")
+            return
+
+        # Xóa sidecar cũ nhất khi vượt giới hạn; process khác (read_sources)
+        # có thể đang dọn cùng thư mục nên file biến mất giữa chừng thì bỏ qua
+        try:
+            folder = os.path.dirname(path)
+            files = []
+            for name in os.listdir(folder):
+                if name.endswith(".pkl"):
+                    old = os.path.join(folder, name)
+                    try:
+                        files.append((os.path.getmtime(old), old))
+                    except OSError:
+                        pass
+            files.sort(reverse=True)
+            for _, old in files[ExcelHandler.SIDECAR_LIMIT:]:
+                ExcelHandler._remove(old)
+        except OSError as e:
+            print(f"[ExcelHandler] Không dọn được sidecar cũ: {e}")
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def sheet_names(filepath):
+        """Tên các sheet của file Excel theo thứ tự ([] với CSV/Parquet/Feather)"""
+        ext = os.path.splitext(filepath)[1].lower()
+        if ext not in EXCEL_EXTENSIONS:
+            return []
+        if zipfile.is_zipfile(filepath):
+            try:
+                with zipfile.ZipFile(filepath) as z:
+                    return [name for name, _ in ExcelHandler._xlsx_sheets(z)]
+            except (KeyError, zipfile.BadZipFile):
+                pass
+        try:
+            with pd.ExcelFile(filepath) as book:
+                return [str(name) for name in book.sheet_names]
+        except Exception as e:
+            raise Exception(f"Lỗi đọc file Excel: {str(e)}")
+
+    @staticmethod
+    def read_sources(sources, excel_mapping=None, max_workers=None):
+        """
+        Đọc nhiều file/sheet song song và ghép thành một DataFrame
+        
+        Args:
+            sources: list đường dẫn hoặc (đường dẫn, tên sheet); sheet None
+                là sheet đầu tiên
+            excel_mapping: dict trường -> tên cột Excel
+            max_workers: số process đọc song song (mặc định theo số CPU)
+        
+        Mỗi nguồn chưa có sidecar được phân tích trong một process con
+        (openpyxl tốn CPU, thread không chạy song song được), lỗi process
+        pool thì đọc tuần tự. Mỗi nguồn được lọc dòng trống như read_file
+        rồi ghép theo thứ tự sources, nhãn dòng đánh lại 0..N-1; nguồn gốc
+        mỗi dòng nằm ở các cột SOURCE_FILE_COLUMN, SOURCE_SHEET_COLUMN và
+        SOURCE_ROW_COLUMN (số dòng trong Excel, dòng 1 là tiêu đề).
+        Returns: (count, dataframe)
+        """
+        jobs = []
+        for source in sources:
+            filepath, sheet_name = (source, None) if isinstance(source, str) else source
+            if not os.path.exists(filepath):
+                raise FileNotFoundError(f"File không tồn tại: {filepath}")
+            jobs.append((filepath, sheet_name))
+        jobs = list(dict.fromkeys(jobs))
+        if not jobs:
+            return 0, pd.DataFrame()
+
+        try:
+            frames = ExcelHandler._run_jobs(jobs, max_workers)
+            name_column = ExcelHandler._name_column(excel_mapping)
+            parts = []
+            for (filepath, sheet_name), df in zip(jobs, frames):
+                if sheet_name is None:
+                    sheet_name = (ExcelHandler.sheet_names(filepath) or [""])[0]
+                df = df.assign(**{
+                    SOURCE_FILE_COLUMN: os.path.basename(filepath),
+                    SOURCE_SHEET_COLUMN: sheet_name,
+                    SOURCE_ROW_COLUMN: [pos + 2 for pos in range(len(df))],
+                })
+                if name_column in df.columns:
+                    df = df[df[name_column].notna()]
+                parts.append(df)
+            df = pd.concat(parts, ignore_index=True, sort=False)
+            df = df.assign(**{
+                SOURCE_FILE_COLUMN: df[SOURCE_FILE_COLUMN].astype("category"),
+                SOURCE_SHEET_COLUMN: df[SOURCE_SHEET_COLUMN].astype("category"),
+            })
+            df = ExcelHandler.to_categorical(df, excel_mapping)
+        except Exception as e:
+            raise Exception(f"Lỗi đọc file Excel: {str(e)}")
+        return len(df), df
+
+    @staticmethod
+    def _run_jobs(jobs, max_workers=None):
+        """Đọc các nguồn (filepath, sheet), nguồn chưa có sidecar đọc trong process pool"""
+        frames = [None] * len(jobs)
+        pending = []
+        for i, (filepath, sheet_name) in enumerate(jobs):
+            ext = os.path.splitext(filepath)[1].lower()
+            if ext in EXCEL_EXTENSIONS and not ExcelHandler.has_sidecar(filepath, sheet_name):
+                pending.append(i)
+            else:
+                # CSV/Parquet/Feather/sidecar đọc nhanh, không đáng gửi sang process khác
+                frames[i] = _read_source_job(jobs[i])
+
+        workers = min(len(pending), max_workers or os.cpu_count() or 1)
+        if workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            from concurrent.futures.process import BrokenProcessPool
+            try:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    for i, df in zip(pending, pool.map(_read_source_job, [jobs[i] for i in pending])):
+                        frames[i] = df
+                pending = []
+            except (BrokenProcessPool, NotImplementedError, PermissionError) as e:
+                print(f"[ExcelHandler] Không chạy được process pool, đọc tuần tự: {e}")
+        for i in pending:
+            frames[i] = _read_source_job(jobs[i])
+        return frames
+
+    @staticmethod
+    def _name_column(excel_mapping=None):
+        """Tên cột họ tên trong Excel (dùng để lọc dòng trống)"""
+        return (excel_mapping or {}).get("ho_ten") or EXCEL_FIELD_MAPPING["ho_ten"]
+
+    @staticmethod
+    def count_rows(filepath, excel_mapping=None, sheet_name=None):
+        """
+        Đếm số bản ghi (dòng có họ tên) mà không đọc cả file
+
+        File đã có trong cache -> lấy len(DataFrame); CSV/Parquet/Feather và
+        Excel đã có sidecar đọc nhanh rồi đếm. File .xlsx chỉ quét các ô của
+        cột họ tên trong XML của sheet đầu tiên (không dựng DataFrame, không
+        đọc các cột khác). File .xls đọc riêng cột họ tên với dtype str.
+        Kết quả bằng count của read_file; việc đọc đầy đủ để dành đến lúc xuất.
+        """
+        if not os.path.exists(filepath):
+            raise FileNotFoundError(f"File không tồn tại: {filepath}")
+
+        if sheet_name is None and ExcelHandler.is_cached(filepath, excel_mapping):
+            with ExcelHandler._cache_lock:
+                entry = ExcelHandler._cache.get(os.path.abspath(filepath))
+            if entry is not None:
+                return len(entry[1])
+
+        name_column = ExcelHandler._name_column(excel_mapping)
+        ext = os.path.splitext(filepath)[1].lower()
+        try:
+            count = None
+            if ext not in EXCEL_EXTENSIONS or ExcelHandler.has_sidecar(filepath, sheet_name):
+                # CSV/Parquet/Feather/sidecar đọc nhanh, không cần đếm riêng
+                df = ExcelHandler.read_source(filepath, sheet_name)
+                if name_column in df.columns:
+                    return int(df[name_column].notna().sum())
+                return len(df)
+            if zipfile.is_zipfile(filepath):
+                try:
+                    count = ExcelHandler._count_xlsx_column(filepath, name_column, sheet_name)
+                except (KeyError, ValueError, zipfile.BadZipFile) as e:
+                    print(f"[ExcelHandler] Không đếm nhanh được, đọc cột {name_column}: {e}")
+            if count is None:
+                df = pd.read_excel(filepath, sheet_name=0 if sheet_name is None else sheet_name,
+                                   usecols=lambda c: c == name_column, dtype={name_column: str})
+                if name_column not in df.columns:
+                    # Không có cột họ tên -> không lọc, đếm mọi dòng
+                    return len(ExcelHandler.read_source(filepath, sheet_name))
+                count = int(df[name_column].notna().sum())
+        except Exception as e:
+            raise Exception(f"Lỗi đọc file Excel: {str(e)}")
+        return count
+
+    # Ô trong XML của sheet: <c ... r="E12" ...>...</c> hoặc <c ... r="E12" .../>
+    # (r không nhất thiết là thuộc tính đầu tiên)
+    _CELL_PATTERN = rb'<c\b([^>]*?\sr="%s(\d+)"[^>]*?)(?:/>|>(.*?)</c>)'
+    _TYPE_PATTERN = re.compile(rb'\st="(\w+)"')
+    _V_PATTERN = re.compile(rb"<v>([^<]*)</v>")
+    _T_PATTERN = re.compile(rb"<t(?: [^>]*)?>([^<]*)</t>")
+    # Chuỗi pd.read_excel coi là NA (na_values mặc định của pandas)
+    NA_STRINGS = frozenset((
+        "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+        "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a",
+        "nan", "null",
+    ))
+
+    @staticmethod
+    def _count_xlsx_column(filepath, column_name, sheet_name=None, chunk_size=1 << 20):
+        """
+        Đếm ô có giá trị của một cột (theo tên ở dòng 1) trong một sheet
+        (None = sheet đầu tiên)
+
+        Ô chuỗi (dùng chung, inline, kết quả công thức, lỗi) mà pandas đọc
+        thành NA (NA_STRINGS, vd chuỗi rỗng) không được tính.
+
+        Returns:
+            số ô có giá trị (không tính dòng 1), hoặc None nếu không có cột
+        Raises:
+            KeyError/ValueError nếu cấu trúc file không như mong đợi hoặc không
+            tìm thấy ô nào của cột (để đọc lại bằng pandas)
+        """
+        with zipfile.ZipFile(filepath) as z:
+            sheet_path = ExcelHandler._sheet_path(z, sheet_name)
+            with z.open(sheet_path) as f:
+                head = f.read(chunk_size)
+                header = ExcelHandler._xlsx_header(z, head)
+                if header is None:
+                    raise ValueError("không đọc được dòng tiêu đề")
+                if column_name not in header:
+                    return None
+
+                cell = re.compile(ExcelHandler._CELL_PATTERN % re.escape(header[column_name]), re.S)
+                count = 0
+                cells = 0
+                # Chỉ số chuỗi dùng chung -> số ô, đọc sharedStrings.xml sau khi quét
+                shared = {}
+                buffer = head
+                while True:
+                    more = f.read(chunk_size)
+                    # Chỉ quét đến hết dòng cuối cùng đã đọc trọn, phần còn lại ghép với khối sau
+                    end = len(buffer) if not more else buffer.rfind(b"</row>") + len(b"</row>")
+                    if end < len(b"</row>"):
+                        buffer += more
+                        continue
+                    for m in cell.finditer(buffer, 0, end):
+                        if m.group(2) == b"1":
+                            continue
+                        cells += 1
+                        content = m.group(3)
+                        if not content:
+                            continue
+                        kind = ExcelHandler._TYPE_PATTERN.search(m.group(1))
+                        kind = kind.group(1) if kind else b"n"
+                        if kind == b"s":
+                            v = ExcelHandler._V_PATTERN.search(content)
+                            if v:
+                                index = int(v.group(1))
+                                shared[index] = shared.get(index, 0) + 1
+                        elif kind == b"inlineStr":
+                            text = b"".join(ExcelHandler._T_PATTERN.findall(content))
+                            count += ExcelHandler._is_value(text)
+                        else:
+                            v = ExcelHandler._V_PATTERN.search(content)
+                            if v:
+                                # Số/ngày/bool luôn có giá trị; chuỗi công thức, lỗi so với NA_STRINGS
+                                count += ExcelHandler._is_value(v.group(1)) if kind in (b"str", b"e") else bool(v.group(1))
+                    if not more:
+                        break
+                    buffer = buffer[end:] + more
+
+            if not cells:
+                raise ValueError("không tìm thấy ô nào của cột")
+            if shared:
+                strings = dict.fromkeys(shared)
+                ExcelHandler._read_shared_strings(z, strings)
+                for index, n in shared.items():
+                    if strings[index] is None:
+                        raise ValueError("thiếu chuỗi dùng chung")
+                    if strings[index] not in ExcelHandler.NA_STRINGS:
+                        count += n
+            return count
+
+    @staticmethod
+    def _is_value(raw):
+        """Chuỗi trong XML (bytes, chưa giải mã) có phải giá trị khác NA không"""
+        return ExcelHandler._unescape(raw.decode("utf-8")) not in ExcelHandler.NA_STRINGS
+
+    @staticmethod
+    def _xlsx_sheets(z):
+        """Danh sách (tên sheet, r:id) theo thứ tự trong workbook.xml của file .xlsx"""
+        sheets = []
+        for tag in re.findall(rb"<sheet\b[^>]*>", z.read("xl/workbook.xml")):
+            name = re.search(rb'\sname="([^"]*)"', tag)
+            rel_id = re.search(rb'\s\w+:id="([^"]+)"', tag)
+            if name and rel_id:
+                sheets.append((ExcelHandler._unescape(name.group(1).decode("utf-8")), rel_id.group(1)))
+        return sheets
+
+    @staticmethod
+    def _sheet_path(z, sheet_name=None):
+        """Đường dẫn XML của một sheet (None = sheet đầu tiên) trong file .xlsx"""
+        sheets = ExcelHandler._xlsx_sheets(z)
+        if sheet_name is not None:
+            sheets = [sheet for sheet in sheets if sheet[0] == sheet_name]
+        if not sheets:
+            raise ValueError("không tìm thấy sheet")
+        rels = z.read("xl/_rels/workbook.xml.rels")
+        for rel in re.findall(rb"<Relationship\b[^>]*>", rels):
+            rel_id = re.search(rb'\sId="([^"]+)"', rel)
+            target = re.search(rb'\sTarget="([^"]+)"', rel)
+            if rel_id and target and rel_id.group(1) == sheets[0][1]:
+                target = target.group(1).decode("utf-8")
+                return target.lstrip("/") if target.startswith("/") else "xl/" + target
+        raise ValueError("không tìm thấy sheet")
+
+    @staticmethod
+    def _xlsx_header(z, head):
+        """Dòng 1 của sheet: tên cột -> chữ cái cột (bytes), None nếu không đọc được"""
+        cells = re.findall(rb'<c\b([^>]*?\sr="([A-Z]+)1"[^>]*?)(?:/>|>(.*?)</c>)', head, re.S)
+        if not cells:
+            return None
+
+        shared = {}
+        for attrs, letters, content in cells:
+            if b't="s"' in attrs:
+                v = re.search(rb"<v>(\d+)</v>", content)
+                if v:
+                    shared[int(v.group(1))] = None
+        if shared:
+            ExcelHandler._read_shared_strings(z, shared)
+
+        header = {}
+        for attrs, letters, content in cells:
+            if b't="s"' in attrs:
+                v = re.search(rb"<v>(\d+)</v>", content)
+                name = shared.get(int(v.group(1))) if v else None
+            elif b't="inlineStr"' in attrs:
+                name = ExcelHandler._unescape(b"".join(re.findall(rb"<t(?: [^>]*)?>([^<]*)</t>", content)).decode("utf-8"))
+            else:
+                v = re.search(rb"<v>([^<]*)</v>", content)
+                name = ExcelHandler._unescape(v.group(1).decode("utf-8")) if v else None
+            if name:
+                header.setdefault(name, letters)
+        return header
+
+    @staticmethod
+    def _read_shared_strings(z, wanted):
+        """Điền các chuỗi dùng chung cần thiết (chỉ số -> chuỗi), dừng sớm khi đủ"""
+        from xml.etree import ElementTree
+        last = max(wanted)
+        index = 0
+        with z.open("xl/sharedStrings.xml") as f:
+            for event, elem in ElementTree.iterparse(f):
+                if elem.tag.rsplit("}", 1)[-1] != "si":
+                    continue
+                if index in wanted:
+                    wanted[index] = "".join(
+                        t.text or "" for t in elem.iter() if t.tag.rsplit("}", 1)[-1] == "t"
+                    )
+                elem.clear()
+                if index >= last:
+                    return
+                index += 1
+
+    @staticmethod
+    def _unescape(text):
+        from xml.sax.saxutils import unescape
+        return unescape(text, {"&quot;": '"', "&apos;": "'"})
+
+    @staticmethod
+    def _cache_key(path, excel_mapping=None):
+        """Khóa cache: (kích thước, mtime, mapping)"""
+        stat = os.stat(path)
+        mapping = tuple(sorted((excel_mapping or {}).items()))
+        return (stat.st_size, stat.st_mtime_ns, mapping)
+
+    @staticmethod
+    def invalidate(filepath=None):
+        """Xóa cache của một file (hoặc toàn bộ nếu filepath=None)"""
+        with ExcelHandler._cache_lock:
+            if filepath is None:
+                ExcelHandler._cache.clear()
+                ExcelHandler._digests.clear()
+            else:
+                ExcelHandler._cache.pop(os.path.abspath(filepath), None)
+
+    @staticmethod
+    def is_cached(filepath, excel_mapping=None):
+        """File đã có trong cache (và chưa bị sửa) hay chưa"""
+        path = os.path.abspath(filepath)
+        with ExcelHandler._cache_lock:
+            entry = ExcelHandler._cache.get(path)
+        return entry is not None and os.path.exists(path) and entry[0] == ExcelHandler._cache_key(path, excel_mapping)
+
+    @staticmethod
+    def should_stream(filepath):
+        """File Excel đủ lớn (và chưa có sidecar) để đọc kiểu streaming (iter_chunks)"""
+        ext = os.path.splitext(filepath)[1].lower()
+        if ext not in (".xlsx", ".xlsm") or os.path.getsize(filepath) < ExcelHandler.STREAM_THRESHOLD_BYTES:
+            return False
+        return not ExcelHandler.has_sidecar(filepath)
+
+    @staticmethod
+    def iter_chunks(filepath, chunk_size=500, name_column='hovaten', excel_mapping=None):
+        """
+        Đọc file Excel kiểu streaming (openpyxl read-only)
+        
+        Trả về iterator các DataFrame tối đa chunk_size dòng (sheet đầu tiên,
+        đã lọc dòng trống cột name_column), nhãn dòng giống read_file. Không
+        cần biết tổng số dòng trước. Đọc hết lô cuối thì ghi sidecar của cả
+        sheet (giữ các lô đến lúc đó) và đưa DataFrame đã lọc vào cache như
+        read_file(filepath, excel_mapping): xuất/in lại không đọc lại file.
+        """
+        if not os.path.exists(filepath):
+            raise FileNotFoundError(f"File không tồn tại: {filepath}")
+        return ExcelHandler._iter_chunks(filepath, chunk_size, name_column, excel_mapping)
+
+    @staticmethod
+    def _iter_chunks(filepath, chunk_size, name_column, excel_mapping=None):
+        import openpyxl
+        path = os.path.abspath(filepath)
+        key = ExcelHandler._cache_key(path, excel_mapping)
+        try:
+            wb = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
+        except Exception as e:
+            raise Exception(f"Lỗi đọc file Excel: {str(e)}")
+        try:
+            rows = wb.worksheets[0].iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            columns = ExcelHandler._header_names(header)
+            name_pos = columns.index(name_column) if name_column in columns else None
+            
+            # Các lô đã trả ra và dòng bị bỏ qua, giữ lại để ghi sidecar khi đọc hết
+            parts, skipped = [], {}
+            last = -1 # Dòng cuối cùng có dữ liệu (read_excel bỏ các dòng trống ở cuối)
+            buffer, labels = [], []
+            for pos, row in enumerate(rows):
+                row = [ExcelHandler._cell_value(v) for v in row[:len(columns)]]
+                row.extend([None] * (len(columns) - len(row)))
+                if any(v is not None for v in row):
+                    last = pos
+                if name_pos is not None and row[name_pos] is None:
+                    skipped[pos] = row
+                    continue
+                buffer.append(row)
+                labels.append(pos)
+                if len(buffer) >= chunk_size:
+                    parts.append(pd.DataFrame(buffer, columns=columns, index=labels, dtype=object))
+                    yield parts[-1]
+                    buffer, labels = [], []
+            if buffer:
+                parts.append(pd.DataFrame(buffer, columns=columns, index=labels, dtype=object))
+                yield parts[-1]
+        finally:
+            wb.close()
+        df = ExcelHandler._write_streamed_sidecar(filepath, columns, parts, skipped, last)
+        if df is not None:
+            try:
+                name_column = ExcelHandler._name_column(excel_mapping)
+                if name_column in df.columns:
+                    df = df[df[name_column].notna()]
+                ExcelHandler._cache_put(path, key, ExcelHandler.to_categorical(df, excel_mapping))
+            except Exception as e:
+                print(f"[ExcelHandler] Không lưu cache dữ liệu streaming: {e}")
+
+    @staticmethod
+    def _write_streamed_sidecar(filepath, columns, parts, skipped, last):
+        """
+        Ghi sidecar từ các lô đọc streaming (sau lô cuối cùng): ghép lại cả
+        sheet như read_excel để lần xuất sau đọc sidecar thay vì XML
+
+        Returns: DataFrame cả sheet (chưa lọc) hoặc None nếu lỗi
+        """
+        try:
+            frames = list(parts)
+            skipped = {pos: row for pos, row in skipped.items() if pos <= last}
+            if skipped:
+                frames.append(pd.DataFrame(list(skipped.values()), columns=columns, index=list(skipped), dtype=object))
+            if frames:
+                df = pd.concat(frames).sort_index().reset_index(drop=True)
+            else:
+                df = pd.DataFrame(columns=columns, dtype=object)
+            df = df.infer_objects().fillna(np.nan)
+        except Exception as e:
+            print(f"[ExcelHandler] Không dựng được sidecar từ dữ liệu streaming: {e}")
+            return None
+        ExcelHandler._write_sidecar(df, ExcelHandler.sidecar_path(filepath))
+        return df
+
+    @staticmethod
+    def _header_names(header):
+        """Tên cột giống pd.read_excel (ô trống -> 'Unnamed: i', trùng -> 'tên.1')"""
+        names, seen = [], {}
+        for i, value in enumerate(header):
+            name = f"Unnamed: {i}" if value is None else str(value)
+            if name in seen:
+                seen[name] += 1
+                name = f"{name}.{seen[name]}"
+            else:
+                seen[name] = 0
+            names.append(name)
+        return names
+
+    @staticmethod
+    def _cell_value(value):
+        """Chuẩn hóa giá trị ô giống pd.read_excel (số thực nguyên -> int, '' -> None)"""
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        if isinstance(value, str) and value == "":
+            return None
+        return value
+
+    @staticmethod
+    def to_categorical(df, excel_mapping=None, max_unique_ratio=0.5):
+        """
+        Chuyển các cột lặp lại nhiều (CATEGORICAL_FIELDS) sang kiểu category
+
+        Mỗi giá trị khác nhau chỉ lưu 1 lần, các bước xử lý sau (ép kiểu str,
+        đổi ngày) chỉ làm trên danh sách giá trị khác nhau.
+        Chỉ chuyển khi số giá trị khác nhau <= max_unique_ratio * số dòng.
+        """
+        mapping = dict(EXCEL_FIELD_MAPPING)
+        if excel_mapping:
+            mapping.update(excel_mapping)
+
+        if len(df) == 0:
+            return df
+
+        converted = {}
+        for key in CATEGORICAL_FIELDS:
+            name = mapping.get(key)
+            if name not in df.columns or isinstance(df[name].dtype, pd.CategoricalDtype):
+                continue
+            try:
+                if df[name].nunique(dropna=True) <= max_unique_ratio * len(df):
+                    converted[name] = df[name].astype("category")
+            except TypeError:
+                # Giá trị không hash được -> giữ nguyên
+                continue
+
+        if converted:
+            df = df.assign(**converted)
+        return df
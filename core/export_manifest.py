@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Manifest cho xuất PDF tăng dần (chế độ multiple)
+
+File .quyy_manifest.json trong thư mục output ghi lại, cho mỗi file PDF đã
+tạo: dấu vân tay nội dung bản ghi (các trường in PDF) cùng kích thước và
+mtime của file, kèm mã băm bố cục (tọa độ, custom fields, font, khổ giấy, ảnh phôi nếu in thử).
+Lần xuất sau:
+    - bố cục không đổi, file cùng tên cùng vân tay, chưa bị sửa -> bỏ qua
+    - vân tay đã có ở file khác (dòng bị dời chỗ) -> sao chép file cũ
+    - còn lại -> vẽ lại
+    - file trong manifest cũ không còn bản ghi nào dùng -> xóa
+Bố cục đổi thì mọi dòng được vẽ lại. Chỉ file do manifest quản lý bị xóa,
+file khác trong thư mục output không bị động đến.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+from config import PDF_ORIENTATION, FONT_NAME
+from core.font_registry import FontRegistry
+from core.record_batch import RENDER_FIELDS
+
+
+class ExportManifest:
+    """Trạng thái các file PDF đã xuất trong một thư mục output"""
+
+    FILENAME = ".quyy_manifest.json"
+    VERSION = 1
+    # Tăng khi cách vẽ PDF đổi (mọi file cũ cần vẽ lại)
+    RENDER_VERSION = 2
+
+    def __init__(self, output_dir, layout):
+        """
+        Args:
+            output_dir: thư mục output
+            layout: mã băm bố cục hiện tại (layout_hash)
+        """
+        self.output_dir = output_dir
+        self.layout = layout
+        self.path = os.path.join(output_dir, self.FILENAME)
+
+        previous = self._read()
+        # Tên file -> [vân tay, kích thước, mtime_ns] của lần xuất trước
+        self.old_files = previous.get("files", {})
+        # Chỉ dùng lại file khi bố cục giống lần trước
+        self._valid = dict(self.old_files) if previous.get("layout") == layout else {}
+        self._by_fingerprint = {}
+        for name, entry in self._valid.items():
+            self._by_fingerprint.setdefault(entry[0], []).append(name)
+        self.files = {}
+
+        self.skipped = 0
+        self.copied = 0
+        self.removed = 0
+
+    @staticmethod
+    def layout_hash(field_positions, custom_fields, font_path=None, background=None):
+        """
+        Mã băm mọi thứ ảnh hưởng tới nội dung PDF ngoài dữ liệu bản ghi
+        
+        background: BackgroundImage của chế độ in thử (LayoutPlan.background) hoặc None
+        """
+        layout = {
+            "version": ExportManifest.VERSION,
+            "render": ExportManifest.RENDER_VERSION,
+            "field_positions": field_positions,
+            "custom_fields": custom_fields,
+            "orientation": PDF_ORIENTATION,
+            "font": FONT_NAME,
+        }
+        if font_path and os.path.exists(font_path):
+            # File font gốc và các file kiểu đậm/nghiêng đi kèm (FontRegistry)
+            layout["font_files"] = []
+            for path in [font_path] + FontRegistry.variant_paths(FONT_NAME):
+                stat = os.stat(path)
+                layout["font_files"].append([os.path.basename(path), stat.st_size, stat.st_mtime_ns])
+        if background is not None:
+            layout["background"] = [background.digest, background.width, background.height]
+        data = json.dumps(layout, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def fingerprint(data):
+        """Vân tay nội dung một bản ghi (dict hoặc Record) theo các trường in PDF"""
+        values = "\x1f".join(str(data.get(field, "") or "") for field in RENDER_FIELDS)
+        return hashlib.sha1(values.encode("utf-8")).hexdigest()
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == self.VERSION and isinstance(data.get("files"), dict):
+                return data
+        except Exception as e:
+            print(f"[ExportManifest] Manifest hỏng, xuất lại toàn bộ: {e}")
+        return {}
+
+    def _is_intact(self, name, entry):
+        """File trên đĩa còn đúng như lúc ghi vào manifest (chưa bị sửa/ghi đè)"""
+        try:
+            stat = os.stat(os.path.join(self.output_dir, name))
+        except OSError:
+            return False
+        return [stat.st_size, stat.st_mtime_ns] == list(entry[1:3])
+
+    def reuse(self, name, fingerprint):
+        """
+        Dùng lại file cũ cho bản ghi nếu được
+
+        Returns:
+            True nếu file name đã có nội dung đúng (bỏ qua hoặc đã sao chép),
+            False nếu cần vẽ lại
+        """
+        entry = self._valid.get(name)
+        if entry is not None and entry[0] == fingerprint and self._is_intact(name, entry):
+            self.files[name] = entry
+            self.skipped += 1
+            return True
+
+        # name sắp bị ghi đè -> không còn dùng làm nguồn sao chép được
+        self._valid.pop(name, None)
+        for source in self._by_fingerprint.get(fingerprint, []):
+            source_entry = self._valid.get(source)
+            if source_entry is None or not self._is_intact(source, source_entry):
+                continue
+            try:
+                shutil.copyfile(os.path.join(self.output_dir, source), os.path.join(self.output_dir, name))
+            except OSError:
+                continue
+            self.record(name, fingerprint)
+            self.copied += 1
+            return True
+        return False
+
+    def record(self, name, fingerprint):
+        """Ghi nhận file vừa tạo"""
+        self._valid.pop(name, None)
+        stat = os.stat(os.path.join(self.output_dir, name))
+        self.files[name] = [fingerprint, stat.st_size, stat.st_mtime_ns]
+
+    def remove_stale(self):
+        """Xóa file của manifest cũ không còn bản ghi nào dùng, trả về số file đã xóa"""
+        for name in self.old_files:
+            if name in self.files:
+                continue
+            try:
+                os.remove(os.path.join(self.output_dir, name))
+                self.removed += 1
+            except OSError:
+                pass
+        return self.removed
+
+    def save(self):
+        """Ghi manifest (file tạm rồi đổi tên)"""
+        data = {"version": self.VERSION, "layout": self.layout, "files": self.files}
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+Đăng ký font dùng chung cho cả process
+
+Mỗi file TTF chỉ được phân tích (TTFont) 1 lần trong một process, mọi
+PDFGenerator (và mọi worker trong cùng process) dùng chung bản đã đăng ký.
+
+Mỗi font có 4 kiểu: thường, đậm, nghiêng, đậm nghiêng. Kiểu nào có file
+font riêng cạnh file gốc (vd quyyfont-bold.ttf, quyyfont-italic.ttf,
+quyyfont-bolditalic.ttf) thì dùng file đó; nếu không thì giả lập trên font
+thường khi vẽ: đậm = tô + viền chữ (text render mode 2), nghiêng = nghiêng
+ma trận chữ (xem FontStyle).
+
+Subset dùng chung (preseed): ReportLab cắt (subset) và nén lại font cho
+từng file PDF theo các ký tự file đó dùng. Khi xuất hàng nghìn file nhỏ,
+preseed gán trước mã cho toàn bộ VIETNAMESE_COVERAGE ở đầu mỗi tài liệu nên
+mọi file có cùng subset; chương trình font đã cắt + nén được tạo 1 lần và
+dùng lại cho các file sau (đổi lại mỗi file lớn hơn vì chứa đủ bộ chữ).
+Chỉ tài liệu đã preseed mới dùng chương trình font dùng chung; tài liệu
+khác trong cùng process nhúng font như ReportLab bình thường.
+Mặc định tắt: chỉ bật khi SHARED_FONT_SUBSET hoặc DIRECT_PDF_WRITER
+(config.py) bật.
+"""
+
+import os
+import threading
+import weakref
+import zlib
+
+from reportlab.pdfbase import pdfdoc, pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+# Kiểu chữ -> hậu tố tên font đăng ký và hậu tố tên file tìm kiếm
+STYLES = {
+    (False, False): ("", ()),
+    (True, False): ("-Bold", ("-bold", "_bold", "bd", "b")),
+    (False, True): ("-Italic", ("-italic", "_italic", "i")),
+    (True, True): ("-BoldItalic", ("-bolditalic", "_bolditalic", "bi", "z")),
+}
+
+# Bộ ký tự chuẩn bị sẵn cho subset dùng chung: ASCII in được + chữ tiếng Việt
+VIETNAMESE_COVERAGE = (
+    "".join(chr(c) for c in range(32, 127))
+    + "ÀÁÂÃÈÉÊÌÍÒÓÔÕÙÚÝàáâãèéêìíòóôõùúýĂăĐđĨĩŨũƠơƯư"
+    + "ẠạẢảẤấẦầẨẩẪẫẬậẮắẰằẲẳẴẵẶặẸẹẺẻẼẽẾếỀềỂểỄễỆệ"
+    + "ỈỉỊịỌọỎỏỐốỒồỔổỖỗỘộỚớỜờỞởỠỡỢợỤụỦủỨứỪừỬửỮữỰựỲỳỴỵỶỷỸỹ"
+)
+
+# Số chương trình font đã cắt giữ lại cho mỗi font (subset khác nhau khi có ký tự lạ)
+SHARED_SUBSET_CACHE_SIZE = 32
+
+# Thông số giả lập
+SYNTHETIC_BOLD_STROKE = 0.03   # độ dày viền chữ = cỡ chữ * hệ số
+SYNTHETIC_ITALIC_SKEW = 0.21   # tan(12°)
+
+
+class FontStyle:
+    """Font đã đăng ký cho một kiểu chữ, kèm cờ giả lập đậm/nghiêng"""
+
+    __slots__ = ("name", "fake_bold", "fake_italic")
+
+    def __init__(self, name, fake_bold=False, fake_italic=False):
+        self.name = name
+        self.fake_bold = fake_bold
+        self.fake_italic = fake_italic
+
+    def __repr__(self):
+        return f"FontStyle({self.name!r}, fake_bold={self.fake_bold}, fake_italic={self.fake_italic})"
+
+
+class FontRegistry:
+    """Đăng ký font TTF và các kiểu chữ 1 lần cho mỗi process"""
+
+    _lock = threading.Lock()
+    # Tên font -> (đường dẫn tuyệt đối, mtime) của file font thường đã đăng ký
+    _sources = {}
+    # (tên font, đậm, nghiêng) -> FontStyle
+    _styles = {}
+    # (tên font) -> list đường dẫn các file kiểu chữ thật đã dùng
+    _variant_paths = {}
+
+    @staticmethod
+    def register(font_name, font_path):
+        """
+        Đăng ký font (và các kiểu đậm/nghiêng) nếu chưa đăng ký
+
+        Gọi lại với cùng file (chưa bị sửa) không phân tích lại TTF.
+        Returns: True nếu font dùng được
+        """
+        if not os.path.exists(font_path):
+            print(f"File font không tồn tại: {font_path}")
+            return False
+
+        path = os.path.abspath(font_path)
+        source = (path, os.path.getmtime(path))
+        with FontRegistry._lock:
+            if FontRegistry._sources.get(font_name) == source:
+                return True
+            try:
+                pdfmetrics.registerFont(TTFont(font_name, path))
+            except Exception as e:
+                print(f"Lỗi khi đăng ký font '{font_path}': {e}")
+                return False
+
+            variant_paths = []
+            for (bold, italic), (suffix, file_suffixes) in STYLES.items():
+                if not suffix:
+                    FontRegistry._styles[(font_name, False, False)] = FontStyle(font_name)
+                    continue
+                style = FontStyle(font_name, fake_bold=bold, fake_italic=italic)
+                if bold and italic:
+                    # Không có file đậm nghiêng: giả lập phần còn thiếu trên kiểu thật gần nhất
+                    real_bold = FontRegistry._styles[(font_name, True, False)]
+                    real_italic = FontRegistry._styles[(font_name, False, True)]
+                    if not real_bold.fake_bold:
+                        style = FontStyle(real_bold.name, fake_italic=True)
+                    elif not real_italic.fake_italic:
+                        style = FontStyle(real_italic.name, fake_bold=True)
+                variant = FontRegistry._find_variant(path, file_suffixes)
+                if variant:
+                    try:
+                        pdfmetrics.registerFont(TTFont(font_name + suffix, variant))
+                        style = FontStyle(font_name + suffix)
+                        variant_paths.append(variant)
+                    except Exception as e:
+                        print(f"Lỗi khi đăng ký font '{variant}', dùng kiểu giả lập: {e}")
+                FontRegistry._styles[(font_name, bold, italic)] = style
+
+            FontRegistry._register_family(font_name)
+            FontRegistry._variant_paths[font_name] = variant_paths
+            FontRegistry._sources[font_name] = source
+            return True
+
+    @staticmethod
+    def _find_variant(path, file_suffixes):
+        """File font kiểu chữ cạnh file gốc (so tên không phân biệt hoa thường)"""
+        folder, filename = os.path.split(path)
+        stem, ext = os.path.splitext(filename)
+        try:
+            files = {f.lower(): f for f in os.listdir(folder)}
+        except OSError:
+            return None
+        for file_suffix in file_suffixes:
+            for candidate_ext in (ext, ".ttf"):
+                name = (stem + file_suffix + candidate_ext).lower()
+                if name in files and name != filename.lower():
+                    return os.path.join(folder, files[name])
+        return None
+
+    @staticmethod
+    def _register_family(font_name):
+        """Khai báo họ font cho ReportLab (dùng khi vẽ Paragraph <b>/<i>)"""
+        names = {
+            key: FontRegistry._styles[(font_name,) + key].name
+            for key in STYLES
+        }
+        pdfmetrics.registerFontFamily(
+            font_name,
+            normal=names[(False, False)],
+            bold=names[(True, False)],
+            italic=names[(False, True)],
+            boldItalic=names[(True, True)],
+        )
+
+    @staticmethod
+    def style(font_name, bold=False, italic=False):
+        """FontStyle cho kiểu chữ (font phải được register trước)"""
+        return FontRegistry._styles[(font_name, bool(bold), bool(italic))]
+
+    @staticmethod
+    def variant_paths(font_name):
+        """Các file kiểu chữ thật đang dùng cho font"""
+        return list(FontRegistry._variant_paths.get(font_name, []))
+
+    # Tài liệu dùng subset chung (đã preseed)
+    _shared_docs = weakref.WeakSet()
+    # Đang nhúng font cho tài liệu dùng subset chung (trong addSubsetObjects)
+    _embedding = threading.local()
+
+    @staticmethod
+    def preseed(font_name, doc):
+        """
+        Gán trước mã cho VIETNAMESE_COVERAGE trong tài liệu doc (gọi trước
+        khi vẽ chữ đầu tiên bằng font này) để dùng subset chung
+        """
+        font = pdfmetrics.getFont(font_name)
+        if doc in font.state:
+            return
+        FontRegistry._share_font_program(font)
+        FontRegistry._shared_docs.add(doc)
+        font.splitString(VIETNAMESE_COVERAGE, doc)
+
+    @staticmethod
+    def _share_font_program(font):
+        """Cho face của font dùng lại chương trình font đã cắt + nén theo subset"""
+        face = font.face
+        if getattr(face, "_shared_programs", None) is not None:
+            return
+        # tuple(subset) -> (bytes chưa nén, bytes đã nén hoặc None)
+        programs = {}
+        lock = threading.Lock()
+        make_subset = face.makeSubset
+        add_subset_objects = face.addSubsetObjects
+
+        def program(subset):
+            key = tuple(subset)
+            with lock:
+                entry = programs.get(key)
+            if entry is None:
+                entry = [make_subset(subset), None]
+                with lock:
+                    if len(programs) >= SHARED_SUBSET_CACHE_SIZE:
+                        programs.clear()
+                    programs[key] = entry
+            return entry
+
+        def cached_make_subset(subset):
+            if not getattr(FontRegistry._embedding, "shared", False):
+                return make_subset(subset)
+            return program(subset)[0]
+
+        def shared_subset_objects(doc, fontname, subset):
+            if doc not in FontRegistry._shared_docs:
+                return add_subset_objects(doc, fontname, subset)
+            FontRegistry._embedding.shared = True
+            try:
+                descriptor = add_subset_objects(doc, fontname, subset)
+            finally:
+                FontRegistry._embedding.shared = False
+            # Stream chương trình font (khóa nội bộ của ReportLab); không tìm thấy
+            # thì giữ cách nhúng bình thường (ReportLab tự nén)
+            stream = getattr(doc, "idToObject", {}).get("fontFile:%s(%s)" % (face.filename, fontname))
+            if doc.compression and isinstance(stream, pdfdoc.PDFStream) and isinstance(getattr(stream, "dictionary", None), pdfdoc.PDFDictionary):
+                # Thay nội dung stream bằng bản đã nén sẵn, ReportLab không nén lại
+                # khi dictionary đã có Filter
+                entry = program(subset)
+                if entry[1] is None:
+                    entry[1] = zlib.compress(entry[0])
+                stream.content = entry[1]
+                stream.filters = None
+                stream.dictionary["Filter"] = pdfdoc.PDFArray([pdfdoc.PDFName("FlateDecode")])
+            return descriptor
+
+        face.makeSubset = cached_make_subset
+        face.addSubsetObjects = shared_subset_objects
+        face._shared_programs = programs
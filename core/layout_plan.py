@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Kế hoạch vẽ (layout plan) biên dịch sẵn cho một lần xuất
+
+field_positions / custom_fields (mm, gốc góc trên bên trái, dict cấu hình)
+được đổi 1 lần thành danh sách DrawOp phẳng: tọa độ đã nhân mm và lật trục
+Y theo chiều cao trang, font kiểu chữ đã chọn (FontRegistry), hệ số căn lề.
+Mỗi trang chỉ còn lặp qua danh sách và vẽ.
+
+Custom field có giá trị cố định (statics) giống nhau ở mọi trang nên file
+nhiều trang vẽ chúng 1 lần vào một form XObject (STATIC_FORM) rồi mỗi trang
+chỉ tham chiếu form đó.
+
+Chế độ in thử (proof): plan kèm ảnh phôi (core.background_image) vẽ làm nền
+mỗi trang, nhúng 1 lần cho mỗi tài liệu.
+"""
+
+from reportlab.lib.units import mm
+
+from core.font_registry import FontRegistry
+
+# Căn lề -> phần độ rộng chuỗi dịch sang trái
+ALIGN_SHIFT = {"L": 0.0, "C": 0.5, "R": 1.0}
+
+
+class DrawOp:
+    """Một trường cần vẽ, tọa độ tính theo point (gốc dưới trái)"""
+
+    __slots__ = ("key", "text", "x", "y", "size", "shift", "font", "fake_bold", "fake_italic")
+
+    def __init__(self, key, text, config, page_height, font_name):
+        """
+        Args:
+            key: tên trường (field_positions) hoặc tên custom field
+            text: chuỗi cố định (custom field) hoặc None (lấy từ bản ghi)
+            config: dict cấu hình của trường (x, y, size, bold, italic, align)
+            page_height: chiều cao trang (point)
+            font_name: font gốc đã đăng ký với FontRegistry
+        """
+        self.key = key
+        self.text = text
+        self.x = config["x"] * mm
+        self.y = page_height - (config["y"] * mm)
+        self.size = config.get("size", 12)
+        self.shift = ALIGN_SHIFT.get(config.get("align", "L"), 0.0)
+        style = FontRegistry.style(font_name, config.get("bold", False), config.get("italic", False))
+        self.font = style.name
+        self.fake_bold = style.fake_bold
+        self.fake_italic = style.fake_italic
+
+
+class LayoutPlan:
+    """Danh sách DrawOp của trường dữ liệu và custom field cố định"""
+
+    STATIC_FORM = "QuyYStatic"
+
+    __slots__ = ("pagesize", "fields", "statics", "background")
+
+    def __init__(self, pagesize, fields, statics, background=None):
+        self.pagesize = pagesize
+        self.fields = fields
+        self.statics = statics
+        # BackgroundImage vẽ làm nền mỗi trang (chế độ in thử) hoặc None
+        self.background = background
+
+    @classmethod
+    def compile(cls, field_positions, custom_fields, font_name, pagesize, background=None):
+        """
+        Biên dịch cấu hình thành kế hoạch vẽ (font phải được đăng ký trước)
+
+        Args:
+            field_positions: dict trường -> cấu hình (ConfigManager.field_positions)
+            custom_fields: dict tên -> cấu hình có 'value' (ConfigManager.custom_fields)
+            font_name: font gốc
+            pagesize: (rộng, cao) trang, point
+            background: BackgroundImage làm nền trang (optional)
+        """
+        page_height = pagesize[1]
+        fields = [
+            DrawOp(field, None, config, page_height, font_name)
+            for field, config in field_positions.items()
+        ]
+        statics = []
+        for name, config in custom_fields.items():
+            text = config.get("value", "")
+            if text:
+                statics.append(DrawOp(name, str(text), config, page_height, font_name))
+        return cls(pagesize, fields, statics, background)
@@ -5,9 +5,21 @@ Sử dụng thuật toán chuyển đổi lịch Việt Nam
 """
 
 import datetime
+import functools
+import numpy as np
+
+from core.date_parser import DateParser
+
+# Số năm (theo cặp năm, múi giờ) giữ trong cache tháng 11 / tháng nhuận
+YEAR_CACHE_SIZE = 64
 
 class LunarConverter:
     """Chuyển đổi Dương lịch sang Âm lịch"""
+
+    # Bảng tra cứu (LunarTable) khi bật chế độ tra bảng, None = tính trực tiếp
+    _table = None
+    # Bảng dùng riêng cho đổi ngược khi chưa bật chế độ tra bảng (theo múi giờ)
+    _reverse_tables = {}
     
     @staticmethod
     def jd_from_date(dd, mm, yy):
@@ -92,16 +104,159 @@ class LunarConverter:
             arc = LunarConverter.get_sun_longitude(LunarConverter.get_new_moon_day(k + i, timezone), timezone)
         return i - 1
     
+    @staticmethod
+    def enable_table(path=None, persist=True, timezone=7):
+        """
+        Bật chế độ tra bảng dựng sẵn (1900 - 2100)
+
+        Args:
+            path: file bảng (mặc định cạnh config.json)
+            persist: lưu bảng ra file để lần sau chỉ cần memory-map
+            timezone: múi giờ của bảng
+
+        Returns:
+            LunarTable đang dùng
+        """
+        from core.lunar_table import LunarTable
+        LunarConverter._table = LunarTable.load_or_build(path, timezone, persist)
+        return LunarConverter._table
+
+    @staticmethod
+    def disable_table():
+        """Tắt chế độ tra bảng, quay về tính toán trực tiếp"""
+        LunarConverter._table = None
+
+    @staticmethod
+    def get_table(timezone=7):
+        """
+        Bảng tra cứu cho đổi ngược Âm -> Dương
+
+        Dùng bảng đang bật nếu cùng múi giờ, nếu không thì mở/dựng bảng
+        (không bật chế độ tra bảng cho solar_to_lunar).
+        """
+        table = LunarConverter._table
+        if table is not None and table.timezone == timezone:
+            return table
+        if timezone not in LunarConverter._reverse_tables:
+            from core.lunar_table import LunarTable
+            LunarConverter._reverse_tables[timezone] = LunarTable.load_or_build(timezone=timezone)
+        return LunarConverter._reverse_tables[timezone]
+
+    @staticmethod
+    def lunar_to_solar(lunar_day, lunar_month, lunar_year, leap=0, timezone=7):
+        """
+        Chuyển đổi ngày âm lịch sang dương lịch (tra bảng, 1900 - 2100)
+
+        Kết quả khớp với solar_to_lunar: trả về ngày dương đầu tiên mà
+        solar_to_lunar đổi ra đúng (ngày, tháng, năm, leap) đã cho.
+
+        Returns:
+            datetime.date hoặc None nếu ngày âm không tồn tại / ngoài bảng
+        """
+        table = LunarConverter.get_table(timezone)
+        for start, end, first_day in table.month_segments(lunar_year, lunar_month, leap):
+            jd = start + (lunar_day - first_day)
+            if start <= jd <= end:
+                return LunarConverter.date_from_jd(jd)
+        return None
+
+    @staticmethod
+    def lunar_month_range(lunar_month, lunar_year, leap=0, timezone=7):
+        """
+        Tất cả ngày dương lịch thuộc một tháng âm lịch
+
+        Returns:
+            list datetime.date theo thứ tự thời gian (rỗng nếu ngoài bảng)
+        """
+        table = LunarConverter.get_table(timezone)
+        dates = []
+        for start, end, first_day in table.month_segments(lunar_year, lunar_month, leap):
+            dates.extend(LunarConverter.date_from_jd(jd) for jd in range(start, end + 1))
+        return dates
+
+    @staticmethod
+    def lunar_year_range(lunar_year, timezone=7):
+        """
+        Tất cả ngày dương lịch thuộc một năm âm lịch (kể cả tháng nhuận)
+
+        Returns:
+            list datetime.date theo thứ tự thời gian (rỗng nếu ngoài bảng)
+        """
+        dates = []
+        for month in range(1, 13):
+            for leap in (0, 1):
+                dates.extend(LunarConverter.lunar_month_range(month, lunar_year, leap, timezone))
+        dates.sort()
+        return dates
+
+    @staticmethod
+    def date_from_jd(jd):
+        """Đổi Julian day number sang datetime.date"""
+        from core.lunar_table import LunarTable
+        dd, mm, yy = LunarTable._date_from_jd(jd)
+        return datetime.date(yy, mm, dd)
+
     @staticmethod
     def solar_to_lunar(dd, mm, yy, timezone=7):
         """
         Chuyển đổi ngày dương lịch sang âm lịch
+
+        Dùng bảng tra cứu nếu đã bật (enable_table) và ngày nằm trong phạm vi
+        bảng, ngược lại tính trực tiếp bằng calc_solar_to_lunar.
+
+        Returns:
+            tuple: (ngày_âm, tháng_âm, năm_âm, leap_month)
+        """
+        table = LunarConverter._table
+        if table is not None and table.timezone == timezone:
+            result = table.lookup(LunarConverter.jd_from_date(dd, mm, yy))
+            if result is not None:
+                return result
+        return LunarConverter.calc_solar_to_lunar(dd, mm, yy, timezone)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=YEAR_CACHE_SIZE)
+    def _year_context(yy, timezone):
+        """
+        Các giá trị chỉ phụ thuộc (năm, múi giờ), được cache LRU
+
+        Returns:
+            tuple: (tháng11[yy-1], tháng11[yy], tháng11[yy+1],
+                    nhuận tính từ tháng11[yy-1] hoặc None,
+                    nhuận tính từ tháng11[yy] hoặc None)
+        """
+        prev11 = LunarConverter.get_lunar_month_11(yy - 1, timezone)
+        cur11 = LunarConverter.get_lunar_month_11(yy, timezone)
+        next11 = LunarConverter.get_lunar_month_11(yy + 1, timezone)
+        prev_leap = None
+        if cur11 - prev11 > 365:
+            prev_leap = LunarConverter.get_leap_month_offset(prev11, timezone)
+        cur_leap = None
+        if next11 - cur11 > 365:
+            cur_leap = LunarConverter.get_leap_month_offset(cur11, timezone)
+        return prev11, cur11, next11, prev_leap, cur_leap
+
+    @staticmethod
+    def cache_info():
+        """Thống kê cache theo năm (hits, misses, maxsize, currsize)"""
+        return LunarConverter._year_context.cache_info()
+
+    @staticmethod
+    def cache_clear():
+        """Xóa cache theo năm"""
+        LunarConverter._year_context.cache_clear()
+
+    @staticmethod
+    def calc_solar_to_lunar(dd, mm, yy, timezone=7, use_cache=True):
+        """
+        Chuyển đổi ngày dương lịch sang âm lịch (tính trực tiếp)
         
         Args:
             dd: ngày (1-31)
             mm: tháng (1-12)
             yy: năm
             timezone: múi giờ (mặc định 7 cho Việt Nam)
+            use_cache: dùng cache tháng 11 / tháng nhuận theo năm
             
         Returns:
             tuple: (ngày_âm, tháng_âm, năm_âm, leap_month)
@@ -113,14 +268,24 @@ class LunarConverter:
         if monthStart > dayNumber:
             monthStart = LunarConverter.get_new_moon_day(k, timezone)
         
-        a11 = LunarConverter.get_lunar_month_11(yy, timezone)
-        b11 = a11
-        if a11 >= monthStart:
-            lunarYear = yy
-            a11 = LunarConverter.get_lunar_month_11(yy - 1, timezone)
+        if use_cache:
+            prev11, cur11, next11, prev_leap, cur_leap = LunarConverter._year_context(yy, timezone)
+            if cur11 >= monthStart:
+                lunarYear = yy
+                a11, b11, leapMonthDiff = prev11, cur11, prev_leap
+            else:
+                lunarYear = yy + 1
+                a11, b11, leapMonthDiff = cur11, next11, cur_leap
         else:
-            lunarYear = yy + 1
-            b11 = LunarConverter.get_lunar_month_11(yy + 1, timezone)
+            a11 = LunarConverter.get_lunar_month_11(yy, timezone)
+            b11 = a11
+            if a11 >= monthStart:
+                lunarYear = yy
+                a11 = LunarConverter.get_lunar_month_11(yy - 1, timezone)
+            else:
+                lunarYear = yy + 1
+                b11 = LunarConverter.get_lunar_month_11(yy + 1, timezone)
+            leapMonthDiff = None
         
         lunarDay = dayNumber - monthStart + 1
         diff = int((monthStart - a11) / 29)
@@ -128,7 +293,8 @@ class LunarConverter:
         lunarMonth = diff + 11
         
         if b11 - a11 > 365:
-            leapMonthDiff = LunarConverter.get_leap_month_offset(a11, timezone)
+            if leapMonthDiff is None:
+                leapMonthDiff = LunarConverter.get_leap_month_offset(a11, timezone)
             if diff >= leapMonthDiff:
                 lunarMonth = diff + 10
                 if diff == leapMonthDiff:
@@ -147,7 +313,8 @@ class LunarConverter:
         Chuyển đổi chuỗi ngày dương lịch sang âm lịch
         
         Args:
-            date_str: chuỗi ngày dạng "YYYY-MM-DD" hoặc datetime object
+            date_str: chuỗi ngày ("YYYY-MM-DD", "dd/mm/yyyy", số serial Excel)
+                hoặc datetime / Timestamp
             
         Returns:
             dict: {
@@ -160,13 +327,10 @@ class LunarConverter:
                 'buddhist_year': int
             }
         """
-        if isinstance(date_str, str):
-            # Parse string date
-            if ' ' in date_str:
-                date_str = date_str.split(' ')[0]
-            date_obj = datetime.datetime.strptime(date_str, '%Y-%m-%d')
-        else:
-            date_obj = date_str
+        # Chấp nhận Timestamp/datetime, "YYYY-MM-DD", "dd/mm/yyyy", số serial Excel
+        date_obj = DateParser.parse_value(date_str)
+        if date_obj is None:
+            raise ValueError(f"Không có ngày: {date_str!r}")
         
         solar_day = date_obj.day
         solar_month = date_obj.month
@@ -190,6 +354,184 @@ class LunarConverter:
             'buddhist_year': buddhist_year
         }
 
+    # ========== Chuyển đổi hàng loạt (NumPy) ==========
+    # Các hàm _np_* là bản vector hóa 1-1 của các hàm tính toán ở trên:
+    # cùng công thức, cùng thứ tự phép tính, int() được thay bằng np.trunc.
+
+    @staticmethod
+    def _np_jd_from_date(dd, mm, yy):
+        """Bản vector hóa của jd_from_date (mảng int64)"""
+        a = (14 - mm) // 12
+        y = yy + 4800 - a
+        m = mm + 12 * a - 3
+        return dd + (153 * m + 2) // 5 + 365 * y + y // 4 - y // 100 + y // 400 - 32045
+
+    @staticmethod
+    def _np_new_moon_day(k, timezone=7):
+        """Bản vector hóa của get_new_moon_day"""
+        k = np.asarray(k, dtype=np.float64)
+        T = k / 1236.85
+        T2 = T * T
+        T3 = T2 * T
+        dr = 3.14159265358979323846 / 180
+        Jd1 = 2415020.75933 + 29.53058868 * k + 0.0001178 * T2 - 0.000000155 * T3
+        Jd1 = Jd1 + 0.00033 * np.cos((166.56 + 132.87 * T - 0.009173 * T2) * dr)
+        M = 359.2242 + 29.10535608 * k - 0.0000333 * T2 - 0.00000347 * T3
+        Mpr = 306.0253 + 385.81691806 * k + 0.0107306 * T2 + 0.00001236 * T3
+        F = 21.2964 + 390.67050646 * k - 0.0016528 * T2 - 0.00000239 * T3
+        C1 = (0.1734 - 0.000393 * T) * np.sin(M * dr)
+        C1 = C1 + 0.0021 * np.sin(2 * dr * M)
+        C1 = C1 - 0.4068 * np.sin(Mpr * dr)
+        C1 = C1 + 0.0161 * np.sin(2 * dr * Mpr)
+        C1 = C1 - 0.0004 * np.sin(3 * dr * Mpr)
+        C1 = C1 + 0.0104 * np.sin(2 * dr * F)
+        C1 = C1 - 0.0051 * np.sin((M + Mpr) * dr)
+        C1 = C1 - 0.0074 * np.sin((M - Mpr) * dr)
+        C1 = C1 + 0.0004 * np.sin((2 * F + M) * dr)
+        C1 = C1 - 0.0004 * np.sin((2 * F - M) * dr)
+        C1 = C1 - 0.0006 * np.sin((2 * F + Mpr) * dr)
+        C1 = C1 + 0.0010 * np.sin((2 * F - Mpr) * dr)
+        C1 = C1 + 0.0005 * np.sin((2 * Mpr + M) * dr)
+        deltaT = np.where(
+            T < -11,
+            0.001 + 0.000839 * T + 0.0002261 * T2 - 0.00000845 * T3 - 0.000000081 * T * T3,
+            -0.000278 + 0.000265 * T + 0.000262 * T2
+        )
+        JdNew = Jd1 + C1 - deltaT
+        return np.trunc(JdNew + 0.5 + timezone / 24.0).astype(np.int64)
+
+    @staticmethod
+    def _np_sun_longitude(jdn, timezone=7):
+        """Bản vector hóa của get_sun_longitude"""
+        T = (jdn - 2451545.5 - timezone / 24.0) / 36525
+        T2 = T * T
+        dr = 3.14159265358979323846 / 180
+        M = 357.52910 + 35999.05030 * T - 0.0001559 * T2 - 0.00000048 * T * T2
+        L0 = 280.46645 + 36000.76983 * T + 0.0003032 * T2
+        DL = (1.914600 - 0.004817 * T - 0.000014 * T2) * np.sin(dr * M)
+        DL = DL + (0.019993 - 0.000101 * T) * np.sin(dr * 2 * M) + 0.000290 * np.sin(dr * 3 * M)
+        L = L0 + DL
+        L = L * dr
+        L = L - 3.14159265358979323846 * 2 * np.trunc(L / (3.14159265358979323846 * 2))
+        return np.trunc(L / 3.14159265358979323846 * 6).astype(np.int64)
+
+    @staticmethod
+    def _np_lunar_month_11(yy, timezone=7):
+        """Bản vector hóa của get_lunar_month_11"""
+        off = LunarConverter._np_jd_from_date(31, 12, yy) - 2415021
+        k = np.trunc(off / 29.530588853)
+        nm = LunarConverter._np_new_moon_day(k, timezone)
+        sunLong = LunarConverter._np_sun_longitude(nm, timezone)
+        return np.where(sunLong >= 9, LunarConverter._np_new_moon_day(k - 1, timezone), nm)
+
+    @staticmethod
+    def _np_leap_month_offset(a11, timezone=7):
+        """Bản vector hóa của get_leap_month_offset"""
+        k = np.trunc((a11 - 2415021.076998695) / 29.530588853 + 0.5)
+        last = np.zeros(len(k), dtype=np.int64)
+        i = np.ones(len(k), dtype=np.int64)
+        arc = LunarConverter._np_sun_longitude(LunarConverter._np_new_moon_day(k + i, timezone), timezone)
+        active = arc != last
+        while active.any():
+            last = np.where(active, arc, last)
+            i = np.where(active, i + 1, i)
+            new_arc = LunarConverter._np_sun_longitude(LunarConverter._np_new_moon_day(k + i, timezone), timezone)
+            arc = np.where(active, new_arc, arc)
+            active = active & (arc != last) & (i < 14)
+        return i - 1
+
+    @staticmethod
+    def _np_calc_solar_to_lunar(dd, mm, yy, timezone=7):
+        """
+        Bản vector hóa của calc_solar_to_lunar
+
+        Tháng 11 và tháng nhuận chỉ tính một lần cho mỗi năm khác nhau.
+
+        Returns:
+            tuple mảng int64: (ngày_âm, tháng_âm, năm_âm, leap)
+        """
+        dayNumber = LunarConverter._np_jd_from_date(dd, mm, yy)
+        k = np.trunc((dayNumber - 2415021.076998695) / 29.530588853)
+        monthStart = LunarConverter._np_new_moon_day(k + 1, timezone)
+        monthStart = np.where(monthStart > dayNumber, LunarConverter._np_new_moon_day(k, timezone), monthStart)
+
+        years, inverse = np.unique(yy, return_inverse=True)
+        prev11 = LunarConverter._np_lunar_month_11(years - 1, timezone)
+        cur11 = LunarConverter._np_lunar_month_11(years, timezone)
+        next11 = LunarConverter._np_lunar_month_11(years + 1, timezone)
+        prev_leap = LunarConverter._np_leap_month_offset(prev11, timezone)
+        cur_leap = LunarConverter._np_leap_month_offset(cur11, timezone)
+
+        before = cur11[inverse] >= monthStart
+        lunarYear = np.where(before, yy, yy + 1)
+        a11 = np.where(before, prev11[inverse], cur11[inverse])
+        b11 = np.where(before, cur11[inverse], next11[inverse])
+        leapMonthDiff = np.where(before, prev_leap[inverse], cur_leap[inverse])
+
+        lunarDay = dayNumber - monthStart + 1
+        diff = np.trunc((monthStart - a11) / 29).astype(np.int64)
+        lunarMonth = diff + 11
+
+        has_leap = (b11 - a11 > 365) & (diff >= leapMonthDiff)
+        lunarMonth = np.where(has_leap, diff + 10, lunarMonth)
+        lunarLeap = (has_leap & (diff == leapMonthDiff)).astype(np.int64)
+
+        lunarMonth = np.where(lunarMonth > 12, lunarMonth - 12, lunarMonth)
+        lunarYear = np.where((lunarMonth >= 11) & (diff < 4), lunarYear - 1, lunarYear)
+        return lunarDay, lunarMonth, lunarYear, lunarLeap
+
+    @staticmethod
+    def convert_many(dates, timezone=7):
+        """
+        Chuyển đổi hàng loạt ngày dương lịch sang âm lịch
+
+        Args:
+            dates: pandas Series, mảng datetime64 hoặc list (các dạng DateParser đọc được)
+
+        Returns:
+            dict các mảng numpy cùng độ dài với dates: 'solar_day',
+            'solar_month', 'solar_year', 'lunar_day', 'lunar_month',
+            'lunar_year', 'leap', 'buddhist_year' (int64, = 0 nếu không hợp lệ)
+            và 'valid' (bool - ngày đọc được hay không)
+        """
+        days, _ = DateParser.parse_column(dates)
+        valid = ~np.isnat(days)
+
+        n = len(days)
+        result = {key: np.zeros(n, dtype=np.int64) for key in (
+            'solar_day', 'solar_month', 'solar_year',
+            'lunar_day', 'lunar_month', 'lunar_year', 'leap', 'buddhist_year'
+        )}
+        result['valid'] = valid
+        if not valid.any():
+            return result
+
+        d = days[valid]
+        month_start = d.astype("datetime64[M]")
+        yy = d.astype("datetime64[Y]").astype(np.int64) + 1970
+        mm = month_start.astype(np.int64) % 12 + 1
+        dd = (d - month_start).astype(np.int64) + 1
+
+        table = LunarConverter._table
+        if table is not None and table.timezone == timezone:
+            lunar = table.lookup_many(LunarConverter._np_jd_from_date(dd, mm, yy))
+            missing = lunar[0] == 0
+            if missing.any():
+                calc = LunarConverter._np_calc_solar_to_lunar(dd[missing], mm[missing], yy[missing], timezone)
+                for col, values in zip(lunar, calc):
+                    col[missing] = values
+        else:
+            lunar = LunarConverter._np_calc_solar_to_lunar(dd, mm, yy, timezone)
+
+        result['solar_day'][valid] = dd
+        result['solar_month'][valid] = mm
+        result['solar_year'][valid] = yy
+        for key, values in zip(('lunar_day', 'lunar_month', 'lunar_year', 'leap'), lunar):
+            result[key][valid] = values
+        # Phật lịch = năm dương lịch + 544
+        result['buddhist_year'][valid] = yy + 544
+        return result
+
 # Test
 if __name__ == "__main__":
     # Test với một số ngày
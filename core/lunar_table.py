@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+Bảng tra cứu Âm lịch dựng sẵn (1900 - 2100)
+
+Thay vì tính chuỗi lượng giác trăng non / kinh độ mặt trời cho từng ngày,
+bảng lưu các "đoạn" liên tục của lịch âm: mỗi đoạn bắt đầu ở một ngày Julian,
+trong đoạn đó ngày âm tăng đều 1 theo ngày dương, tháng/năm/nhuận không đổi.
+Đoạn mới bắt đầu ở mỗi ngày sóc và ở mỗi ngày 1/1 dương lịch (thuật toán gốc
+tính tháng 11 theo năm dương của ngày cần đổi nên kết quả có thể đổi tại đó).
+
+Tra cứu một ngày = tìm kiếm nhị phân trên cột ngày bắt đầu đoạn.
+Bảng được dựng 1 lần, có thể lưu cạnh config.json và mở lại bằng memory-map.
+"""
+
+import os
+import bisect
+import numpy as np
+
+from core.resource_manager import get_config_path
+
+
+class LunarTable:
+    """Bảng đoạn Âm lịch dựng từ thuật toán gốc của LunarConverter"""
+
+    VERSION = 1
+    YEAR_FROM = 1900
+    YEAR_TO = 2100
+
+    # Thứ tự các hàng trong mảng (5, N) int32
+    ROW_START, ROW_DAY, ROW_MONTH, ROW_YEAR, ROW_LEAP = range(5)
+
+    def __init__(self, data, timezone=7):
+        """
+        Args:
+            data: mảng int32 shape (5, N) - các hàng theo ROW_*
+            timezone: múi giờ dùng khi dựng bảng
+        """
+        self.data = data
+        self.timezone = timezone
+        self.starts = data[self.ROW_START]
+        # Bản sao dạng list cho tra cứu từng ngày (bisect nhanh hơn numpy với 1 phần tử)
+        self._start_list = self.starts.tolist()
+        self._rows = list(zip(*(data[r].tolist() for r in range(1, 5))))
+        self.first_jd = self._start_list[0]
+        self.last_jd = LunarTable._jd(31, 12, self.YEAR_TO)
+        # (năm_âm, tháng_âm, leap) -> [chỉ số đoạn], dựng khi cần đổi ngược
+        self._month_index = None
+
+    @staticmethod
+    def _jd(dd, mm, yy):
+        from core.lunar_converter import LunarConverter
+        return LunarConverter.jd_from_date(dd, mm, yy)
+
+    @staticmethod
+    def default_path(timezone=7):
+        """Đường dẫn file bảng (cùng thư mục với config.json)"""
+        filename = f"lunar_table_v{LunarTable.VERSION}_tz{timezone}.npy"
+        return os.path.join(os.path.dirname(get_config_path()), filename)
+
+    @classmethod
+    def build(cls, timezone=7):
+        """
+        Dựng bảng bằng thuật toán gốc.
+
+        Trong khoảng giữa hai "điểm ứng viên" liên tiếp (ngày sóc, ngày 1/1,
+        ngày đổi chỉ số k của thuật toán) thì ngày bắt đầu tháng và năm dương
+        đều không đổi, nên kết quả tuyến tính theo ngày. Chỉ cần tính thuật
+        toán gốc tại các điểm ứng viên rồi gộp các điểm nối tiếp nhau.
+        """
+        from core.lunar_converter import LunarConverter
+
+        first = cls._jd(1, 1, cls.YEAR_FROM)
+        last = cls._jd(31, 12, cls.YEAR_TO)
+
+        candidates = {first}
+        for yy in range(cls.YEAR_FROM, cls.YEAR_TO + 1):
+            candidates.add(cls._jd(1, 1, yy))
+
+        k_first = int((first - 2415021.076998695) / 29.530588853) - 1
+        k_last = int((last - 2415021.076998695) / 29.530588853) + 2
+        for k in range(k_first, k_last + 1):
+            candidates.add(LunarConverter.get_new_moon_day(k, timezone))
+            # Ngày đầu tiên có int((jd - c) / 29.53...) == k
+            jd_k = int(2415021.076998695 + k * 29.530588853)
+            for jd in (jd_k, jd_k + 1):
+                candidates.add(jd)
+
+        segments = []
+        prev = None
+        prev_jd = None
+        for jd in sorted(c for c in candidates if first <= c <= last):
+            dd, mm, yy = cls._date_from_jd(jd)
+            cur = LunarConverter.calc_solar_to_lunar(dd, mm, yy, timezone)
+            if prev is not None:
+                expected = (prev[0] + (jd - prev_jd),) + prev[1:]
+                if cur == expected:
+                    continue
+            segments.append((jd,) + cur)
+            prev, prev_jd = cur, jd
+
+        data = np.array(segments, dtype=np.int32).T.copy()
+        return cls(data, timezone)
+
+    @staticmethod
+    def _date_from_jd(jd):
+        """Đổi Julian day number sang (ngày, tháng, năm) dương lịch"""
+        a = jd + 32044
+        b = (4 * a + 3) // 146097
+        c = a - (b * 146097) // 4
+        d = (4 * c + 3) // 1461
+        e = c - (1461 * d) // 4
+        m = (5 * e + 2) // 153
+        day = e - (153 * m + 2) // 5 + 1
+        month = m + 3 - 12 * (m // 10)
+        year = b * 100 + d - 4800 + m // 10
+        return day, month, year
+
+    def save(self, path):
+        """Lưu bảng ra file .npy (ghi file tạm rồi đổi tên)"""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, self.data)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, timezone=7, mmap=True):
+        """Mở bảng đã lưu (memory-map), trả về None nếu file hỏng/không khớp"""
+        try:
+            data = np.load(path, mmap_mode="r" if mmap else None)
+        except Exception as e:
+            print(f"[LunarTable] Không đọc được bảng {path}: {e}")
+            return None
+        if data.ndim != 2 or data.shape[0] != 5 or data.dtype != np.int32 or data.shape[1] == 0:
+            return None
+        table = cls(data, timezone)
+        if table.first_jd != cls._jd(1, 1, cls.YEAR_FROM):
+            return None
+        return table
+
+    @classmethod
+    def load_or_build(cls, path=None, timezone=7, persist=True):
+        """
+        Mở bảng từ file nếu có, nếu không thì dựng mới (và lưu lại nếu persist)
+
+        Args:
+            path: đường dẫn file bảng (mặc định cạnh config.json)
+            timezone: múi giờ
+            persist: có lưu bảng ra file hay không
+        """
+        if path is None:
+            path = cls.default_path(timezone)
+
+        if os.path.exists(path):
+            table = cls.load(path, timezone)
+            if table is not None:
+                return table
+
+        table = cls.build(timezone)
+        if persist:
+            try:
+                table.save(path)
+            except Exception as e:
+                print(f"[LunarTable] Không lưu được bảng {path}: {e}")
+        return table
+
+    def lookup(self, jd):
+        """
+        Tra cứu một ngày Julian
+
+        Returns:
+            tuple (ngày_âm, tháng_âm, năm_âm, leap) hoặc None nếu ngoài bảng
+        """
+        if not self.first_jd <= jd <= self.last_jd:
+            return None
+        i = bisect.bisect_right(self._start_list, jd) - 1
+        day, month, year, leap = self._rows[i]
+        return (day + (jd - self._start_list[i]), month, year, leap)
+
+    def lookup_many(self, jd):
+        """
+        Tra cứu hàng loạt (mảng ngày Julian)
+
+        Returns:
+            tuple 4 mảng int64 (ngày_âm, tháng_âm, năm_âm, leap);
+            ngày ngoài bảng có ngày_âm = 0
+        """
+        jd = np.asarray(jd, dtype=np.int64)
+        inside = (jd >= self.first_jd) & (jd <= self.last_jd)
+        i = np.searchsorted(self.starts, jd, side="right") - 1
+        i = np.clip(i, 0, len(self.starts) - 1)
+        day = self.data[self.ROW_DAY][i] + (jd - self.starts[i])
+        columns = [day] + [self.data[r][i] for r in (self.ROW_MONTH, self.ROW_YEAR, self.ROW_LEAP)]
+        return tuple(np.where(inside, col, 0).astype(np.int64) for col in columns)
+
+    def segment_end(self, i):
+        """Ngày Julian cuối cùng của đoạn thứ i"""
+        if i + 1 < len(self._start_list):
+            return self._start_list[i + 1] - 1
+        return self.last_jd
+
+    def month_segments(self, lunar_year, lunar_month, leap=0):
+        """
+        Các đoạn thuộc một tháng âm lịch
+
+        Returns:
+            list (jd_bắt_đầu, jd_kết_thúc, ngày_âm_đầu_đoạn) theo thứ tự thời gian
+        """
+        if self._month_index is None:
+            index = {}
+            for i, (day, month, year, is_leap) in enumerate(self._rows):
+                index.setdefault((year, month, is_leap), []).append(i)
+            self._month_index = index
+        return [
+            (self._start_list[i], self.segment_end(i), self._rows[i][0])
+            for i in self._month_index.get((lunar_year, lunar_month, 1 if leap else 0), [])
+        ]
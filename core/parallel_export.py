@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+"""
+Vẽ PDF song song bằng process pool: nhiều file (chế độ multiple) và file
+gộp chia đoạn (chế độ single, ShardedMergeExporter + core.pdf_stitcher)
+
+Mỗi process con đăng ký font và biên dịch LayoutPlan 1 lần lúc khởi động
+(_init_worker), sau đó nhận từng lô CHUNK_SIZE việc (đường dẫn output, dict
+bản ghi) và vẽ liên tiếp. Kết quả trả về theo đúng thứ tự gửi đi nên tiến độ
+và danh sách lỗi giống hệt khi vẽ tuần tự. Số lô đang chờ bị giới hạn
+(WINDOW_PER_WORKER lô mỗi process) nên đọc streaming không dồn hết bản ghi
+vào bộ nhớ.
+
+direct=True: process con vẽ bằng TemplatePDFWriter (core.template_writer,
+ghi PDF theo khuôn trang) thay cho PDFGenerator; generator truyền vào khi đó
+cũng là TemplatePDFWriter. Subset font chung (FontRegistry.preseed) theo
+generator truyền vào (PDFGenerator.shared_subset, SHARED_FONT_SUBSET).
+
+File gộp: nếu PDFStitcher không đọc được cấu trúc file generator tạo ra
+(kiểm tra trước bằng 2 trang đầu) thì vẽ tuần tự, không lỗi giữa chừng.
+
+Việc ít (chưa đủ 2 lô), chỉ 1 CPU hoặc không tạo được process pool (bị
+chặn, exe đóng gói thiếu freeze_support...) thì vẽ tuần tự trong thread hiện
+tại bằng generator truyền vào.
+"""
+
+import io
+import itertools
+import os
+import shutil
+import tempfile
+from collections import deque
+
+from core.pdf_generator import PDFGenerator
+from core.template_writer import TemplatePDFWriter
+
+# Generator và LayoutPlan của process con (tạo 1 lần trong _init_worker)
+_worker = None
+
+
+def _init_worker(font_path, field_positions, custom_fields, proof, direct=False, shared_subset=False):
+    """Khởi động process con: đăng ký font, biên dịch bố cục (direct: dựng khuôn trang)"""
+    global _worker
+    generator = PDFGenerator(font_path=font_path, shared_subset=shared_subset or direct)
+    plan = generator.compile_layout(field_positions, custom_fields, proof=proof)
+    if direct:
+        generator = TemplatePDFWriter(generator, plan)
+    _worker = (generator, plan)
+
+
+def _render_chunk(jobs):
+    """Vẽ một lô (output_path, dict bản ghi) trong process con, trả về list (lỗi, bytes PDF)"""
+    generator, plan = _worker
+    return _render_jobs(generator, plan, jobs)
+
+
+def _render_shard(job):
+    """Vẽ một đoạn trang liên tiếp (bản ghi, file shard) trong process con, trả về số trang"""
+    generator, plan = _worker
+    records, path = job
+    return generator.create_merged_pdf(records, path, plan=plan)
+
+
+def _render_jobs(generator, plan, jobs):
+    """output_path None -> vẽ trong bộ nhớ, trả bytes PDF; lỗi là chuỗi hoặc None"""
+    results = []
+    for output_path, data in jobs:
+        try:
+            if output_path is None:
+                buffer = io.BytesIO()
+                generator.create_single_pdf(data, buffer, plan=plan)
+                results.append((None, buffer.getvalue()))
+            else:
+                generator.create_single_pdf(data, output_path, plan=plan)
+                results.append((None, None))
+        except Exception as e:
+            results.append((str(e), None))
+    return results
+
+
+class ParallelExporter:
+    """Vẽ các file PDF một trang song song, trả kết quả theo thứ tự"""
+
+    CHUNK_SIZE = 32
+    WINDOW_PER_WORKER = 2
+
+    def __init__(self, generator, plan, field_positions, custom_fields, proof=False, max_workers=None):
+        """
+        Args:
+            generator: PDFGenerator hoặc TemplatePDFWriter dùng khi vẽ tuần tự
+                (và lấy font_path cho process con; TemplatePDFWriter thì process
+                con cũng vẽ theo khuôn trang)
+            plan: LayoutPlan đã biên dịch cho lần xuất
+            field_positions, custom_fields, proof: để process con biên dịch lại plan
+            max_workers: số process (None/0 = số CPU, 1 = tuần tự)
+        """
+        self.generator = generator
+        self.plan = plan
+        direct = isinstance(generator, TemplatePDFWriter)
+        # Process con dùng subset font chung giống generator truyền vào
+        shared_subset = direct or generator.shared_subset
+        self.initargs = (generator.font_path, field_positions, custom_fields, proof, direct, shared_subset)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        # Số process đã dùng thực tế (1 = tuần tự)
+        self.workers = 1
+
+    def imap(self, items):
+        """
+        Vẽ các việc theo thứ tự
+
+        Args:
+            items: iterable (context, output_path, data); data None = không cần
+                vẽ (file dùng lại, lỗi chuẩn bị...), chỉ trả lại context;
+                output_path None = vẽ trong bộ nhớ (core.zip_sink)
+
+        Yields:
+            (context, lỗi, bytes PDF): lỗi là chuỗi hoặc None; bytes chỉ có
+            khi output_path None, cùng thứ tự với items
+        """
+        chunks = self._chunks(items)
+        first = list(itertools.islice(chunks, 2))
+        chunks = itertools.chain(first, chunks)
+        if self.max_workers > 1 and len(first) > 1:
+            yield from self._imap_pool(chunks)
+        else:
+            for chunk in chunks:
+                yield from self._render_local(chunk)
+
+    def _chunks(self, items):
+        """Gom items thành lô theo số việc cần vẽ (việc không vẽ đi kèm lô hiện tại)"""
+        chunk, rendered = [], 0
+        for item in items:
+            chunk.append(item)
+            if item[2] is not None:
+                rendered += 1
+                if rendered >= self.CHUNK_SIZE:
+                    yield chunk
+                    chunk, rendered = [], 0
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def _jobs(chunk):
+        return [(output_path, data) for _, output_path, data in chunk if data is not None]
+
+    @staticmethod
+    def _merge(chunk, results):
+        """Ghép kết quả của các việc đã vẽ vào đúng vị trí trong lô"""
+        results = iter(results)
+        for context, _, data in chunk:
+            error, pdf = next(results) if data is not None else (None, None)
+            yield context, error, pdf
+
+    def _render_local(self, chunk):
+        results = _render_jobs(self.generator, self.plan, self._jobs(chunk))
+        return self._merge(chunk, results)
+
+    def _imap_pool(self, chunks):
+        from concurrent.futures import ProcessPoolExecutor
+        from concurrent.futures.process import BrokenProcessPool
+
+        pending = deque()
+        try:
+            pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_worker,
+                initargs=self.initargs,
+            )
+        except (NotImplementedError, PermissionError, OSError) as e:
+            print(f"[ParallelExporter] Không tạo được process pool, vẽ tuần tự: {e}")
+            for chunk in chunks:
+                yield from self._render_local(chunk)
+            return
+
+        self.workers = self.max_workers
+        window = self.max_workers * self.WINDOW_PER_WORKER
+        broken = False
+        try:
+            for chunk in chunks:
+                if broken:
+                    yield from self._render_local(chunk)
+                    continue
+                try:
+                    pending.append((chunk, pool.submit(_render_chunk, self._jobs(chunk))))
+                except (BrokenProcessPool, RuntimeError) as e:
+                    print(f"[ParallelExporter] Process pool hỏng, vẽ tuần tự phần còn lại: {e}")
+                    broken = True
+                    pending.append((chunk, None))
+                while len(pending) >= window or (broken and pending):
+                    broken = yield from self._collect(pending, broken)
+            while pending:
+                broken = yield from self._collect(pending, broken)
+        finally:
+            for _, future in pending:
+                if future is not None:
+                    future.cancel()
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _collect(self, pending, broken):
+        """Lấy kết quả lô cũ nhất; lô lỗi do pool hỏng thì vẽ lại tuần tự"""
+        from concurrent.futures.process import BrokenProcessPool
+
+        chunk, future = pending.popleft()
+        if future is not None and not broken:
+            try:
+                yield from self._merge(chunk, future.result())
+                return broken
+            except (BrokenProcessPool, OSError) as e:
+                print(f"[ParallelExporter] Process pool hỏng, vẽ tuần tự phần còn lại: {e}")
+                broken = True
+        yield from self._render_local(chunk)
+        return broken
+
+
+class ShardedMergeExporter(ParallelExporter):
+    """
+    Vẽ file gộp song song: chia bản ghi thành các đoạn SHARD_PAGES trang,
+    mỗi process vẽ một đoạn ra file tạm, rồi PDFStitcher ghép lại theo thứ
+    tự (font subset dùng chung nên các shard chung một bản font)
+    """
+
+    SHARD_PAGES = 250
+
+    def render(self, records, output_path, progress_callback=None, total=None):
+        """
+        Vẽ records thành output_path; việc ít (chưa đủ 2 đoạn), 1 CPU hoặc
+        PDFStitcher không đọc được file do generator tạo (thử trước 2 trang
+        đầu, _can_stitch) thì vẽ thẳng bằng generator như create_merged_pdf
+
+        Returns:
+            số trang đã vẽ
+        """
+        from core.pdf_stitcher import PDFStitcher
+
+        records = iter(records)
+        head = list(itertools.islice(records, self.SHARD_PAGES + 1))
+        shard_dir = None
+        if self.max_workers > 1 and len(head) > self.SHARD_PAGES:
+            shard_dir = tempfile.mkdtemp(prefix="quyy_shards_", dir=os.path.dirname(os.path.abspath(output_path)))
+            if not self._can_stitch(head[:2], shard_dir):
+                shutil.rmtree(shard_dir, ignore_errors=True)
+                shard_dir = None
+        if shard_dir is None:
+            def page_progress(current, _total):
+                if progress_callback:
+                    progress_callback(current, total)
+            return self.generator.create_merged_pdf(
+                itertools.chain(head, records), output_path,
+                progress_callback=page_progress, plan=self.plan
+            )
+
+        stitcher = PDFStitcher(output_path)
+        pages = 0
+        try:
+            shards = self._shards(itertools.chain(head, records), shard_dir)
+            for path, count in self._imap_shards(shards):
+                stitcher.add(path)
+                os.remove(path)
+                pages += count
+                if progress_callback:
+                    progress_callback(pages, total)
+            stitcher.close()
+        except Exception:
+            stitcher.abort()
+            raise
+        finally:
+            shutil.rmtree(shard_dir, ignore_errors=True)
+        return pages
+
+    def _can_stitch(self, records, shard_dir):
+        """Vẽ thử records ra file tạm và ghép trong bộ nhớ; cấu trúc PDF lạ (đổi phiên bản ReportLab...) -> False"""
+        from core.pdf_stitcher import PDFObjectReader, PDFObjectWriter, PDFStitchError
+
+        path = os.path.join(shard_dir, "probe.pdf")
+        try:
+            self.generator.create_merged_pdf(records, path, plan=self.plan)
+            reader = PDFObjectReader(path)
+            writer = PDFObjectWriter(io.BytesIO())
+            pages_num = writer.allocate()
+            mapping = {}
+            for num in reader.page_refs():
+                writer.copy_page(reader, num, mapping, pages_num)
+            return True
+        except PDFStitchError as e:
+            print(f"[ShardedMergeExporter] Không ghép được file PDF, vẽ tuần tự: {e}")
+            return False
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _shards(self, records, shard_dir):
+        """Yields (list dict bản ghi, đường dẫn file shard)"""
+        for number in itertools.count(1):
+            chunk = [r.to_dict() if hasattr(r, "to_dict") else dict(r) for r in itertools.islice(records, self.SHARD_PAGES)]
+            if not chunk:
+                return
+            yield chunk, os.path.join(shard_dir, f"{number:05d}.pdf")
+
+    def _render_shard_local(self, job):
+        records, path = job
+        return self.generator.create_merged_pdf(records, path, plan=self.plan)
+
+    def _imap_shards(self, shards):
+        from concurrent.futures import ProcessPoolExecutor
+        from concurrent.futures.process import BrokenProcessPool
+
+        try:
+            pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_worker,
+                initargs=self.initargs,
+            )
+        except (NotImplementedError, PermissionError, OSError) as e:
+            print(f"[ShardedMergeExporter] Không tạo được process pool, vẽ tuần tự: {e}")
+            for job in shards:
+                yield job[1], self._render_shard_local(job)
+            return
+
+        self.workers = self.max_workers
+        window = self.max_workers * self.WINDOW_PER_WORKER
+        pending = deque()
+        broken = False
+
+        def collect():
+            nonlocal broken
+            job, future = pending.popleft()
+            if future is not None and not broken:
+                try:
+                    return job[1], future.result()
+                except (BrokenProcessPool, OSError) as e:
+                    print(f"[ShardedMergeExporter] Process pool hỏng, vẽ tuần tự phần còn lại: {e}")
+                    broken = True
+            return job[1], self._render_shard_local(job)
+
+        try:
+            for job in shards:
+                future = None
+                if not broken:
+                    try:
+                        future = pool.submit(_render_shard, job)
+                    except (BrokenProcessPool, RuntimeError) as e:
+                        print(f"[ShardedMergeExporter] Process pool hỏng, vẽ tuần tự phần còn lại: {e}")
+                        broken = True
+                pending.append((job, future))
+                while len(pending) >= window or (broken and pending):
+                    yield collect()
+            while pending:
+                yield collect()
+        finally:
+            for _, future in pending:
+                if future is not None:
+                    future.cancel()
+            pool.shutdown(wait=True, cancel_futures=True)
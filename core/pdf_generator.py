@@ -1,30 +1,39 @@
+import io
 import os
 import sys
+import zlib
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4, landscape
 from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.units import mm
 
 try:
     from config import FIELD_POSITIONS, FONT_NAME, A4_WIDTH, A4_HEIGHT, PDF_ORIENTATION, CUSTOM_FIELDS, EXCEL_FIELD_MAPPING
-    from core.resource_manager import get_font_path
+    from core.resource_manager import get_font_path, find_phoimau_path
+    from core.font_registry import FontRegistry, SYNTHETIC_BOLD_STROKE, SYNTHETIC_ITALIC_SKEW
+    from core.layout_plan import LayoutPlan, DrawOp
+    from core.background_image import BackgroundCache
 except ImportError:
     # Fallback for testing inside core/
     sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     from config import FIELD_POSITIONS, FONT_NAME, A4_WIDTH, A4_HEIGHT, PDF_ORIENTATION, CUSTOM_FIELDS, EXCEL_FIELD_MAPPING
-    from core.resource_manager import get_font_path
+    from core.resource_manager import get_font_path, find_phoimau_path
+    from core.font_registry import FontRegistry, SYNTHETIC_BOLD_STROKE, SYNTHETIC_ITALIC_SKEW
+    from core.layout_plan import LayoutPlan, DrawOp
+    from core.background_image import BackgroundCache
 
 
 class PDFGenerator:
     """Tạo PDF cho lá phái quy y"""
     
-    def __init__(self, font_path=None):
+    def __init__(self, font_path=None, shared_subset=False):
         """
         Khởi tạo PDF Generator
         
         Args:
             font_path: đường dẫn đến file font TTF
+            shared_subset: mọi file dùng chung một subset font tiếng Việt cắt
+                sẵn (nhanh hơn khi tạo nhiều file nhỏ, mỗi file lớn hơn -
+                xem FontRegistry.preseed)
         """
         if font_path:
             self.font_path = font_path
@@ -34,132 +43,327 @@ class PDFGenerator:
             
         self.font_name = FONT_NAME
         self.font_registered = False
+        self.shared_subset = shared_subset
+        # Cache độ rộng chuỗi (text, font, size) -> width cho căn giữa/phải
+        self._width_cache = {}
 
     def register_font(self):
-        """Đăng ký font Unicode"""
+        """Đăng ký font Unicode và các kiểu đậm/nghiêng (FontRegistry, 1 lần cho cả process)"""
         if not self.font_registered:
-            # Check exist
-            if os.path.exists(self.font_path):
-                try:
-                    pdfmetrics.registerFont(TTFont(self.font_name, self.font_path))
-                    self.font_registered = True
-                    return True
-                except Exception as e:
-                    print(f"Lỗi khi đăng ký font '{self.font_path}': {e}")
-                    return False
-            else:
-                 print(f"File font không tồn tại: {self.font_path}")
-                 return False
-                 
+            self.font_registered = FontRegistry.register(self.font_name, self.font_path)
         return self.font_registered
     
-    def create_single_pdf(self, data, output_path, field_positions=None, custom_fields=None):
+    def compile_layout(self, field_positions=None, custom_fields=None, proof=False, background_path=None):
         """
-        Tạo PDF cho một bản ghi
+        Biên dịch tọa độ/custom fields thành LayoutPlan (1 lần cho mỗi lần xuất)
         
         Args:
-            data: dict chứa thông tin cần in
-            output_path: đường dẫn file PDF output
             field_positions: dict tọa độ các trường (optional, dùng FIELD_POSITIONS nếu None)
             custom_fields: dict các trường tùy chỉnh (optional, dùng CUSTOM_FIELDS nếu None)
+            proof: chế độ in thử - vẽ ảnh phôi làm nền mỗi trang (nhúng 1 lần
+                cho mỗi file PDF, xem core.background_image)
+            background_path: ảnh phôi cho proof (optional, mặc định find_phoimau_path)
         """
-        # Sử dụng config nếu không truyền vào
-        positions = field_positions or FIELD_POSITIONS
-        customs = custom_fields or CUSTOM_FIELDS
-        
-        # Tạo canvas PDF (A4 landscape hoặc portrait)
-        # Check orientation from config
+        self.register_font()
         is_landscape = (PDF_ORIENTATION == "landscape")
         pagesize = landscape(A4) if is_landscape else A4
-        page_width, page_height = pagesize
+        background = None
+        if proof:
+            background = BackgroundCache.get(background_path or find_phoimau_path(), pagesize)
+        return LayoutPlan.compile(
+            field_positions or FIELD_POSITIONS,
+            custom_fields or CUSTOM_FIELDS,
+            self.font_name,
+            pagesize,
+            background
+        )
+    
+    def create_single_pdf(self, data, output_path, field_positions=None, custom_fields=None, plan=None):
+        """
+        Tạo PDF cho một bản ghi
+        
+        Args:
+            data: dict hoặc Record (core.record_batch) chứa thông tin cần in
+            output_path: đường dẫn file PDF output
+            field_positions: dict tọa độ các trường (optional, dùng FIELD_POSITIONS nếu None)
+            custom_fields: dict các trường tùy chỉnh (optional, dùng CUSTOM_FIELDS nếu None)
+            plan: LayoutPlan biên dịch sẵn (compile_layout); có plan thì bỏ qua
+                field_positions/custom_fields
+        """
+        if plan is None:
+            plan = self.compile_layout(field_positions, custom_fields)
         
-        c = canvas.Canvas(output_path, pagesize=pagesize)
+        c = canvas.Canvas(output_path, pagesize=plan.pagesize)
         
         self.register_font()
         c.setFont(self.font_name, 12)
         
-        # Vẽ các trường cố định (field_positions)
-        for field, config in positions.items():
-            if field in data:
-                self._draw_field(c, data[field], config, page_height)
-                
-        # Vẽ các trường tùy chỉnh (custom_fields)
-        # Custom fields có thể là static text (value) hoặc dynamic (nếu khớp key data?)
-        # Theo logic hiện tại, custom field có 'value' cứng.
-        for field_name, config in customs.items():
-            self._draw_custom_field(c, field_name, config, page_height)
-            
+        # File 1 trang: vẽ custom fields trực tiếp, form không có lợi
+        self._draw_page(c, data, plan)
+        
         c.save()
 
-    def create_merged_pdf(self, data_list, output_path, field_positions=None, custom_fields=None, progress_callback=None):
+    def create_merged_pdf(self, data_list, output_path, field_positions=None, custom_fields=None, progress_callback=None, plan=None):
         """
         Tạo 1 file PDF chứa nhiều trang (mỗi trang 1 bản ghi)
+        
+        Args:
+            data_list: list dict, RecordBatch (core.record_batch) hoặc iterator bản ghi
+            plan: LayoutPlan biên dịch sẵn (compile_layout)
         """
-        positions = field_positions or FIELD_POSITIONS
-        customs = custom_fields or CUSTOM_FIELDS
+        if plan is None:
+            plan = self.compile_layout(field_positions, custom_fields)
         
-        is_landscape = (PDF_ORIENTATION == "landscape")
-        pagesize = landscape(A4) if is_landscape else A4
-        page_width, page_height = pagesize
+        # data_list có thể là iterator (đọc streaming) -> không biết trước tổng số
+        total = len(data_list) if hasattr(data_list, '__len__') else None
+        records = iter(data_list)
+        pages, _ = self._write_volume(records, next(records, None), output_path, plan, total, progress_callback)
+        return pages
+
+    def create_merged_volumes(self, data_list, output_path, max_pages=0, max_mb=0, progress_callback=None, plan=None, volumes=None):
+        """
+        Tạo PDF gộp theo kiểu streaming, tách thành nhiều tập khi đủ số trang/dung lượng
         
-        c = canvas.Canvas(output_path, pagesize=pagesize)
-        self.register_font()
+        Bản ghi được lấy dần từ iterator; mỗi tập là một tài liệu ReportLab
+        riêng, lưu xong mới bắt đầu tập sau, nên bộ nhớ chỉ phụ thuộc kích
+        thước một tập chứ không phụ thuộc tổng số dòng.
         
-        total = len(data_list)
-        for i, data in enumerate(data_list):
-            c.setFont(self.font_name, 12)
+        Args:
+            data_list: list, RecordBatch hoặc iterator bản ghi
+            output_path: đường dẫn file gộp, vd .../QuyY_TatCa.pdf; khi tách
+                tập các file là QuyY_TatCa_001.pdf, QuyY_TatCa_002.pdf...
+            max_pages: số trang tối đa mỗi tập (0 = không giới hạn)
+            max_mb: dung lượng ước tính tối đa mỗi tập, MB (0 = không giới hạn)
+            progress_callback: (số trang đã vẽ, tổng hoặc None)
+            plan: LayoutPlan biên dịch sẵn (compile_layout)
+            volumes: list nhận (đường dẫn, số trang) từng tập ngay khi lưu
+                xong - lỗi giữa chừng thì vẫn biết các tập đã lưu
+        
+        Returns:
+            list (đường dẫn, số trang) các tập đã tạo, theo thứ tự
+        """
+        if plan is None:
+            plan = self.compile_layout()
+        if not max_pages and not max_mb:
+            return [(output_path, self.create_merged_pdf(data_list, output_path, progress_callback=progress_callback, plan=plan))]
+        
+        total = len(data_list) if hasattr(data_list, '__len__') else None
+        records = iter(data_list)
+        fixed = len(plan.background.data) if plan.background is not None else 0
+        limit = VolumeLimit(max_pages, max_mb, fixed)
+        if volumes is None:
+            volumes = []
+        done = 0
+        first = next(records, None)
+        if max_mb and first is not None:
+            # Dung lượng thật của 1 trang (đối tượng trang, tài nguyên, nội dung
+            # nén): vẽ thử bản ghi đầu 1 lần và 2 lần vào bộ nhớ
+            sizes = []
+            for extra in ([], [first]):
+                buffer = io.BytesIO()
+                self._write_volume(iter(extra), first, buffer, plan, None, None)
+                sizes.append(len(buffer.getvalue()))
+            limit.probe(sizes[1] - sizes[0])
+        while first is not None:
+            path = self.volume_path(output_path, len(volumes) + 1)
             
-            # Draw standard fields
-            for field, config in positions.items():
-                if field in data:
-                    self._draw_field(c, data[field], config, page_height)
+            def volume_progress(current, _total, offset=done):
+                if progress_callback:
+                    progress_callback(offset + current, total)
             
-            # Draw custom fields
-            for field_name, config in customs.items():
-                self._draw_custom_field(c, field_name, config, page_height)
-                
+            pages, first = self._write_volume(records, first, path, plan, None, volume_progress, limit)
+            limit.calibrate(path)
+            volumes.append((path, pages))
+            done += pages
+        return volumes
+
+    @staticmethod
+    def volume_path(output_path, number):
+        """Tên file của tập thứ number: QuyY_TatCa.pdf -> QuyY_TatCa_001.pdf"""
+        base, ext = os.path.splitext(output_path)
+        return f"{base}_{number:03d}{ext}"
+
+    def _write_volume(self, records, first, output_path, plan, total, progress_callback, limit=None):
+        """
+        Vẽ bản ghi first và các bản ghi tiếp theo của records vào một file
+        
+        Returns:
+            (số trang, bản ghi đầu tiên của tập sau hoặc None nếu đã hết)
+        """
+        c = canvas.Canvas(output_path, pagesize=plan.pagesize)
+        self.register_font()
+        
+        # Custom fields cố định: vẽ 1 lần vào form, mỗi trang chỉ tham chiếu
+        static_form = False
+        if plan.statics:
+            c.beginForm(plan.STATIC_FORM)
+            for op in plan.statics:
+                self._draw_op(c, op, op.text)
+            c.endForm()
+            static_form = True
+        if limit is not None:
+            limit.start()
+        
+        count = 0
+        data = first
+        while data is not None:
+            c.setFont(self.font_name, 12)
+            self._draw_page(c, data, plan, static_form)
+            if limit is not None:
+                limit.add_page(c)
             c.showPage() # End page
             
+            count += 1
             if progress_callback:
-                progress_callback(i + 1, total)
+                progress_callback(count, total)
+            data = next(records, None)
+            if data is not None and limit is not None and limit.reached(count):
+                break
                 
         c.save()
-        return total
+        return count, data
+
+    def _draw_page(self, c, data, plan, static_form=False):
+        """Vẽ nền (chế độ in thử), các trường của một bản ghi rồi tới custom fields (form hoặc vẽ trực tiếp)"""
+        if plan.background is not None:
+            plan.background.draw(c, plan.pagesize[0], plan.pagesize[1])
+        for op in plan.fields:
+            if op.key in data:
+                text = data[op.key]
+                if text:
+                    self._draw_op(c, op, str(text))
+        if static_form:
+            c.doForm(plan.STATIC_FORM)
+        else:
+            for op in plan.statics:
+                self._draw_op(c, op, op.text)
 
     def _draw_field(self, c, text, config, page_height):
-        """Vẽ một trường lên canvas"""
+        """Vẽ một trường lên canvas theo dict cấu hình (không qua LayoutPlan)"""
         if not text: return
+        self._draw_op(c, DrawOp(None, None, config, page_height, self.font_name), str(text))
+
+    def _draw_op(self, c, op, text):
+        """Vẽ một chuỗi theo DrawOp đã biên dịch"""
+        font_name = op.font
+        if self.shared_subset:
+            FontRegistry.preseed(font_name, c._doc)
+        c.setFont(font_name, op.size)
         
-        x = config["x"] * mm
-        # ReportLab coordinate system starts from bottom-left
-        # But our config is likely top-left based (common in UI).
-        # Convert y: y_draw = page_height - y_config
-        y = page_height - (config["y"] * mm)
-        
-        size = config.get("size", 12)
-        font_name = self.font_name
-        
-        # Apply Bold/Italic via font switching if available, or just standard font for now.
-        # TTFont registers a single face. To support Bold, we need slightly difference handling or register variants.
-        # For simplicity, assuming the font supports it or we just use size/align.
-        # User config includes 'bold', 'italic'. ReportLab needs 'FontName-Bold'.
-        # Since we only registered 'QuyYFont', we sticking to it.
-        # Maybe simulate bold? c.setTextRenderMode(2)? No.
-        # We will ignore bold/italic for custom font unless we register variants.
-        
-        c.setFont(font_name, size)
-        
-        align = config.get("align", "L")
-        
-        if align == "C":
-            c.drawCentredString(x, y, str(text))
-        elif align == "R":
-            c.drawRightString(x, y, str(text))
-        else:
-            c.drawString(x, y, str(text))
+        # Tương đương drawString/drawCentredString/drawRightString nhưng độ rộng
+        # chỉ đo 1 lần cho mỗi chuỗi khác nhau (ngày tháng, địa chỉ lặp lại nhiều)
+        x = op.x
+        if op.shift:
+            x = x - op.shift * self._string_width(text, font_name, op.size)
+        y = op.y
+        t = c.beginText(x, y)
+        if op.fake_italic:
+            t.setTextTransform(1, 0, SYNTHETIC_ITALIC_SKEW, 1, x, y)
+        if op.fake_bold:
+            c.setLineWidth(op.size * SYNTHETIC_BOLD_STROKE)
+            t.setTextRenderMode(2)
+        t.textLine(text)
+        if op.fake_bold:
+            # Render mode nằm trong trạng thái đồ họa, trả về 0 cho trường sau
+            t.setTextRenderMode(0)
+        c.drawText(t)
+
+    def _string_width(self, text, font_name, size):
+        """Độ rộng chuỗi (có cache)"""
+        key = (text, font_name, size)
+        width = self._width_cache.get(key)
+        if width is None:
+            if len(self._width_cache) > 100000:
+                self._width_cache.clear()
+            width = pdfmetrics.stringWidth(text, font_name, size)
+            self._width_cache[key] = width
+        return width
+
+
+class VolumeLimit:
+    """Điều kiện tách tập của create_merged_volumes (số trang, dung lượng ước tính)"""
+
+    # Ước tính ban đầu (byte): đối tượng trang + stream + xref mỗi trang, font nhúng
+    PAGE_OVERHEAD = 400
+    FONT_OVERHEAD = 32 * 1024
+    # Phần dự phòng cho sai số ước tính: tập đầu chưa hiệu chỉnh sai nhiều hơn
+    MARGIN_FIRST = 0.10
+    MARGIN = 0.03
+
+    def __init__(self, max_pages=0, max_mb=0, fixed_bytes=0):
+        """
+        Args:
+            max_pages: số trang tối đa mỗi tập (0 = không giới hạn)
+            max_mb: dung lượng tối đa mỗi tập, MB (0 = không giới hạn)
+            fixed_bytes: phần cố định mỗi tập ngoài font (vd ảnh nền)
+        """
+        self.max_pages = max_pages or 0
+        self.max_bytes = (max_mb or 0) * 1024 * 1024
+        self.fixed = fixed_bytes + self.FONT_OVERHEAD
+        # Byte file / byte lệnh vẽ chưa nén: tập đầu ước tính bằng cách nén
+        # thử trang đầu tiên, sau mỗi tập hiệu chỉnh theo kích thước file thật
+        self.ratio = None
+        self.overhead = self.PAGE_OVERHEAD
+        self.raw_bytes = 0
+        self.pages = 0
+        self.calibrated = False
+        # Số byte thật của 1 trang đo bằng probe() (None = chưa đo)
+        self.page_bytes = None
+
+    def start(self):
+        self.raw_bytes = 0
+        self.pages = 0
+
+    def add_page(self, c):
+        """Cộng độ dài lệnh vẽ của trang hiện tại (gọi trước showPage)"""
+        if not self.max_bytes:
+            return
+        size = sum(len(op) for op in c._code)
+        if self.ratio is None and size:
+            content = "\n".join(c._code).encode("latin-1", "replace")
+            compressed = len(zlib.compress(content))
+            self.ratio = compressed / len(content)
+            if self.page_bytes:
+                # Phần ngoài nội dung trang lấy theo trang vẽ thử
+                self.overhead = max(self.page_bytes - compressed, self.PAGE_OVERHEAD)
+        self.raw_bytes += size
+        self.pages += 1
+
+    def probe(self, page_bytes):
+        """Số byte thật của 1 trang (chênh lệch file 2 trang và 1 trang cùng bản ghi)"""
+        self.page_bytes = page_bytes
+
+    def _variable(self):
+        return self.raw_bytes * (self.ratio or 1.0) + self.pages * self.overhead
+
+    def estimate(self):
+        """Dung lượng ước tính của tập đang vẽ (byte)"""
+        return self.fixed + self._variable()
+
+    def reached(self, pages):
+        """
+        Tập đang vẽ đã đủ chưa (gọi trước khi vẽ trang tiếp theo): dung lượng
+        là giới hạn trên - thêm 1 trang cỡ trung bình nữa mà vượt max_mb
+        (trừ phần dự phòng) thì dừng
+        """
+        if self.max_pages and pages >= self.max_pages:
+            return True
+        if not self.max_bytes or not self.pages:
+            return False
+        margin = self.MARGIN if self.calibrated else self.MARGIN_FIRST
+        next_page = self._variable() / self.pages
+        return self.estimate() + next_page > self.max_bytes * (1 - margin)
 
-    def _draw_custom_field(self, c, name, config, page_height):
-        """Vẽ custom field"""
-        text = config.get("value", "")
-        # Custom field logic is same structure as standard field
-        self._draw_field(c, text, config, page_height)
+    def calibrate(self, path):
+        """Hiệu chỉnh phần theo trang từ kích thước file tập vừa lưu"""
+        variable = self._variable()
+        if not self.max_bytes or not variable:
+            return
+        try:
+            actual = os.path.getsize(path)
+        except OSError:
+            return
+        scale = max(actual - self.fixed, 1) / variable
+        self.ratio = (self.ratio or 1.0) * scale
+        self.overhead *= scale
+        self.calibrated = True
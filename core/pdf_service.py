@@ -4,34 +4,71 @@ import threading
 import platform
 import tempfile
 import shutil
+import itertools
+import pandas as pd
 from core.pdf_generator import PDFGenerator
 from core.data_processor import DataProcessor
+from core.lunar_converter import LunarConverter
+from core.export_manifest import ExportManifest
+from core.parallel_export import ParallelExporter, ShardedMergeExporter
+from core.template_writer import TemplatePDFWriter
+from core.zip_sink import ZipOutputSink
+from config import EXPORT_WORKERS, MERGED_VOLUME_PAGES, MERGED_VOLUME_MB, DIRECT_PDF_WRITER, SHARED_FONT_SUBSET, MULTIPLE_ZIP, ZIP_COMPRESSION
 
 class PDFService:
     """Service quản lý việc tạo và in PDF"""
     
-    def __init__(self):
+    ZIP_FILENAME = "QuyY_NhieuFile.zip"
+    
+    def __init__(self, export_workers=EXPORT_WORKERS, direct_writer=DIRECT_PDF_WRITER, shared_subset=SHARED_FONT_SUBSET):
+        """
+        export_workers: số process vẽ song song (nhiều file, file gộp chia đoạn; 0 = số CPU, 1 = tuần tự)
+        direct_writer: ghi PDF theo khuôn trang (core.template_writer) thay cho ReportLab canvas
+        shared_subset: chế độ nhiều file dùng chung subset font cắt sẵn (FontRegistry.preseed)
+        """
         self.generator = PDFGenerator()
+        # Chế độ nhiều file (khuôn trang luôn cần subset chung)
+        self.batch_generator = PDFGenerator(shared_subset=shared_subset or direct_writer)
+        self.export_workers = export_workers
+        self.direct_writer = direct_writer
     
-    def run_batch_export(self, df, output_dir, config_manager, mode="multiple", progress_callback=None, completion_callback=None):
-        """Chạy tiến trình xuất PDF trong thread riêng"""
+    def run_batch_export(self, df, output_dir, config_manager, mode="multiple", progress_callback=None, completion_callback=None, incremental=False, proof=False,
+                         volume_pages=MERGED_VOLUME_PAGES, volume_mb=MERGED_VOLUME_MB, zip_output=MULTIPLE_ZIP, row_count=None):
+        """
+        Chạy tiến trình xuất PDF trong thread riêng
+        
+        df: DataFrame hoặc iterator các DataFrame (ExcelHandler.iter_chunks)
+        row_count: số dòng dữ liệu đã đếm trước (ExcelHandler.count_rows), dùng
+        làm tổng số khi đọc streaming; không biết (None) thì progress_callback
+        nhận total=None.
+        incremental: (chế độ multiple) chỉ vẽ dòng mới/thay đổi so với lần xuất
+        trước vào cùng thư mục, xóa file không còn dùng (core.export_manifest)
+        proof: bản in thử - mỗi trang có ảnh phôi làm nền (core.background_image)
+        volume_pages, volume_mb: (chế độ single) tách file gộp thành
+        QuyY_TatCa_001.pdf, _002.pdf... mỗi N trang / khoảng M MB (0 = không tách)
+        zip_output: (chế độ multiple) ghi mọi file PDF vào QuyY_NhieuFile.zip kèm
+        index.csv (core.zip_sink); bỏ qua incremental
+        """
         thread = threading.Thread(
             target=self._export_process,
-            args=(df, output_dir, config_manager, mode, False, progress_callback, completion_callback)
+            args=(df, output_dir, config_manager, mode, False, progress_callback, completion_callback, incremental, proof),
+            kwargs={"volume_pages": volume_pages, "volume_mb": volume_mb, "zip_output": zip_output, "row_count": row_count}
         )
         thread.daemon = True
         thread.start()
 
-    def run_print_job(self, df, config_manager, mode="multiple", progress_callback=None, completion_callback=None):
-        """Chạy tiến trình in PDF (tạo temp -> in -> xóa temp)"""
+    def run_print_job(self, df, config_manager, mode="multiple", progress_callback=None, completion_callback=None, proof=False, row_count=None):
+        """Chạy tiến trình in PDF (tạo temp -> in -> xóa temp); proof: in kèm ảnh phôi lên giấy trắng"""
         thread = threading.Thread(
             target=self._export_process,
-            args=(df, None, config_manager, mode, True, progress_callback, completion_callback)
+            args=(df, None, config_manager, mode, True, progress_callback, completion_callback, False, proof),
+            kwargs={"row_count": row_count}
         )
         thread.daemon = True
         thread.start()
         
-    def _export_process(self, df, output_dir, config_manager, mode, is_print, progress_callback, completion_callback):
+    def _export_process(self, df, output_dir, config_manager, mode, is_print, progress_callback, completion_callback, incremental=False, proof=False,
+                        volume_pages=0, volume_mb=0, zip_output=False, row_count=None):
         # Setup temp dir for printing
         if is_print:
             temp_dir_obj = tempfile.mkdtemp()
@@ -47,70 +84,184 @@ class PDFService:
             success_count = 0
             error_count = 0
             errors = []
+            sink = None
             
-            total = len(df)
             field_positions = config_manager.field_positions
             custom_fields = config_manager.custom_fields
+            # Tọa độ/custom fields biên dịch 1 lần cho cả lần xuất (core.layout_plan)
+            plan = self.generator.compile_layout(field_positions, custom_fields, proof=proof)
+            # Khuôn trang dựng 1 lần cho lần xuất (lần vẽ đầu tiên), dùng subset font chung
+            writer = TemplatePDFWriter(self.batch_generator, plan) if self.direct_writer else None
+            
+            # Bảng tra âm lịch dựng/đọc 1 lần cho process (lỗi thì tính trực tiếp)
+            if LunarConverter._table is None:
+                try:
+                    LunarConverter.enable_table()
+                except Exception as e:
+                    print(f"[PDFService] Không dùng được bảng âm lịch, tính trực tiếp: {e}")
+            
+            # --- DATA PHASE --- (xử lý theo cột, đổi mỗi ngày quy y 1 lần)
+            # df là DataFrame (cả file) hoặc iterator các DataFrame (ExcelHandler.iter_chunks)
+            streaming = not isinstance(df, pd.DataFrame)
+            if not streaming:
+                batches = [DataProcessor.process_frame(df, config_manager.excel_mapping)]
+                total = len(batches[0])
+            else:
+                batches = (DataProcessor.process_frame(chunk, config_manager.excel_mapping) for chunk in df)
+                # Số dòng đếm lúc chọn file (gồm cả dòng lỗi dữ liệu), None = chưa biết
+                total = row_count
+            result["date_conversions"] = 0
+            result["conversions_saved"] = 0
+            data_errors = []
+            
+            def records():
+                """Các bản ghi hợp lệ theo thứ tự, ghi nhận lỗi dữ liệu của từng lô"""
+                for batch in batches:
+                    result["date_conversions"] += batch.date_conversions
+                    result["conversions_saved"] += batch.conversions_saved
+                    data_errors.extend(batch.errors)
+                    yield from batch
             
             # --- GENERATION PHASE ---
             
             if mode == "single":
                 # SINGLE PDF MODE
-                data_list = []
-                for idx, row in df.iterrows():
-                    try:
-                        data = DataProcessor.process_row(row)
-                        data_list.append(data)
-                        if progress_callback:
-                             progress_callback(idx + 1, total * 2) # 50% for prep
-                    except Exception as e:
-                        error_count += 1
-                        errors.append(f"Lỗi dữ liệu dòng {idx}: {str(e)}")
+                if progress_callback and total and not streaming:
+                    progress_callback(total, total * 2) # 50% for prep
                 
-                if data_list:
+                record_iter = records()
+                first = next(record_iter, None)
+                if first is not None:
+                    rendered = [0]
+                    volumes = [] # Các tập đã lưu xong (path, số trang)
                     try:
                         output_path = os.path.join(work_dir, "QuyY_TatCa.pdf")
                         
                         def gen_progress(current, total_gen):
+                            rendered[0] = current
                             if progress_callback:
-                                progress_callback(total + current, total * 2)
+                                if total is None or streaming:
+                                    # Đọc streaming: dữ liệu xử lý xen kẽ với vẽ
+                                    progress_callback(current, total)
+                                else:
+                                    progress_callback(total + current, total * 2)
                                 
-                        page_count = self.generator.create_merged_pdf(
-                            data_list,
-                            output_path,
-                            field_positions=field_positions,
-                            custom_fields=custom_fields,
-                            progress_callback=gen_progress
-                        )
-                        success_count = page_count # Count pages/records
-                        generated_files.append(output_path)
+                        record_iter = itertools.chain([first], record_iter)
+                        if volume_pages or volume_mb:
+                            # Đọc bản ghi dần và tách tập (bộ nhớ không tăng theo số dòng)
+                            volumes = self.generator.create_merged_volumes(
+                                record_iter,
+                                output_path,
+                                max_pages=volume_pages,
+                                max_mb=volume_mb,
+                                progress_callback=gen_progress,
+                                plan=plan,
+                                volumes=volumes
+                            )
+                        else:
+                            # Các đoạn trang vẽ song song rồi ghép lại (core.parallel_export)
+                            exporter = ShardedMergeExporter(
+                                writer or self.generator, plan, field_positions, custom_fields,
+                                proof=proof, max_workers=self.export_workers
+                            )
+                            volumes = [(output_path, exporter.render(record_iter, output_path, gen_progress))]
+                        success_count = sum(pages for _, pages in volumes) # Count pages/records
+                        generated_files.extend(path for path, _ in volumes)
+                        if volume_pages or volume_mb:
+                            # Tập thừa của lần xuất trước (nhiều tập hơn) không còn đúng nữa
+                            number = len(volumes) + 1
+                            while os.path.exists(self.generator.volume_path(output_path, number)):
+                                os.remove(self.generator.volume_path(output_path, number))
+                                number += 1
                     except Exception as e:
-                        error_count += len(data_list)
+                        # Tập đã lưu vẫn dùng được; dòng đã vẽ vào tài liệu bị mất và
+                        # dòng chưa vẽ tới (nếu biết tổng số) tính là lỗi
+                        saved = sum(pages for _, pages in volumes)
+                        success_count = saved
+                        generated_files.extend(path for path, _ in volumes)
+                        if total is None:
+                            lost = rendered[0] - saved
+                        elif streaming:
+                            # total gồm cả dòng lỗi dữ liệu (tính riêng bên dưới)
+                            lost = total - len(data_errors) - saved
+                        else:
+                            lost = total - saved
+                        error_count += max(lost, 1)
+                        result["failed"] = True
                         errors.append(f"Lỗi tạo file gộp: {str(e)}")
+                for idx, message in data_errors:
+                    error_count += 1
+                    errors.append(f"Lỗi dữ liệu dòng {idx}: {message}")
             else:
                 # MULTIPLE FILES MODE
-                for idx, row in df.iterrows():
-                    try:
-                        data = DataProcessor.process_row(row)
-                        
-                        ho_ten = str(row.get('hovaten', f'person_{idx}')).strip()
-                        safe_filename = "".join(c for c in ho_ten if c.isalnum() or c in (' ', '_')).strip()
-                        output_path = os.path.join(work_dir, f"{safe_filename}_{idx}.pdf")
-                        
-                        self.generator.create_single_pdf(
-                            data,
-                            output_path,
-                            field_positions=field_positions,
-                            custom_fields=custom_fields
-                        )
+                manifest = None
+                # Ghi vào 1 file ZIP: PDF vẽ trong bộ nhớ, không tạo file lẻ
+                if zip_output and not is_print:
+                    zip_path = os.path.join(work_dir, self.ZIP_FILENAME)
+                    sink = ZipOutputSink(zip_path, ZIP_COMPRESSION)
+                elif incremental and not is_print:
+                    layout = ExportManifest.layout_hash(field_positions, custom_fields, self.generator.font_path, plan.background)
+                    manifest = ExportManifest(work_dir, layout)
+                def jobs():
+                    """(ngữ cảnh, output_path, dict cần vẽ hoặc None nếu dùng lại file cũ)"""
+                    for data in records():
+                        idx = data.index
+                        try:
+                            ho_ten = data['ho_ten'].strip() or f'person_{idx}'
+                            safe_filename = "".join(c for c in ho_ten if c.isalnum() or c in (' ', '_')).strip()
+                            filename = f"{safe_filename}_{idx}.pdf"
+                            output_path = os.path.join(work_dir, filename)
+                            
+                            fingerprint = ExportManifest.fingerprint(data) if manifest else None
+                            reused = manifest is not None and manifest.reuse(filename, fingerprint)
+                        except Exception as e:
+                            yield (idx, None, None, None, str(e)), None, None
+                            continue
+                        yield (idx, filename, output_path, fingerprint, None), (None if sink else output_path), (None if reused else data.to_dict())
+                
+                # Vẽ song song trong process pool, kết quả về theo thứ tự (core.parallel_export)
+                exporter = ParallelExporter(
+                    writer or self.batch_generator, plan, field_positions, custom_fields,
+                    proof=proof, max_workers=self.export_workers
+                )
+                for i, ((idx, filename, output_path, fingerprint, error), render_error, pdf) in enumerate(exporter.imap(jobs())):
+                    error = error or render_error
+                    if error is None and sink is not None:
+                        try:
+                            sink.add(filename, pdf)
+                        except Exception as e:
+                            error = str(e)
+                    if error is None and manifest and filename not in manifest.files:
+                        try:
+                            manifest.record(filename, fingerprint)
+                        except Exception as e:
+                            error = str(e)
+                    if sink is not None:
+                        sink.record(idx, filename if error is None else None, error)
+                    if error is None:
                         success_count += 1
-                        generated_files.append(output_path)
-                    except Exception as e:
+                        if sink is None:
+                            generated_files.append(output_path)
+                    else:
                         error_count += 1
-                        errors.append(f"Dòng {idx}: {str(e)}")
+                        errors.append(f"Dòng {idx}: {error}")
                     
                     if progress_callback:
-                        progress_callback(idx + 1, total)
+                        progress_callback(i + 1, total)
+                for idx, message in data_errors:
+                    error_count += 1
+                    errors.append(f"Dòng {idx}: {message}")
+                    if sink is not None:
+                        sink.record(idx, None, message)
+                if sink is not None:
+                    sink.close()
+                    generated_files.append(zip_path)
+                    result["archive"] = zip_path
+                if manifest:
+                    manifest.remove_stale()
+                    manifest.save()
+                    result["skipped"] = manifest.skipped + manifest.copied
+                    result["removed"] = manifest.removed
 
             # --- PRINTING PHASE ---
             if is_print and generated_files:
@@ -134,10 +285,19 @@ class PDFService:
                 result["message"] = f"Đã gửi lệnh in {len(generated_files)} file. (Thành công: {success_count})"
             else:
                 result["message"] = f"Hoàn thành: {success_count} thành công, {error_count} lỗi"
-                if mode == "single" and success_count > 0:
-                    result["message"] = f"Hoàn thành: 1 file PDF với {success_count} trang"
+                if "skipped" in result:
+                    result["message"] += (
+                        f"\n(Không đổi, dùng lại: {result['skipped']}; "
+                        f"file cũ đã xóa: {result['removed']})"
+                    )
+                if "archive" in result:
+                    result["message"] += f"\n(Đã ghi vào {os.path.basename(result['archive'])})"
+                if mode == "single" and success_count > 0 and not result.get("failed"):
+                    result["message"] = f"Hoàn thành: {len(generated_files)} file PDF với {success_count} trang"
 
         except Exception as e:
+            if sink is not None:
+                sink.abort()
             result["error"] += 1
             result["errors"].append(str(e))
             result["message"] = f"Lỗi nghiêm trọng: {str(e)}"
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+Ghép các file PDF con (shard) do ReportLab tạo thành một file
+
+Dùng cho xuất gộp song song: mỗi process vẽ một đoạn trang liên tiếp ra
+file tạm, sau đó PDFStitcher nối các file theo thứ tự thành một tài liệu
+với một cây trang duy nhất và bảng xref mới.
+
+Các object giống hệt nhau giữa các shard (chương trình font subset dùng
+chung - FontRegistry.preseed, bảng độ rộng, ảnh nền, form custom field...)
+chỉ được ghi 1 lần: mỗi object được đánh số lại từ dưới lên và nhận diện
+bằng SHA-1 của nội dung sau khi đổi số tham chiếu. Kết quả có cùng số trang,
+cùng nội dung trang và cùng tài nguyên như khi vẽ tuần tự.
+
+PDFObjectReader / PDFObjectWriter (đọc object, chép object kèm các object
+nó tham chiếu sang tài liệu mới) dùng chung với core.template_writer.
+
+Chỉ đọc cấu trúc ReportLab ghi ra (bảng xref dạng bảng, /Length trực tiếp,
+cây trang 1 tầng); file khác cấu trúc báo PDFStitchError.
+"""
+
+import hashlib
+import os
+import re
+
+_XREF_PATTERN = re.compile(rb"startxref\s+(\d+)\s+%%EOF\s*$")
+_OBJ_HEADER = re.compile(rb"(\d+) 0 obj\s*")
+_REF_PATTERN = re.compile(rb"(?<![\w.])(\d+) 0 R\b")
+_LENGTH_PATTERN = re.compile(rb"/Length (\d+)\b")
+_TYPE_PATTERN = re.compile(rb"/Type /(\w+)")
+_KIDS_PATTERN = re.compile(rb"/Kids \[([^\]]*)\]")
+_STREAM_PATTERN = re.compile(rb">>\s*stream\r?\n")
+_PARENT_PATTERN = re.compile(rb"/Parent (\d+) 0 R")
+
+
+class PDFStitchError(Exception):
+    """File shard không đúng cấu trúc ReportLab mong đợi"""
+
+
+class PDFObjectReader:
+    """Các object của một file PDF: số object -> (phần dict, phần stream hoặc None)"""
+
+    def __init__(self, path=None, data=None):
+        """Đọc từ file path hoặc từ bytes data"""
+        if data is None:
+            with open(path, "rb") as f:
+                data = f.read()
+        self.data = data
+        self.header = data[:data.index(b"\n", data.index(b"\n") + 1) + 1]
+        self.offsets = {}
+        self._read_xref()
+        self.objects = {}
+
+    def _read_xref(self):
+        data = self.data
+        m = _XREF_PATTERN.search(data[-64:])
+        if not m:
+            raise PDFStitchError("Không tìm thấy startxref")
+        pos = int(m.group(1))
+        if data[pos:pos + 4] != b"xref":
+            raise PDFStitchError("Không hỗ trợ xref dạng stream")
+        lines = iter(data[pos:data.index(b"trailer", pos)].split(b"\n")[1:])
+        for line in lines:
+            parts = line.split()
+            if len(parts) != 2:
+                continue
+            start, count = int(parts[0]), int(parts[1])
+            for num in range(start, start + count):
+                entry = next(lines).split()
+                if entry[2] == b"n":
+                    self.offsets[num] = int(entry[0])
+        trailer = data[data.index(b"trailer", pos):]
+        self.root = self._trailer_ref(trailer, b"/Root")
+        self.info = self._trailer_ref(trailer, b"/Info")
+
+    @staticmethod
+    def _trailer_ref(trailer, key):
+        m = re.search(re.escape(key) + rb"\s+(\d+) 0 R", trailer)
+        return int(m.group(1)) if m else None
+
+    def get(self, num):
+        """(dict, stream) của object num"""
+        obj = self.objects.get(num)
+        if obj is not None:
+            return obj
+        pos = self.offsets.get(num)
+        if pos is None:
+            raise PDFStitchError(f"Thiếu object {num}")
+        m = _OBJ_HEADER.match(self.data, pos)
+        if not m or int(m.group(1)) != num:
+            raise PDFStitchError(f"Sai vị trí object {num}")
+        start = m.end()
+        end_at = self.data.find(b"endobj", start)
+        stream = _STREAM_PATTERN.search(self.data, start, end_at if end_at != -1 else len(self.data))
+        if stream:
+            head = self.data[start:stream.start() + 2]
+            length = _LENGTH_PATTERN.search(head)
+            if not length:
+                raise PDFStitchError(f"Object {num}: stream không có /Length trực tiếp")
+            body_start = stream.end()
+            obj = (head, self.data[body_start:body_start + int(length.group(1))])
+        else:
+            obj = (self.data[start:end_at].rstrip(), None)
+        self.objects[num] = obj
+        return obj
+
+    def page_refs(self):
+        """Số object các trang theo thứ tự (cây trang 1 tầng của ReportLab)"""
+        catalog, _ = self.get(self.root)
+        m = re.search(rb"/Pages (\d+) 0 R", catalog)
+        if not m:
+            raise PDFStitchError("Catalog không có /Pages")
+        pages, _ = self.get(int(m.group(1)))
+        kids = _KIDS_PATTERN.search(pages)
+        if not kids:
+            raise PDFStitchError("Cây trang không có /Kids")
+        refs = [int(n) for n in _REF_PATTERN.findall(kids.group(1))]
+        for num in refs:
+            head, _ = self.get(num)
+            t = _TYPE_PATTERN.search(head)
+            if not t or t.group(1) != b"Page":
+                raise PDFStitchError("Cây trang nhiều tầng không được hỗ trợ")
+        return refs
+
+
+class PDFObjectWriter:
+    """Ghi object PDF tuần tự ra file, object chép sang trùng nội dung chỉ ghi 1 lần"""
+
+    def __init__(self, fileobj, next_number=1):
+        self.file = fileobj
+        self.digest = hashlib.md5()
+        self.offsets = {}
+        self.by_key = {}
+        self.next_number = next_number
+
+    def write(self, data):
+        self.file.write(data)
+        self.digest.update(data)
+
+    def allocate(self):
+        """Giữ trước một số object"""
+        num = self.next_number
+        self.next_number += 1
+        return num
+
+    def write_object(self, num, head, stream=None):
+        self.offsets[num] = self.file.tell()
+        self.write(b"%d 0 obj\n" % num + head)
+        if stream is not None:
+            self.write(b"\nstream\n" + stream + b"\nendstream")
+        self.write(b"\nendobj\n")
+
+    def copy(self, reader, num, mapping, stack=()):
+        """
+        Ghi object num của reader (và các object nó tham chiếu) nếu chưa có
+
+        mapping: số object của reader -> số mới (dùng chung cho cả reader)
+        Returns: số object mới
+        """
+        new = mapping.get(num)
+        if new is not None:
+            return new
+        if num in stack:
+            raise PDFStitchError(f"Tham chiếu vòng ở object {num}")
+        head, stream = reader.get(num)
+        head = _REF_PATTERN.sub(
+            lambda m: b"%d 0 R" % self.copy(reader, int(m.group(1)), mapping, stack + (num,)),
+            head,
+        )
+        key = hashlib.sha1(head + b"\0" + (stream if stream is not None else b"\1")).digest()
+        new = self.by_key.get(key)
+        if new is None:
+            new = self.allocate()
+            self.write_object(new, head, stream)
+            self.by_key[key] = new
+        mapping[num] = new
+        return new
+
+    def copy_page(self, reader, num, mapping, pages_num):
+        """Chép trang num (luôn ghi, không gộp), /Parent trỏ về cây trang pages_num"""
+        head, stream = reader.get(num)
+        parent = _PARENT_PATTERN.search(head)
+        parent = int(parent.group(1)) if parent else None
+
+        def replace(m):
+            ref = int(m.group(1))
+            if ref == parent:
+                return b"%d 0 R" % pages_num
+            return b"%d 0 R" % self.copy(reader, ref, mapping)
+
+        head = _REF_PATTERN.sub(replace, head)
+        new = self.allocate()
+        self.write_object(new, head, stream)
+        mapping[num] = new
+        return new
+
+    def write_tail(self, pages_num, kids, info=None):
+        """Ghi cây trang, catalog, bảng xref và trailer (đóng tài liệu)"""
+        refs = b" ".join(b"%d 0 R" % n for n in kids)
+        self.write_object(pages_num, b"<<\n/Count %d /Kids [ %s ] /Type /Pages\n>>" % (len(kids), refs))
+        root = self.allocate()
+        self.write_object(root, b"<<\n/PageMode /UseNone /Pages %d 0 R /Type /Catalog\n>>" % pages_num)
+
+        xref_at = self.file.tell()
+        doc_id = self.digest.hexdigest().encode("ascii")
+        lines = [b"xref", b"0 %d" % self.next_number, b"0000000000 65535 f "]
+        lines += [b"%010d 00000 n " % self.offsets[n] for n in range(1, self.next_number)]
+        trailer = b"trailer\n<<\n/ID \n[<%s><%s>]\n" % (doc_id, doc_id)
+        if info is not None:
+            trailer += b"/Info %d 0 R\n" % info
+        trailer += b"/Root %d 0 R\n/Size %d\n>>\nstartxref\n%d\n%%%%EOF\n" % (root, self.next_number, xref_at)
+        self.write(b"\n".join(lines) + b"\n" + trailer)
+
+
+class PDFStitcher:
+    """Ghi tài liệu gộp từ các shard, object trùng chỉ ghi 1 lần"""
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.tmp_path = f"{output_path}.{os.getpid()}.tmp"
+        self._file = open(self.tmp_path, "wb")
+        self.writer = PDFObjectWriter(self._file)
+        # Cây trang được giữ số trước, ghi cuối cùng khi đã biết đủ trang
+        self.pages_num = self.writer.allocate()
+        self.kids = []
+        self.info = None
+        self._header_written = False
+
+    def add(self, shard_path):
+        """Nối các trang của một shard vào cuối tài liệu, trả về số trang"""
+        return self.add_reader(PDFObjectReader(shard_path))
+
+    def add_reader(self, reader):
+        """Nối các trang của một PDFObjectReader, trả về số trang"""
+        if not self._header_written:
+            self.writer.write(reader.header)
+            self._header_written = True
+        mapping = {}
+        refs = reader.page_refs()
+        for num in refs:
+            self.kids.append(self.writer.copy_page(reader, num, mapping, self.pages_num))
+        if self.info is None and reader.info is not None:
+            self.info = self.writer.copy(reader, reader.info, mapping)
+        return len(refs)
+
+    def close(self):
+        """Ghi cây trang, catalog, xref, trailer rồi đổi tên file tạm thành output"""
+        try:
+            self.writer.write_tail(self.pages_num, self.kids, self.info)
+            self._file.close()
+            os.replace(self.tmp_path, self.output_path)
+        except Exception:
+            self.abort()
+            raise
+        return len(self.kids)
+
+    def abort(self):
+        """Bỏ file tạm (lỗi giữa chừng)"""
+        if not self._file.closed:
+            self._file.close()
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Lô bản ghi dạng cột cho dữ liệu in PDF
+
+Thay vì mỗi bản ghi là một dict 11 khóa, RecordBatch giữ mỗi trường in PDF
+là một list (theo chỉ số trường trong RENDER_FIELDS). Record là một "khung nhìn"
+nhỏ dùng __slots__ trỏ vào một dòng của lô, hỗ trợ `field in record` và
+`record[field]` như dict nên PDFGenerator dùng được trực tiếp.
+"""
+
+# Các trường in PDF, thứ tự này là chỉ số cột của RecordBatch
+RENDER_FIELDS = (
+    "phap_danh",
+    "ho_ten",
+    "sinh_nam",
+    "dia_chi",
+    "ngay_duong",
+    "thang_duong",
+    "nam_duong",
+    "ngay_am",
+    "thang_am",
+    "nam_am",
+    "phat_lich",
+)
+
+FIELD_INDEX = {field: i for i, field in enumerate(RENDER_FIELDS)}
+
+
+class Record:
+    """Một dòng của RecordBatch (không sao chép dữ liệu)"""
+
+    __slots__ = ("batch", "pos")
+
+    def __init__(self, batch, pos):
+        self.batch = batch
+        self.pos = pos
+
+    @property
+    def index(self):
+        """Nhãn dòng gốc trong DataFrame"""
+        return self.batch.index[self.pos]
+
+    def __contains__(self, field):
+        return field in FIELD_INDEX
+
+    def __getitem__(self, field):
+        return self.batch.columns[FIELD_INDEX[field]][self.pos]
+
+    def get(self, field, default=None):
+        i = FIELD_INDEX.get(field)
+        return default if i is None else self.batch.columns[i][self.pos]
+
+    def keys(self):
+        return RENDER_FIELDS
+
+    def to_dict(self):
+        return {field: self[field] for field in RENDER_FIELDS}
+
+
+class RecordBatch:
+    """Lô bản ghi dạng cột (mỗi trường in PDF là một list)"""
+
+    __slots__ = ("columns", "index", "errors", "date_conversions", "conversions_saved")
+
+    def __init__(self, columns, index, errors=None, date_conversions=0, conversions_saved=0):
+        """
+        Args:
+            columns: list các list giá trị, theo thứ tự RENDER_FIELDS
+            index: list nhãn dòng gốc (cùng độ dài các cột)
+            errors: list (nhãn dòng, thông báo lỗi) của các dòng bị loại
+            date_conversions: số lần đổi ngày thực tế
+            conversions_saved: số lần đổi ngày tiết kiệm được
+        """
+        self.columns = columns
+        self.index = index
+        self.errors = errors or []
+        self.date_conversions = date_conversions
+        self.conversions_saved = conversions_saved
+
+    @classmethod
+    def from_dict(cls, columns, index, **kwargs):
+        """Tạo lô từ dict trường -> list giá trị"""
+        n = len(index)
+        return cls([columns.get(field, [""] * n) for field in RENDER_FIELDS], index, **kwargs)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, pos):
+        return Record(self, pos)
+
+    def __iter__(self):
+        for pos in range(len(self.index)):
+            yield Record(self, pos)
@@ -18,6 +18,9 @@ EMBEDDED_RESOURCES = {
     # Sẽ được điền khi build hoặc có thể load từ bundle
 }
 
+# Định dạng ảnh phôi được hỗ trợ (theo thứ tự ưu tiên)
+PHOIMAU_EXTENSIONS = [".png", ".jpg", ".jpeg"]
+
 
 def get_app_dir():
     """
@@ -98,6 +101,19 @@ def get_phoimau_path():
     return ensure_resource("phoimau.jpg")
 
 
+def find_phoimau_path():
+    """
+    Ảnh phôi đang dùng: phoimau.png/.jpg/.jpeg trong thư mục app (người dùng
+    có thể thay ở tab Tọa Độ), không có thì phoimau.jpg đi kèm bundle
+    """
+    app_dir = get_app_dir()
+    for ext in PHOIMAU_EXTENSIONS:
+        path = os.path.join(app_dir, f"phoimau{ext}")
+        if os.path.exists(path):
+            return path
+    return get_phoimau_path()
+
+
 def get_font_path():
     """Lấy đường dẫn file quyyfont.ttf"""
     return ensure_resource("quyyfont.ttf")
@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""
+Ghi PDF trực tiếp theo khuôn trang (fast path, không qua reportlab canvas)
+
+Mọi lá phái cùng khổ trang, cùng font, cùng tọa độ; chỉ khoảng mười chuỗi
+ngắn thay đổi. TemplatePDFWriter dựng 1 lần cho mỗi lần xuất (LayoutPlan):
+    - 1 trang mẫu bằng ReportLab (PDFGenerator dùng subset font chung) để
+      lấy đúng các object font, ảnh nền, form custom field, Info và phần
+      lệnh vẽ cố định của trang (preamble, ảnh nền, custom fields)
+    - các object đó được đánh số lại 1 lần thành phần đầu file (prefix)
+Mỗi bản ghi chỉ còn: mã hóa chuỗi theo bảng mã subset đã có, ghép lệnh vẽ
+chữ giống hệt PDFGenerator._draw_op, nén stream nội dung rồi ghi object
+trang, cây trang, catalog và xref.
+
+Bản ghi có ký tự ngoài subset mẫu (ngoài VIETNAMESE_COVERAGE) được vẽ bằng
+PDFGenerator như cũ: file riêng -> tạo bằng ReportLab; file gộp -> trang đó
+vẽ riêng rồi chép vào (PDFObjectWriter, object trùng không ghi lại).
+
+Kết quả: nội dung trang (sau giải nén) trùng từng byte với PDFGenerator
+dùng subset chung, cùng font/ảnh/form; kiểm tra bằng pdf_writer_harness.py.
+
+Khuôn trang lấy từ trạng thái bên trong của ReportLab (c._code, bảng mã
+subset font) nên chỉ dùng khi bật DIRECT_PDF_WRITER (mặc định tắt).
+"""
+
+import hashlib
+import io
+import os
+import re
+import zlib
+
+from reportlab.lib.rl_accel import escapePDF, fp_str
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfgen import canvas
+
+from core.font_registry import FontRegistry, SYNTHETIC_BOLD_STROKE, SYNTHETIC_ITALIC_SKEW
+from core.pdf_stitcher import PDFObjectReader, PDFObjectWriter, _REF_PATTERN, _PARENT_PATTERN
+
+_CONTENTS_PATTERN = re.compile(rb"/Contents (\d+) 0 R")
+# Chỗ giữ số object trong phần dict của trang mẫu
+_CONTENTS_SLOT = b"\x00C"
+_PARENT_SLOT = b"\x00P"
+
+
+class _FontCodes:
+    """Bảng mã subset 0 của một font trong tài liệu mẫu"""
+
+    __slots__ = ("internal_name", "assignments", "char_to_glyph")
+
+    def __init__(self, font, doc):
+        self.internal_name = font.getSubsetInternalName(0, doc)
+        self.assignments = {}
+        self.char_to_glyph = font.face.charToGlyph
+
+    def snapshot(self, font, doc):
+        """Chụp bảng mã trước khi lưu tài liệu mẫu (save xóa trạng thái font của tài liệu)"""
+        self.assignments = dict(font.state[doc].assignments)
+
+    def encode(self, text):
+        """Chuỗi -> bytes mã subset 0, None nếu có ký tự chưa có trong subset mẫu"""
+        assignments = self.assignments
+        codes = bytearray()
+        for code in map(ord, text):
+            if code == 0xA0:
+                code = 32
+            n = assignments.get(code)
+            if n is None:
+                if code in self.char_to_glyph:
+                    return None
+                n = 0
+            elif n > 0xFF:
+                return None
+            codes.append(n)
+        return bytes(codes)
+
+
+class _PageTemplate:
+    """Phần đầu file và lệnh vẽ cố định cho một kiểu tài liệu (1 trang / gộp)"""
+
+    def __init__(self, generator, plan, static_form):
+        buffer = io.BytesIO()
+        c = canvas.Canvas(buffer, pagesize=plan.pagesize)
+        generator.register_font()
+
+        self.fonts = {}
+        if static_form and plan.statics:
+            c.beginForm(plan.STATIC_FORM)
+            for op in plan.statics:
+                generator._draw_op(c, op, op.text)
+            c.endForm()
+        for op in plan.fields + plan.statics:
+            if op.font not in self.fonts:
+                FontRegistry.preseed(op.font, c._doc)
+                self.fonts[op.font] = _FontCodes(pdfmetrics.getFont(op.font), c._doc)
+
+        c.setFont(generator.font_name, 12)
+        self.preamble = c._preamble
+        start = len(c._code)
+        if plan.background is not None:
+            plan.background.draw(c, plan.pagesize[0], plan.pagesize[1])
+        self.before = c._code[start:]
+        start = len(c._code)
+        if static_form and plan.statics:
+            c.doForm(plan.STATIC_FORM)
+        else:
+            for op in plan.statics:
+                generator._draw_op(c, op, op.text)
+        self.after = c._code[start:] + [" "]
+        c.showPage()
+        for name, codes in self.fonts.items():
+            codes.snapshot(pdfmetrics.getFont(name), c._doc)
+        c.save()
+        self._build_prefix(PDFObjectReader(data=buffer.getvalue()))
+
+    def _build_prefix(self, reader):
+        """Chép tài nguyên của trang mẫu (đánh số từ 1) thành phần đầu file"""
+        buffer = io.BytesIO()
+        writer = PDFObjectWriter(buffer)
+        writer.write(reader.header)
+        self.pages_num = writer.allocate()
+        mapping = {}
+        page = reader.page_refs()[0]
+        head, _ = reader.get(page)
+        contents = int(_CONTENTS_PATTERN.search(head).group(1))
+        parent = int(_PARENT_PATTERN.search(head).group(1))
+
+        def replace(m):
+            ref = int(m.group(1))
+            if ref == contents:
+                return _CONTENTS_SLOT
+            if ref == parent:
+                return _PARENT_SLOT
+            return b"%d 0 R" % writer.copy(reader, ref, mapping)
+
+        self.page_head = _REF_PATTERN.sub(replace, head).replace(_PARENT_SLOT, b"%d 0 R" % self.pages_num)
+        self.info = writer.copy(reader, reader.info, mapping) if reader.info is not None else None
+        self.prefix = buffer.getvalue()
+        self.offsets = dict(writer.offsets)
+        self.by_key = dict(writer.by_key)
+        self.next_number = writer.next_number
+
+    def page(self, contents_num):
+        return self.page_head.replace(_CONTENTS_SLOT, b"%d 0 R" % contents_num)
+
+
+class TemplatePDFWriter:
+    """Tạo PDF lá phái theo khuôn trang, cùng giao diện với PDFGenerator"""
+
+    def __init__(self, generator, plan):
+        """
+        Args:
+            generator: PDFGenerator(shared_subset=True) - dựng trang mẫu và vẽ
+                bản ghi có ký tự lạ
+            plan: LayoutPlan của lần xuất
+        """
+        self.generator = generator
+        self.plan = plan
+        self.font_path = generator.font_path
+        self._single = None
+        self._merged = None
+        # Số bản ghi phải vẽ bằng ReportLab (ký tự ngoài subset mẫu)
+        self.fallbacks = 0
+
+    def _template(self, static_form):
+        if static_form:
+            if self._merged is None:
+                self._merged = _PageTemplate(self.generator, self.plan, True)
+            return self._merged
+        if self._single is None:
+            self._single = _PageTemplate(self.generator, self.plan, False)
+        return self._single
+
+    def _content(self, template, data):
+        """Nội dung trang (bytes chưa nén) hoặc None nếu cần vẽ bằng ReportLab"""
+        lines = [template.preamble]
+        lines.extend(template.before)
+        for op in self.plan.fields:
+            if op.key in data:
+                text = data[op.key]
+                if text:
+                    line = self._text_op(template, op, str(text))
+                    if line is None:
+                        return None
+                    lines.extend(line)
+        lines.extend(template.after)
+        lines.append("")
+        return "\n".join(lines).encode("latin-1")
+
+    def _text_op(self, template, op, text):
+        """Các dòng lệnh của một trường, giống PDFGenerator._draw_op"""
+        codes = template.fonts[op.font].encode(text)
+        if codes is None:
+            return None
+        x = op.x
+        if op.shift:
+            x = x - op.shift * self.generator._string_width(text, op.font, op.size)
+        y = op.y
+        parts = ["BT", "1 0 0 1 %s Tm" % fp_str(x, y)]
+        if op.fake_italic:
+            parts.append("%s Tm" % fp_str(1, 0, SYNTHETIC_ITALIC_SKEW, 1, x, y))
+        if op.fake_bold:
+            parts.append("2 Tr")
+        parts.append("%s %s Tf %s TL (%s) Tj T*" % (
+            template.fonts[op.font].internal_name, fp_str(op.size), fp_str(op.size * 1.2), escapePDF(codes)))
+        if op.fake_bold:
+            parts.append("0 Tr")
+            parts.append("ET")
+            return ["%s w" % fp_str(op.size * SYNTHETIC_BOLD_STROKE), " ".join(parts)]
+        parts.append("ET")
+        return [" ".join(parts)]
+
+    def create_single_pdf(self, data, output_path, field_positions=None, custom_fields=None, plan=None):
+        """Tạo PDF 1 trang cho một bản ghi (như PDFGenerator.create_single_pdf; output_path có thể là file object)"""
+        if plan is not None and plan is not self.plan:
+            return self.generator.create_single_pdf(data, output_path, field_positions, custom_fields, plan)
+        template = self._template(False)
+        content = self._content(template, data)
+        if content is None:
+            self.fallbacks += 1
+            return self.generator.create_single_pdf(data, output_path, plan=self.plan)
+
+        stream = zlib.compress(content)
+        n = template.next_number
+        offsets = template.offsets
+        parts = [template.prefix]
+        pos = len(template.prefix)
+        extra = {}
+
+        def add(num, body):
+            nonlocal pos
+            extra[num] = pos
+            parts.append(body)
+            pos += len(body)
+
+        add(n, b"%d 0 obj\n<<\n/Filter [ /FlateDecode ] /Length %d\n>>\nstream\n%s\nendstream\nendobj\n" % (n, len(stream), stream))
+        add(n + 1, b"%d 0 obj\n%s\nendobj\n" % (n + 1, template.page(n)))
+        add(template.pages_num, b"%d 0 obj\n<<\n/Count 1 /Kids [ %d 0 R ] /Type /Pages\n>>\nendobj\n" % (template.pages_num, n + 1))
+        add(n + 2, b"%d 0 obj\n<<\n/PageMode /UseNone /Pages %d 0 R /Type /Catalog\n>>\nendobj\n" % (n + 2, template.pages_num))
+        size = n + 3
+        xref = [b"xref\n0 %d\n0000000000 65535 f \n" % size]
+        xref += [b"%010d 00000 n \n" % (offsets[i] if i in offsets else extra[i]) for i in range(1, size)]
+        doc_id = hashlib.md5(stream).hexdigest().encode("ascii")
+        trailer = b"trailer\n<<\n/ID \n[<%s><%s>]\n" % (doc_id, doc_id)
+        if template.info is not None:
+            trailer += b"/Info %d 0 R\n" % template.info
+        trailer += b"/Root %d 0 R\n/Size %d\n>>\nstartxref\n%d\n%%%%EOF\n" % (n + 2, size, pos)
+        parts.extend(xref)
+        parts.append(trailer)
+        if hasattr(output_path, "write"):
+            output_path.write(b"".join(parts))
+            return
+        with open(output_path, "wb") as f:
+            f.write(b"".join(parts))
+
+    def create_merged_pdf(self, data_list, output_path, field_positions=None, custom_fields=None, progress_callback=None, plan=None):
+        """Tạo 1 file PDF nhiều trang (như PDFGenerator.create_merged_pdf), trả về số trang"""
+        if plan is not None and plan is not self.plan:
+            return self.generator.create_merged_pdf(data_list, output_path, field_positions, custom_fields, progress_callback, plan)
+        template = self._template(True)
+        total = len(data_list) if hasattr(data_list, '__len__') else None
+
+        tmp_path = f"{output_path}.{os.getpid()}.tmp"
+        kids = []
+        try:
+            with open(tmp_path, "wb") as f:
+                writer = PDFObjectWriter(f, template.next_number)
+                writer.write(template.prefix)
+                writer.offsets.update(template.offsets)
+                writer.by_key.update(template.by_key)
+                for data in data_list:
+                    content = self._content(template, data)
+                    if content is None:
+                        self.fallbacks += 1
+                        kids.append(self._foreign_page(writer, template, data))
+                    else:
+                        stream = zlib.compress(content)
+                        contents_num = writer.allocate()
+                        writer.write_object(contents_num, b"<<\n/Filter [ /FlateDecode ] /Length %d\n>>" % len(stream), stream)
+                        page_num = writer.allocate()
+                        writer.write_object(page_num, template.page(contents_num))
+                        kids.append(page_num)
+                    if progress_callback:
+                        progress_callback(len(kids), total)
+                writer.write_tail(template.pages_num, kids, template.info)
+            os.replace(tmp_path, output_path)
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        return len(kids)
+
+    def _foreign_page(self, writer, template, data):
+        """Vẽ trang bằng ReportLab rồi chép vào tài liệu (object trùng dùng lại)"""
+        buffer = io.BytesIO()
+        self.generator.create_merged_pdf([data], buffer, plan=self.plan)
+        reader = PDFObjectReader(data=buffer.getvalue())
+        return writer.copy_page(reader, reader.page_refs()[0], {}, template.pages_num)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Xuất nhiều file PDF vào một file ZIP (chế độ multiple)
+
+Hàng nghìn file PDF nhỏ ghi ra thư mục mạng Windows / USB rất chậm (mỗi file
+một lần tạo, ghi, đóng), chép đi nơi khác còn chậm hơn. ZipOutputSink nhận
+bytes PDF vẽ trong bộ nhớ và nối thẳng vào một file ZIP: ZIP ghi ở chế độ
+không seek (data descriptor sau mỗi mục) nên cả lần xuất chỉ là một luồng
+ghi tuần tự qua bộ đệm lớn.
+
+Cuối archive có INDEX_NAME (CSV UTF-8 có BOM, mở được bằng Excel): mỗi bản
+ghi một dòng - số dòng dữ liệu, tên file trong ZIP, lỗi (nếu có).
+
+Archive được ghi vào file tạm rồi os.replace khi xong, lỗi giữa chừng không
+để lại file ZIP dở dang.
+"""
+
+import csv
+import io
+import os
+import time
+import zipfile
+
+# "stored": PDF đã nén sẵn, không nén lại (nhanh); "deflated": nhỏ hơn chút ít
+COMPRESSION_TYPES = {"stored": zipfile.ZIP_STORED, "deflated": zipfile.ZIP_DEFLATED}
+WRITE_BUFFER = 1 << 20
+
+
+class _SequentialFile:
+    """File chỉ có write: zipfile ghi tuần tự, không quay lại sửa header từng mục"""
+
+    def __init__(self, fileobj):
+        self._file = fileobj
+
+    def write(self, data):
+        return self._file.write(data)
+
+    def flush(self):
+        self._file.flush()
+
+
+class ZipOutputSink:
+    """Ghi các file PDF (bytes) và bảng chỉ mục vào một file ZIP"""
+
+    INDEX_NAME = "index.csv"
+    INDEX_HEADER = ("dong", "file", "loi")
+
+    def __init__(self, zip_path, compression="stored"):
+        """
+        Args:
+            zip_path: đường dẫn file ZIP
+            compression: "stored" hoặc "deflated" (COMPRESSION_TYPES)
+        """
+        self.zip_path = zip_path
+        self.tmp_path = f"{zip_path}.{os.getpid()}.tmp"
+        self._file = open(self.tmp_path, "wb", buffering=WRITE_BUFFER)
+        self._zip = zipfile.ZipFile(
+            _SequentialFile(self._file), "w",
+            compression=COMPRESSION_TYPES.get(compression, zipfile.ZIP_STORED),
+        )
+        # Thời điểm ghi chung cho mọi mục (zip chỉ lưu tới giây)
+        self._date_time = time.localtime()[:6]
+        self._index = []
+        self.count = 0
+
+    def add(self, filename, data):
+        """Thêm một file PDF (bytes) vào archive"""
+        self._write(filename, data)
+        self.count += 1
+
+    def _write(self, filename, data):
+        info = zipfile.ZipInfo(filename, self._date_time)
+        info.compress_type = self._zip.compression
+        info.external_attr = 0o644 << 16
+        self._zip.writestr(info, data)
+
+    def record(self, idx, filename=None, error=None):
+        """Ghi một dòng chỉ mục cho bản ghi idx (filename None nếu không tạo được file)"""
+        self._index.append((idx, filename or "", error or ""))
+
+    def close(self):
+        """Ghi chỉ mục, đóng archive và đổi tên file tạm thành zip_path; trả về số file PDF"""
+        try:
+            text = io.StringIO()
+            writer = csv.writer(text, lineterminator="\n")
+            writer.writerow(self.INDEX_HEADER)
+            writer.writerows(self._index)
+            self._write(self.INDEX_NAME, text.getvalue().encode("utf-8-sig"))
+            self._zip.close()
+            self._file.close()
+            os.replace(self.tmp_path, self.zip_path)
+        except Exception:
+            self.abort()
+            raise
+        return self.count
+
+    def abort(self):
+        """Bỏ file tạm (lỗi giữa chừng)"""
+        try:
+            self._zip.close()
+        except Exception:
+            pass
+        if not self._file.closed:
+            self._file.close()
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
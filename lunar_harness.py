@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Kiểm tra chéo độ chính xác và tốc độ của LunarConverter
+
+Đổi MỌI ngày từ 1/1/1900 đến 31/12/2100 bằng từng cách chuyển đổi:
+    - scalar       : calc_solar_to_lunar không cache (thuật toán gốc)
+    - cached       : calc_solar_to_lunar có cache theo năm
+    - table        : tra bảng LunarTable
+    - vector       : convert_many (NumPy)
+    - vector+table : convert_many khi bật bảng
+So sánh từng ngày với kết quả scalar, so sánh từng năm với file golden
+(lunar_golden.txt - mã SHA-256 của kết quả mỗi năm) và in tốc độ chuyển đổi.
+
+Cách dùng:
+    python lunar_harness.py                  # kiểm tra với golden
+    python lunar_harness.py --write-golden   # ghi lại golden từ bản scalar
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core.lunar_converter import LunarConverter
+from core.lunar_table import LunarTable
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lunar_golden.txt")
+
+
+def all_days():
+    """Danh sách (ngày, tháng, năm) của mọi ngày trong phạm vi bảng"""
+    first = LunarConverter.jd_from_date(1, 1, LunarTable.YEAR_FROM)
+    last = LunarConverter.jd_from_date(31, 12, LunarTable.YEAR_TO)
+    return [LunarTable._date_from_jd(jd) for jd in range(first, last + 1)]
+
+
+def run_scalar(days):
+    return [LunarConverter.calc_solar_to_lunar(d, m, y, 7, False) for d, m, y in days]
+
+
+def run_cached(days):
+    LunarConverter.cache_clear()
+    return [LunarConverter.calc_solar_to_lunar(d, m, y) for d, m, y in days]
+
+
+def run_table(days, table):
+    return [table.lookup(LunarConverter.jd_from_date(d, m, y)) for d, m, y in days]
+
+
+def run_vector(dates):
+    result = LunarConverter.convert_many(dates)
+    return list(zip(
+        result['lunar_day'].tolist(), result['lunar_month'].tolist(),
+        result['lunar_year'].tolist(), result['leap'].tolist()
+    ))
+
+
+def year_digests(days, results):
+    """SHA-256 của kết quả theo từng năm dương lịch"""
+    digests = {}
+    current = None
+    h = None
+    for (d, m, y), lunar in zip(days, results):
+        if y != current:
+            if h is not None:
+                digests[current] = h.hexdigest()
+            current, h = y, hashlib.sha256()
+        h.update(f"{y:04d}-{m:02d}-{d:02d},{lunar[0]},{lunar[1]},{lunar[2]},{lunar[3]}\n".encode("ascii"))
+    if h is not None:
+        digests[current] = h.hexdigest()
+    return digests
+
+
+def read_golden(path):
+    golden = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                year, digest = line.split()
+                golden[int(year)] = digest
+    return golden
+
+
+def write_golden(path, digests):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("# SHA-256 kết quả Âm lịch (ngày,tháng,năm,nhuận) của từng năm, múi giờ 7\n")
+        for year in sorted(digests):
+            f.write(f"{year} {digests[year]}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kiểm tra chéo LunarConverter 1900-2100")
+    parser.add_argument("--golden", default=GOLDEN_PATH, help="file golden")
+    parser.add_argument("--write-golden", action="store_true", help="ghi golden từ kết quả scalar")
+    args = parser.parse_args()
+
+    days = all_days()
+    dates = pd.to_datetime([f"{y:04d}-{m:02d}-{d:02d}" for d, m, y in days])
+    print(f"Số ngày: {len(days)} ({LunarTable.YEAR_FROM}-{LunarTable.YEAR_TO})")
+
+    # Bảng dựng mới vào thư mục tạm (xóa khi xong), không dùng file có sẵn cạnh
+    # config.json; đọc lại vào bộ nhớ (không memory-map) để xóa được file
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        table_path = os.path.join(tmp_dir, "lunar_table.npy")
+        start = time.perf_counter()
+        table = LunarTable.load_or_build(table_path)
+        print(f"Dựng bảng: {time.perf_counter() - start:.3f}s, {table.data.shape[1]} đoạn")
+        table = LunarTable.load(table_path, mmap=False)
+
+    def run_vector_table(values):
+        LunarConverter._table = table
+        try:
+            return run_vector(values)
+        finally:
+            LunarConverter.disable_table()
+
+    LunarConverter.disable_table()
+    implementations = [
+        ("scalar", lambda: run_scalar(days)),
+        ("cached", lambda: run_cached(days)),
+        ("table", lambda: run_table(days, table)),
+        ("vector", lambda: run_vector(dates)),
+        ("vector+table", lambda: run_vector_table(dates)),
+    ]
+
+    reference = None
+    failed = False
+    print(f"\n{'Cách đổi':14s} {'Thời gian':>10s} {'Ngày/giây':>12s}  Kết quả")
+    for name, func in implementations:
+        start = time.perf_counter()
+        results = func()
+        elapsed = time.perf_counter() - start
+        if reference is None:
+            reference = results
+        mismatches = [i for i, (a, b) in enumerate(zip(results, reference)) if a != b]
+        status = "OK" if not mismatches and len(results) == len(reference) else f"SAI {len(mismatches)} ngày"
+        print(f"{name:14s} {elapsed:9.3f}s {len(days) / elapsed:12,.0f}  {status}")
+        for i in mismatches[:5]:
+            d, m, y = days[i]
+            print(f"    {d}/{m}/{y}: {results[i]} != {reference[i]}")
+        failed = failed or bool(mismatches)
+
+    digests = year_digests(days, reference)
+    if args.write_golden:
+        write_golden(args.golden, digests)
+        print(f"\nĐã ghi golden: {args.golden}")
+    elif os.path.exists(args.golden):
+        golden = read_golden(args.golden)
+        wrong = [y for y in sorted(digests) if golden.get(y) != digests[y]]
+        if wrong:
+            failed = True
+            print(f"\nGolden: SAI ở {len(wrong)} năm: {wrong[:10]}")
+        else:
+            print(f"\nGolden: OK ({len(golden)} năm)")
+    else:
+        print(f"\nKhông có file golden: {args.golden} (chạy với --write-golden)")
+
+    print("\nKẾT QUẢ:", "✗ FAIL" if failed else "✓ PASS")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
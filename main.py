@@ -3,6 +3,7 @@
 Ứng dụng in lá phái quy y - Entry Point (Refactored)
 """
 
+import multiprocessing
 import tkinter as tk
 from ui.main_window import MainWindow
 from core.resource_manager import ensure_all_resources
@@ -23,5 +24,7 @@ def main():
 
 
 if __name__ == "__main__":
+    # Cần cho process con (đọc nhiều file song song) khi đóng gói exe
+    multiprocessing.freeze_support()
     main()
 
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+Kiểm tra chéo và đo tốc độ TemplatePDFWriter so với PDFGenerator
+
+Tạo dữ liệu giả (tên, pháp danh, địa chỉ tiếng Việt, ký tự cần thoát như
+'(' ')' '\\'), vẽ bằng PDFGenerator(shared_subset=True) và bằng
+TemplatePDFWriter rồi so sánh:
+    - file gộp: từng trang
+    - file riêng: từng file trong --single bản ghi đầu
+    - bản ghi có ký tự ngoài subset mẫu: trang vẽ lại bằng ReportLab phải
+      giống trang ReportLab vẽ riêng bản ghi đó
+Mỗi trang được quy về một mã SHA-256 độc lập với số object và bộ lọc nén:
+nội dung trang sau giải nén, cùng toàn bộ tài nguyên (font, chương trình
+font, ảnh nền, form custom field) đệ quy theo tham chiếu. Hai trang cùng mã
+thì hiển thị giống hệt nhau.
+
+Cách dùng:
+    python pdf_writer_harness.py                    # 2000 trang gộp, 300 file riêng
+    python pdf_writer_harness.py --records 10000 --single 1000 --proof
+"""
+
+import argparse
+import hashlib
+import io
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from reportlab.lib.rl_accel import asciiBase85Decode
+
+from core.pdf_generator import PDFGenerator
+from core.pdf_stitcher import PDFObjectReader, _REF_PATTERN, _PARENT_PATTERN
+from core.template_writer import TemplatePDFWriter
+
+_FILTER_PATTERN = re.compile(rb"/Filter\s*(?:\[([^\]]*)\]|(/\w+))")
+_LENGTH_PATTERN = re.compile(rb"/Length \d+")
+
+CUSTOM_FIELDS = {
+    "chua": {"value": "Chùa Phước Huệ (Hòa Phong)", "x": 148, "y": 20, "size": 16, "bold": True, "align": "C"},
+}
+
+HO = ["Nguyễn", "Trần", "Lê", "Phạm", "Huỳnh", "Võ", "Đặng", "Bùi"]
+DEM = ["Văn", "Thị", "Hữu", "Ngọc", "Đức", "Thị Mỹ"]
+TEN = ["Ánh", "Bình", "Cường", "Dũng", "Hạnh", "Khải", "Lộc", "Tuyết", "Ưng"]
+PHAP_DANH = ["Minh Tâm", "Diệu Hạnh", "Quảng Đức", "Nhuận Pháp (Tâm)", "Thiện\\Ý"]
+
+
+def make_records(count):
+    """Bản ghi giả, lặp theo chỉ số (kết quả cố định)"""
+    records = []
+    for i in range(count):
+        records.append({
+            "ho_ten": f"{HO[i % 8]} {DEM[i % 6]} {TEN[i % 9]}",
+            "phap_danh": PHAP_DANH[i % 5],
+            "sinh_nam": str(1940 + i % 70),
+            "dia_chi": f"Thôn {i % 17 + 1}, xã Hòa Phong, huyện Hòa Vang" if i % 4 else "",
+            "ngay_duong": str(i % 28 + 1),
+            "thang_duong": str(i % 12 + 1),
+            "nam_duong": "2024",
+        })
+    return records
+
+
+def _decode(head, stream):
+    """Bỏ ASCII85/Flate (giữ DCTDecode...), trả về (head không Filter/Length, dữ liệu)"""
+    m = _FILTER_PATTERN.search(head)
+    kept = []
+    if m:
+        for name in (m.group(1) or m.group(2)).split():
+            if name == b"/ASCII85Decode":
+                stream = asciiBase85Decode(stream)
+            elif name == b"/FlateDecode":
+                stream = zlib.decompress(stream)
+            else:
+                kept.append(name)
+        head = head[:m.start()] + head[m.end():]
+    head = _LENGTH_PATTERN.sub(b"", head)
+    return b" ".join(head.split() + kept), stream
+
+
+def object_digest(reader, num, memo, skip_parent=False):
+    """SHA-256 của object num và các object nó tham chiếu (không phụ thuộc số object)"""
+    digest = memo.get(num)
+    if digest is not None:
+        return digest
+    head, stream = reader.get(num)
+    if skip_parent:
+        head = _PARENT_PATTERN.sub(b"", head)
+    head = _REF_PATTERN.sub(lambda m: b"<" + object_digest(reader, int(m.group(1)), memo) + b">", head)
+    h = hashlib.sha256()
+    if stream is not None:
+        head, stream = _decode(head, stream)
+        h.update(stream)
+    else:
+        head = b" ".join(head.split())
+    h.update(b"\0" + head)
+    digest = h.hexdigest().encode("ascii")
+    memo[num] = digest
+    return digest
+
+
+def page_digests(source):
+    """Mã từng trang của file PDF (đường dẫn hoặc bytes)"""
+    reader = PDFObjectReader(data=source) if isinstance(source, bytes) else PDFObjectReader(source)
+    memo = {}
+    return [object_digest(reader, num, memo, skip_parent=True) for num in reader.page_refs()]
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def report(name, mismatches, total):
+    status = "OK" if not mismatches else f"SAI {len(mismatches)}/{total}"
+    print(f"{name:32s} {status}")
+    if mismatches:
+        print(f"    vị trí: {mismatches[:10]}")
+    return bool(mismatches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh TemplatePDFWriter với PDFGenerator")
+    parser.add_argument("--records", type=int, default=2000, help="số trang file gộp")
+    parser.add_argument("--single", type=int, default=300, help="số file riêng")
+    parser.add_argument("--proof", action="store_true", help="bản in thử (ảnh phôi làm nền)")
+    args = parser.parse_args()
+
+    generator = PDFGenerator(shared_subset=True)
+    plan = generator.compile_layout(custom_fields=CUSTOM_FIELDS, proof=args.proof)
+    if args.proof and plan.background is None:
+        print("Không có ảnh phôi, bỏ --proof")
+    writer = TemplatePDFWriter(generator, plan)
+    records = make_records(args.records)
+    work_dir = tempfile.mkdtemp(prefix="quyy_writer_")
+    failed = False
+    try:
+        print(f"Bản ghi: {len(records)} trang gộp, {args.single} file riêng\n")
+        print(f"{'Cách tạo':32s} {'Thời gian':>10s} {'Trang/giây':>12s} {'Dung lượng':>12s}")
+        merged = {}
+        for name, func in (("ReportLab gộp", generator.create_merged_pdf), ("Khuôn trang gộp", writer.create_merged_pdf)):
+            path = os.path.join(work_dir, f"{len(merged)}.pdf")
+            elapsed = timed(lambda: func(records, path, plan=plan))
+            merged[name] = path
+            print(f"{name:32s} {elapsed:9.3f}s {len(records) / elapsed:12,.0f} {os.path.getsize(path):12,d}")
+
+        singles = records[:args.single]
+        for name, func in (("ReportLab file riêng", generator.create_single_pdf), ("Khuôn trang file riêng", writer.create_single_pdf)):
+            folder = os.path.join(work_dir, name.split()[0])
+            os.makedirs(folder)
+
+            def run():
+                for i, data in enumerate(singles):
+                    func(data, os.path.join(folder, f"{i:05d}.pdf"), plan=plan)
+
+            elapsed = timed(run)
+            size = sum(os.path.getsize(os.path.join(folder, f)) for f in os.listdir(folder))
+            print(f"{name:32s} {elapsed:9.3f}s {len(singles) / max(elapsed, 1e-9):12,.0f} {size:12,d}")
+
+        print()
+        expected, actual = (page_digests(path) for path in merged.values())
+        mismatches = [i for i, (a, b) in enumerate(zip(expected, actual)) if a != b]
+        if len(expected) != len(actual):
+            mismatches.append(min(len(expected), len(actual)))
+        failed |= report("Trang file gộp", mismatches, len(expected))
+
+        mismatches = [
+            i for i in range(len(singles))
+            if page_digests(os.path.join(work_dir, "ReportLab", f"{i:05d}.pdf"))
+            != page_digests(os.path.join(work_dir, "Khuôn", f"{i:05d}.pdf"))
+        ]
+        failed |= report("File riêng", mismatches, len(singles))
+
+        # Ký tự ngoài subset mẫu -> trang vẽ lại bằng ReportLab
+        odd = dict(records[0], ho_ten="Trương Thị ¢ß", dia_chi="Số 5 đường 2/9")
+        before = writer.fallbacks
+        path = os.path.join(work_dir, "odd.pdf")
+        writer.create_merged_pdf([records[1], odd, records[2]], path, plan=plan)
+        buffer = io.BytesIO()
+        generator.create_merged_pdf([odd], buffer, plan=plan)
+        mismatches = [] if page_digests(path)[1] == page_digests(buffer.getvalue())[0] else [1]
+        if writer.fallbacks - before != 1:
+            mismatches.append("fallbacks")
+        failed |= report("Ký tự ngoài subset", mismatches, 1)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print("\nKẾT QUẢ:", "✗ FAIL" if failed else "✓ PASS")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,6 +3,7 @@
 Dialog classes cho ứng dụng in lá phái quy y
 """
 
+import os
 import tkinter as tk
 from tkinter import simpledialog, messagebox
 
@@ -83,3 +84,40 @@ class CustomFieldDialog(simpledialog.Dialog):
             self.result = (name, value, x, y, size, align)
         except ValueError as e:
             messagebox.showerror("Lỗi", f"Giá trị không hợp lệ: {e}")
+
+
+class SheetSelectDialog(simpledialog.Dialog):
+    """Dialog chọn các sheet cần đọc của nhiều file Excel"""
+    
+    def __init__(self, parent, title, workbooks):
+        """
+        workbooks: list (đường dẫn, [tên sheet]) - sheet đầu tiên được chọn sẵn
+        """
+        self.workbooks = workbooks
+        self.result = None
+        super().__init__(parent, title)
+    
+    def body(self, master):
+        tk.Label(master, text="Chọn các sheet cần in:", font=("Arial", 10, "bold")).pack(anchor=tk.W, padx=5, pady=(5, 10))
+        
+        self.vars = []
+        for filepath, sheets in self.workbooks:
+            tk.Label(master, text=os.path.basename(filepath), font=("Arial", 10)).pack(anchor=tk.W, padx=5)
+            for i, sheet in enumerate(sheets):
+                var = tk.BooleanVar(value=(i == 0))
+                tk.Checkbutton(master, text=sheet, variable=var).pack(anchor=tk.W, padx=25)
+                self.vars.append((filepath, sheet, var))
+        return None
+    
+    def _selected(self):
+        return [(filepath, sheet) for filepath, sheet, var in self.vars if var.get()]
+    
+    def validate(self):
+        # Chưa chọn sheet nào -> giữ dialog mở để chọn lại
+        if not self._selected():
+            messagebox.showerror("Lỗi", "Chưa chọn sheet nào!", parent=self)
+            return False
+        return True
+    
+    def apply(self):
+        self.result = self._selected()
@@ -7,7 +7,9 @@ import platform
 # Core
 from core.config_manager import ConfigManager
 from core.pdf_service import PDFService
+from config import MERGED_VOLUME_PAGES, MULTIPLE_ZIP
 from core.excel_handler import ExcelHandler
+from ui.components.dialogs import SheetSelectDialog
 
 # UI
 from ui.tabs.general_tab import GeneralTab
@@ -27,10 +29,16 @@ class MainWindow:
         
         # 2. Variables
         self.excel_var = tk.StringVar()
+        self.sources = []  # list (đường dẫn, tên sheet hoặc None = sheet đầu)
+        self.row_count = None  # Số bản ghi đếm lúc chọn file (None = chưa biết)
         self.output_var = tk.StringVar(value=os.path.join(os.path.expanduser("~"), "Desktop", "QuyY_Output"))
         self.count_var = tk.StringVar(value="0 bản ghi")
         self.status_var = tk.StringVar(value="Sẵn sàng")
         self.export_mode_var = tk.StringVar(value="multiple")
+        self.incremental_var = tk.BooleanVar(value=False)
+        self.proof_var = tk.BooleanVar(value=False)
+        self.volume_pages_var = tk.IntVar(value=MERGED_VOLUME_PAGES)
+        self.zip_var = tk.BooleanVar(value=MULTIPLE_ZIP)
         
         # 3. Build UI
         self._build_menu()
@@ -92,7 +100,11 @@ class MainWindow:
             self.export_mode_var,
             on_excel_selected_callback=self.on_excel_selected,
             on_export_callback=self.on_export,
-            on_print_callback=self.on_print
+            on_print_callback=self.on_print,
+            incremental_var=self.incremental_var,
+            proof_var=self.proof_var,
+            volume_pages_var=self.volume_pages_var,
+            zip_var=self.zip_var
         )
         self.tab_coord = CoordinateTab(self.notebook, self.config_manager, self.status_var)
         self.tab_custom = CustomFieldTab(self.notebook, self.config_manager, self.status_var)
@@ -112,20 +124,52 @@ class MainWindow:
 
     # --- Actions ---
     
-    def on_excel_selected(self, filepath):
-        self.excel_var.set(filepath)
+    def on_excel_selected(self, filepaths):
+        """Chọn một hoặc nhiều file; file có nhiều sheet thì hỏi chọn sheet"""
+        if isinstance(filepaths, str):
+            filepaths = [filepaths]
         try:
-            count, _ = ExcelHandler.read_file(filepath)
+            workbooks = [(path, ExcelHandler.sheet_names(path)) for path in filepaths]
+            if any(len(sheets) > 1 for _, sheets in workbooks):
+                dialog = SheetSelectDialog(self.root, "Chọn Sheet", [wb for wb in workbooks if wb[1]])
+                if not dialog.result:
+                    return
+                first = {path: sheets[0] for path, sheets in workbooks if sheets}
+                chosen = [(path, None if sheet == first[path] else sheet) for path, sheet in dialog.result]
+                # File CSV/Parquet/Feather không có sheet
+                sources = [(path, None) for path, sheets in workbooks if not sheets] + chosen
+            else:
+                sources = [(path, None) for path in filepaths]
+        except Exception as e:
+            self.count_var.set("ERROR")
+            messagebox.showerror("Lỗi đọc file", str(e))
+            return
+
+        self.sources = sources
+        self.row_count = None
+        if len(sources) == 1 and sources[0][1] is None:
+            self.excel_var.set(sources[0][0])
+        else:
+            self.excel_var.set("; ".join(
+                os.path.basename(path) + (f" [{sheet}]" if sheet else "") for path, sheet in sources
+            ))
+        try:
+            # Chọn lại file -> luôn đọc lại (file có thể vừa được sửa)
+            for path, _ in sources:
+                ExcelHandler.invalidate(path)
+            # Chỉ đếm cột họ tên, đọc đầy đủ để dành đến lúc xuất/in (_load_data)
+            mapping = self.config_manager.excel_mapping
+            count = sum(ExcelHandler.count_rows(path, mapping, sheet) for path, sheet in sources)
+            self.row_count = count
             self.count_var.set(f"{count} bản ghi")
-            self.status_var.set("Đã load file Excel")
+            self.status_var.set("Đã load file Excel" if len(sources) == 1 else f"Đã load {len(sources)} nguồn dữ liệu")
         except Exception as e:
             self.count_var.set("ERROR")
             messagebox.showerror("Lỗi đọc file", str(e))
 
     def on_export(self):
-        excel_path = self.excel_var.get()
         output_dir = self.output_var.get()
-        if not excel_path or not output_dir:
+        if not self.sources or not output_dir:
             messagebox.showwarning("Thiếu thông tin", "Vui lòng chọn file Excel và thư mục lưu.")
             return
 
@@ -133,12 +177,12 @@ class MainWindow:
             return
             
         try:
-            _, df = ExcelHandler.read_file(excel_path)
+            df = self._load_data()
             mode = self.export_mode_var.get()
             
             self.lock_ui()
             self.status_var.set("Đang xuất PDF...")
-            self.progress_bar['value'] = 0
+            self._reset_bar()
             
             self.pdf_service.run_batch_export(
                 df, 
@@ -146,14 +190,18 @@ class MainWindow:
                 self.config_manager, 
                 mode, 
                 progress_callback=self.update_progress,
-                completion_callback=self.on_process_finished
+                completion_callback=self.on_process_finished,
+                incremental=self.incremental_var.get(),
+                proof=self.proof_var.get(),
+                volume_pages=self._volume_pages(),
+                zip_output=self.zip_var.get(),
+                row_count=self.row_count
             )
         except Exception as e:
             messagebox.showerror("Lỗi", str(e))
 
     def on_print(self):
-        excel_path = self.excel_var.get()
-        if not excel_path:
+        if not self.sources:
             messagebox.showwarning("Thiếu thông tin", "Vui lòng chọn file Excel!")
             return
         
@@ -161,39 +209,81 @@ class MainWindow:
             return
             
         try:
-            _, df = ExcelHandler.read_file(excel_path)
+            df = self._load_data()
             mode = self.export_mode_var.get()
             
             self.lock_ui()
             self.status_var.set("Đang tạo PDF và in...")
-            self.progress_bar['value'] = 0
+            self._reset_bar()
             
             self.pdf_service.run_print_job(
                 df, 
                 self.config_manager, 
                 mode, 
                 progress_callback=self.update_progress,
-                completion_callback=self.on_process_finished
+                completion_callback=self.on_process_finished,
+                proof=self.proof_var.get(),
+                row_count=self.row_count
             )
         except Exception as e:
             messagebox.showerror("Lỗi", str(e))
 
+    def _volume_pages(self):
+        """Số trang mỗi tập khi tách file gộp (ô nhập sai -> không tách)"""
+        try:
+            return max(0, int(self.volume_pages_var.get()))
+        except (tk.TclError, ValueError):
+            return 0
+
     def update_progress(self, current, total):
         # Thread safe update
-        percent = (current / total) * 100
-        self.root.after(0, lambda: self._update_bar(percent, f"Đang xử lý: {current}/{total}"))
+        if total:
+            percent = (current / total) * 100
+            text = f"Đang xử lý: {current}/{total}"
+        else:
+            # Đọc streaming: chưa biết tổng số dòng
+            percent = None
+            text = f"Đang xử lý: {current}"
+        self.root.after(0, lambda: self._update_bar(percent, text))
         
     def _update_bar(self, val, text):
-        self.progress_bar['value'] = val
+        if val is None:
+            # Chưa biết tổng số: thanh chạy qua lại thay vì phần trăm
+            if str(self.progress_bar['mode']) != 'indeterminate':
+                self.progress_bar.configure(mode='indeterminate')
+            self.progress_bar.step(1)
+        else:
+            self._reset_bar(val)
         self.status_var.set(text)
 
+    def _reset_bar(self, val=0):
+        """Trả thanh tiến độ về dạng phần trăm (determinate) với giá trị val"""
+        if str(self.progress_bar['mode']) != 'determinate':
+            self.progress_bar.configure(mode='determinate')
+        self.progress_bar['value'] = val
+
+    def _load_data(self):
+        """
+        DataFrame cả file (từ cache nếu có) hoặc iterator streaming với file lớn;
+        nhiều file/sheet thì đọc song song và ghép (ExcelHandler.read_sources)
+        """
+        mapping = self.config_manager.excel_mapping
+        if len(self.sources) > 1 or self.sources[0][1] is not None:
+            _, df = ExcelHandler.read_sources(self.sources, mapping)
+            return df
+        excel_path = self.sources[0][0]
+        if not ExcelHandler.is_cached(excel_path, mapping) and ExcelHandler.should_stream(excel_path):
+            return ExcelHandler.iter_chunks(excel_path, name_column=mapping.get("ho_ten", "hovaten"), excel_mapping=mapping)
+        _, df = ExcelHandler.read_file(excel_path, mapping)
+        return df
+
     def on_process_finished(self, result):
         self.root.after(0, lambda: self._finish_ui(result))
         
     def _finish_ui(self, result):
         self.unlock_ui()
-        self.progress_bar['value'] = 0
-        if result['error'] > 0:
+        self._reset_bar()
+        if result['error'] > 0 or result.get('failed'):
             msg = f"{result['message']}\n\nChi tiết lỗi:\n" + "\n".join(result['errors'][:5])
             if len(result['errors']) > 5:
                 msg += f"\n... và {len(result['errors']) - 5} lỗi khác"
@@ -5,7 +5,7 @@ from PIL import Image, ImageTk
 import os
 import shutil
 
-from core.resource_manager import get_app_dir, get_phoimau_path
+from core.resource_manager import get_app_dir, find_phoimau_path
 
 # Constants
 A4_WIDTH_MM = 297
@@ -61,7 +61,7 @@ class CoordinateTab(tk.Frame):
         controls_frame = tk.LabelFrame(self, text="Danh sách Fields (Kéo thả trên hình hoặc sửa số liệu bên dưới)", height=200)
         controls_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=5, pady=5)
         
-        columns = ("Field", "X", "Y", "Size", "Align")
+        columns = ("Field", "X", "Y", "Size", "Align", "Bold", "Italic")
         self.tree = ttk.Treeview(controls_frame, columns=columns, show="headings", height=6)
         
         for col in columns:
@@ -101,18 +101,10 @@ class CoordinateTab(tk.Frame):
         self.canvas.delete("bg") # Clear old bg
         self.canvas.delete("select_bg")
         
-        # Lấy thư mục app (thư mục chứa exe)
-        app_dir = get_app_dir()
+        # phoimau.png / jpg trong thư mục app (hoặc bản đi kèm bundle)
+        found_bg = find_phoimau_path()
         
-        # Search for phoimau.png / jpg trong thư mục app
-        found_bg = None
-        for ext in [".png", ".jpg", ".jpeg"]:
-            path = os.path.join(app_dir, f"phoimau{ext}")
-            if os.path.exists(path):
-                found_bg = path
-                break
-        
-        if found_bg:
+        if os.path.exists(found_bg):
             try:
                 img = Image.open(found_bg)
                 img = img.resize((CANVAS_WIDTH, CANVAS_HEIGHT), Image.Resampling.LANCZOS)
@@ -199,7 +191,9 @@ class CoordinateTab(tk.Frame):
             tags=("field", name)
         )
         
-        self.tree.insert("", tk.END, iid=name, values=(name, f"{x_mm:.1f}", f"{y_mm:.1f}", size, align))
+        bold = "✓" if conf.get("bold", False) else ""
+        italic = "✓" if conf.get("italic", False) else ""
+        self.tree.insert("", tk.END, iid=name, values=(name, f"{x_mm:.1f}", f"{y_mm:.1f}", size, align, bold, italic))
 
     def on_press(self, event):
         item = self.canvas.find_closest(event.x, event.y)[0]
@@ -342,11 +336,14 @@ class CoordinateTab(tk.Frame):
             
         if not conf: return
         
-        col_map = ["name", "x", "y", "size", "align"]
+        col_map = ["name", "x", "y", "size", "align", "bold", "italic"]
         key = col_map[idx]
         current_val = conf.get(key)
         
-        if key == "align":
+        if key in ("bold", "italic"):
+            # Chữ đậm/nghiêng bật riêng từng field (mặc định chữ thường)
+            conf[key] = not conf.get(key, False)
+        elif key == "align":
             aligns = ["L", "C", "R"]
             curr = conf.get("align", "L")
             i = aligns.index(curr) if curr in aligns else 0
@@ -4,12 +4,16 @@ from tkinter import ttk, filedialog, messagebox
 import os
 
 class GeneralTab(tk.Frame):
-    def __init__(self, parent, excel_var, output_var, count_var, mode_var, on_excel_selected_callback, on_export_callback, on_print_callback):
+    def __init__(self, parent, excel_var, output_var, count_var, mode_var, on_excel_selected_callback, on_export_callback, on_print_callback, incremental_var=None, proof_var=None, volume_pages_var=None, zip_var=None):
         super().__init__(parent)
         self.excel_var = excel_var
         self.output_var = output_var
         self.count_var = count_var
         self.mode_var = mode_var
+        self.incremental_var = incremental_var if incremental_var is not None else tk.BooleanVar(value=False)
+        self.proof_var = proof_var if proof_var is not None else tk.BooleanVar(value=False)
+        self.volume_pages_var = volume_pages_var if volume_pages_var is not None else tk.IntVar(value=0)
+        self.zip_var = zip_var if zip_var is not None else tk.BooleanVar(value=False)
         
         self.on_excel_selected = on_excel_selected_callback
         self.on_export = on_export_callback
@@ -42,7 +46,17 @@ class GeneralTab(tk.Frame):
         # 3. Mode
         self._build_section(content_frame, "3. Chế Độ Xuất PDF")
         tk.Radiobutton(self.last_section, text="📄 Nhiều file PDF (riêng lẻ)", variable=self.mode_var, value="multiple").pack(anchor=tk.W)
+        tk.Checkbutton(self.last_section, text="Gom vào 1 file ZIP (nhanh hơn khi lưu vào USB/ổ mạng)", variable=self.zip_var).pack(anchor=tk.W, padx=(25, 0))
         tk.Radiobutton(self.last_section, text="📚 Một file PDF (gộp trang)", variable=self.mode_var, value="single").pack(anchor=tk.W)
+        volume_frame = tk.Frame(self.last_section)
+        volume_frame.pack(anchor=tk.W, padx=(25, 0))
+        tk.Label(volume_frame, text="Tách file gộp mỗi").pack(side=tk.LEFT)
+        tk.Spinbox(volume_frame, from_=0, to=100000, increment=100, width=7, textvariable=self.volume_pages_var).pack(side=tk.LEFT, padx=5)
+        tk.Label(volume_frame, text="trang (0 = không tách)").pack(side=tk.LEFT)
+        tk.Label(self.last_section, text="Không tách: cả file gộp nằm trong bộ nhớ đến khi lưu (file rất lớn cần nhiều RAM);\ntách tập thì bộ nhớ chỉ theo kích thước 1 tập",
+                 font=("Arial", 8), fg="#7f8c8d", justify=tk.LEFT).pack(anchor=tk.W, padx=(25, 0))
+        tk.Checkbutton(self.last_section, text="♻️ Chỉ xuất dòng mới/thay đổi (nhiều file, cùng thư mục lưu)", variable=self.incremental_var).pack(anchor=tk.W, pady=(5, 0))
+        tk.Checkbutton(self.last_section, text="🖼️ Bản in thử: in kèm ảnh phôi làm nền (in trên giấy trắng)", variable=self.proof_var).pack(anchor=tk.W)
         
         # Info
         info_frame = tk.LabelFrame(content_frame, text="📋 Thông tin", font=("Arial", 11, "bold"), padx=10, pady=10)
@@ -64,9 +78,16 @@ class GeneralTab(tk.Frame):
         self.last_section.pack(fill=tk.X, pady=(0, 15))
 
     def _browse_excel(self):
-        filename = filedialog.askopenfilename(filetypes=[("Excel files", "*.xlsx *.xls"), ("All files", "*.*")])
-        if filename:
-            self.on_excel_selected(filename)
+        # Chọn được nhiều file (mỗi chi nhánh một file), sheet chọn ở bước sau
+        filenames = filedialog.askopenfilenames(filetypes=[
+            ("Data files", "*.xlsx *.xls *.csv *.parquet *.feather"),
+            ("Excel files", "*.xlsx *.xls"),
+            ("CSV files", "*.csv"),
+            ("Parquet/Feather files", "*.parquet *.feather"),
+            ("All files", "*.*"),
+        ])
+        if filenames:
+            self.on_excel_selected(list(filenames))
             
     def _browse_output(self):
         dirname = filedialog.askdirectory()